@@ -0,0 +1,287 @@
+"""Date-partitioned historical archive of every fetched and processed article.
+
+Each run overwrites the files under ``data/``, so there used to be no
+history to dedupe against, backfill from or query. The archive keeps one
+row per article URL in a SQLite database, partitioned by the UTC publish
+date (``published_date``, computed once when the article is recorded) and
+indexed on URL, date, source, category and region. Later stages update
+the same row with their score, labels and summary, so:
+
+* recency filtering is an index range lookup instead of re-parsing every
+  ``publishedAt`` string,
+* "have we seen this URL?" is a primary-key lookup, and
+* weekly roll-ups or re-ranking are queries instead of re-fetches, e.g.
+  ``python archive.py query --since 2026-10-12 --category FinTech``.
+"""
+
+import argparse
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+import profiles
+from filter_articles_by_date import parse_date
+
+ARCHIVE_FILE = "data/archive.sqlite"
+
+# Pipeline stages in order; a row only ever moves forward
+STAGES = ["fetched", "recent", "relevant", "classified", "selected", "summarized"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    source TEXT,
+    published_at TEXT,
+    published_date TEXT,
+    content_ref TEXT,
+    score INTEGER,
+    category TEXT,
+    region TEXT,
+    summary_zh TEXT,
+    stage INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_date ON articles (published_date);
+CREATE INDEX IF NOT EXISTS idx_articles_source ON articles (source, published_date);
+CREATE INDEX IF NOT EXISTS idx_articles_category ON articles (category, published_date);
+CREATE INDEX IF NOT EXISTS idx_articles_region ON articles (region, published_date);
+"""
+
+_UPSERT = """
+INSERT INTO articles (
+    url, title, source, published_at, published_date, content_ref, score,
+    category, region, summary_zh, stage, first_seen, updated_at
+) VALUES (
+    :url, :title, :source, :published_at, :published_date, :content_ref, :score,
+    :category, :region, :summary_zh, :stage, :now, :now
+)
+ON CONFLICT (url) DO UPDATE SET
+    title = excluded.title,
+    source = COALESCE(excluded.source, source),
+    published_at = COALESCE(excluded.published_at, published_at),
+    published_date = COALESCE(excluded.published_date, published_date),
+    content_ref = COALESCE(excluded.content_ref, content_ref),
+    score = COALESCE(excluded.score, score),
+    category = COALESCE(excluded.category, category),
+    region = COALESCE(excluded.region, region),
+    summary_zh = COALESCE(excluded.summary_zh, summary_zh),
+    stage = MAX(excluded.stage, stage),
+    updated_at = excluded.updated_at
+-- Rows that would not change are left alone, so articles carried forward
+-- from the previous run keep their updated_at and are not reindexed
+WHERE excluded.title IS NOT articles.title
+    OR excluded.source IS NOT NULL AND excluded.source IS NOT articles.source
+    OR excluded.published_at IS NOT NULL AND excluded.published_at IS NOT articles.published_at
+    OR excluded.published_date IS NOT NULL AND excluded.published_date IS NOT articles.published_date
+    OR excluded.content_ref IS NOT NULL AND excluded.content_ref IS NOT articles.content_ref
+    OR excluded.score IS NOT NULL AND excluded.score IS NOT articles.score
+    OR excluded.category IS NOT NULL AND excluded.category IS NOT articles.category
+    OR excluded.region IS NOT NULL AND excluded.region IS NOT articles.region
+    OR excluded.summary_zh IS NOT NULL AND excluded.summary_zh IS NOT articles.summary_zh
+    OR excluded.stage > articles.stage
+"""
+
+
+def connect(path: str = ARCHIVE_FILE) -> sqlite3.Connection:
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _source(value) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get("name")
+    return value or None
+
+
+def record(articles: Iterable[Dict], stage: str, path: str = ARCHIVE_FILE) -> int:
+    """Insert or update ``articles`` as having reached ``stage``; return the rows written.
+
+    Articles whose archived row already holds the same values are skipped.
+    """
+    stage_index = STAGES.index(stage)
+    if stage_index > STAGES.index("recent") and not profiles.is_default():
+        # Scores and labels of other digest profiles would overwrite the
+        # default digest's; only the shared stages are archived for them
+        return 0
+    now = _now()
+    rows = []
+    for art in articles:
+        if not art.get("url") or not art.get("title"):
+            continue
+        published_at = art.get("publishedAt") or art.get("published_at")
+        published = parse_date(published_at) if published_at else None
+        rows.append(
+            {
+                "url": art["url"],
+                "title": art["title"],
+                "source": _source(art.get("source")),
+                "published_at": published_at,
+                "published_date": published.isoformat() if published else None,
+                "content_ref": art.get("content_ref"),
+                "score": art.get("score"),
+                "category": art.get("category"),
+                "region": art.get("region"),
+                # Excerpt-only digest items have no Chinese summary to keep
+                "summary_zh": art.get("summary_zh") or None,
+                "stage": stage_index,
+                "now": now,
+            }
+        )
+    with closing(connect(path)) as conn, conn:
+        before = conn.total_changes
+        conn.executemany(_UPSERT, rows)
+        return conn.total_changes - before
+
+
+def seen(urls: Iterable[str], path: str = ARCHIVE_FILE) -> Set[str]:
+    """Return the subset of ``urls`` already in the archive."""
+    urls = list(urls)
+    found: Set[str] = set()
+    with closing(connect(path)) as conn:
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            found.update(
+                row["url"]
+                for row in conn.execute(
+                    f"SELECT url FROM articles WHERE url IN ({marks})", chunk
+                )
+            )
+    return found
+
+
+def urls_published_on(dates: Iterable[date], path: str = ARCHIVE_FILE) -> Set[str]:
+    """Return the URLs of every article published on one of ``dates``."""
+    keys = sorted(d.isoformat() for d in dates)
+    if not keys:
+        return set()
+    marks = ",".join("?" * len(keys))
+    with closing(connect(path)) as conn:
+        return {
+            row["url"]
+            for row in conn.execute(
+                f"SELECT url FROM articles WHERE published_date IN ({marks})", keys
+            )
+        }
+
+
+def query(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    source: Optional[str] = None,
+    category: Optional[str] = None,
+    region: Optional[str] = None,
+    min_stage: Optional[str] = None,
+    limit: Optional[int] = None,
+    path: str = ARCHIVE_FILE,
+) -> List[Dict]:
+    """Return archived articles as pipeline records, best scores first."""
+    clauses = []
+    params: List = []
+    if since:
+        clauses.append("published_date >= ?")
+        params.append(since.isoformat())
+    if until:
+        clauses.append("published_date <= ?")
+        params.append(until.isoformat())
+    for column, value in (("source", source), ("category", category), ("region", region)):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if min_stage:
+        clauses.append("stage >= ?")
+        params.append(STAGES.index(min_stage))
+    sql = "SELECT * FROM articles"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY published_date DESC, score DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    with closing(connect(path)) as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [to_article(row) for row in rows]
+
+
+def updated_since(
+    since: Optional[str], min_stage: str, path: str = ARCHIVE_FILE
+) -> List[Dict]:
+    """Return articles at or past ``min_stage`` changed after ``since``.
+
+    Each record carries its ``updated_at`` so callers can keep a watermark
+    for incremental processing.
+    """
+    sql = "SELECT * FROM articles WHERE stage >= ?"
+    params: List = [STAGES.index(min_stage)]
+    if since:
+        sql += " AND updated_at > ?"
+        params.append(since)
+    sql += " ORDER BY updated_at"
+    with closing(connect(path)) as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(to_article(row), updated_at=row["updated_at"]) for row in rows]
+
+
+def to_article(row: sqlite3.Row) -> Dict:
+    article = {
+        "title": row["title"],
+        "url": row["url"],
+        "source": row["source"] or "",
+        "publishedAt": row["published_at"] or "",
+    }
+    for column in ("content_ref", "score", "category", "region", "summary_zh"):
+        if row[column] is not None:
+            article[column] = row[column]
+    return article
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the article archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    q = sub.add_parser("query", help="list archived articles")
+    q.add_argument("--since", type=date.fromisoformat)
+    q.add_argument("--until", type=date.fromisoformat)
+    q.add_argument("--source")
+    q.add_argument("--category")
+    q.add_argument("--region")
+    q.add_argument("--stage", choices=STAGES, help="minimum stage reached")
+    q.add_argument("--limit", type=int, default=50)
+    sub.add_parser("stats", help="count articles per publish date and stage")
+    args = parser.parse_args()
+
+    if args.command == "query":
+        for art in query(
+            args.since, args.until, args.source, args.category, args.region,
+            args.stage, args.limit,
+        ):
+            print(
+                f"{art['publishedAt'][:10]}  {art.get('score', ''):>3}  "
+                f"{art.get('region', ''):<7} {art.get('category', ''):<14} "
+                f"{art['source']}: {art['title']}"
+            )
+    else:
+        with closing(connect()) as conn:
+            rows = conn.execute(
+                "SELECT published_date, stage, COUNT(*) AS n FROM articles "
+                "GROUP BY published_date, stage ORDER BY published_date DESC, stage"
+            ).fetchall()
+        for row in rows:
+            print(f"{row['published_date']}  {STAGES[row['stage']]:<11} {row['n']}")
+
+
+if __name__ == "__main__":
+    main()
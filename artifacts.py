@@ -0,0 +1,311 @@
+"""Dated, compressed run artifacts with a manifest and retention.
+
+The daily workflow used to commit every ``data/*.json``, the categorized
+files and the growing audit logs, so the repository grew without bound.
+Instead, ``bundle`` packs one run's outputs into
+``ARTIFACT_DIR/<date>.ndjson.gz``:
+
+* every file becomes one compressed member of NDJSON lines (one line per
+  article for JSON lists, the lines themselves for ``.jsonl`` logs),
+* the bodies of the bundled articles are added from the blob store, so a
+  bundle is self-contained,
+* ``<date>.manifest.json`` records each member's byte offset, so a single
+  file is read back by seeking to it and decompressing only that member.
+
+``LATEST_FILE`` is a small pointer to the newest bundle and is the only
+file the workflow commits; the bundles themselves live in the workflow's
+cache and artifacts. Bundles older than ``RETENTION_DAYS`` are pruned,
+except the newest one. ``restore`` brings the previous run's state
+(``RESTORE_FILES`` and their article bodies) back before a run, so
+carry-forward and deduplication work on a fresh checkout.
+
+Members are compressed with zstd when ``zstandard`` is installed and
+with gzip otherwise; the codec is recorded in the manifest.
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import blob_store
+import schema
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional, smaller bundles
+    zstandard = None
+
+ARTIFACT_DIR = "artifacts"
+LATEST_FILE = os.path.join(ARTIFACT_DIR, "LATEST.json")
+RETENTION_DAYS = int(os.getenv("ARTIFACT_RETENTION_DAYS", "30"))
+
+# Run outputs that go into a bundle
+BUNDLE_PATTERNS = [
+    "data/*.json",
+    "data/categorized/*.json",
+    "data/profiles/**/*.json",
+    "result/**/*.html",
+    "logs/*.json",
+    "logs/*.jsonl",
+    "logs/prompts/*",
+]
+# Files the next run reads from the previous one
+RESTORE_FILES = ["data/rss_articles.json", "data/source_history.json"]
+BLOBS_MEMBER = "data/blobs"
+
+
+def _codec() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    # mtime=0 keeps identical inputs byte-identical
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This bundle is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _line(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _encode(path: str) -> Tuple[str, List[str]]:
+    """Return the member kind and NDJSON lines for the file at ``path``."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".jsonl"):
+        return "lines", [line for line in raw.decode("utf-8").splitlines() if line.strip()]
+    if path.endswith(".json"):
+        try:
+            data = schema.loads(raw)
+        except ValueError:
+            return "text", [_line(raw.decode("utf-8"))]
+        if isinstance(data, list):
+            return "list", [_line(item) for item in data]
+        return "object", [_line(data)]
+    return "text", [_line(raw.decode("utf-8"))]
+
+
+def _decode(kind: str, lines: List[str]) -> Any:
+    if kind == "list":
+        return [json.loads(line) for line in lines]
+    if kind == "object":
+        return json.loads(lines[0])
+    if kind == "text":
+        return json.loads(lines[0])
+    # "lines" and the blobs member
+    return [json.loads(line) for line in lines]
+
+
+def _files() -> List[str]:
+    found = set()
+    for pattern in BUNDLE_PATTERNS:
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path) and not path.startswith(ARTIFACT_DIR):
+                found.add(path.replace(os.sep, "/"))
+    return sorted(found)
+
+
+def _content_refs(lines: List[str]) -> Iterator[str]:
+    for line in lines:
+        if '"content_ref"' in line:
+            ref = json.loads(line).get("content_ref")
+            if ref:
+                yield ref
+
+
+def bundle(day: Optional[date] = None) -> Dict[str, Any]:
+    """Pack this run's outputs into the bundle for ``day``; return the manifest."""
+    day = day or datetime.now(timezone.utc).date()
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    codec = _codec()
+    suffix = "zst" if codec == "zstd" else "gz"
+    name = f"{day.isoformat()}.ndjson.{suffix}"
+    path = os.path.join(ARTIFACT_DIR, name)
+
+    members: Dict[str, Dict[str, Any]] = {}
+    refs: set = set()
+    offset = 0
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as out:
+
+        def _member(member: str, kind: str, lines: List[str], raw_bytes: int) -> None:
+            nonlocal offset
+            payload = ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+            data = _compress(payload, codec)
+            out.write(data)
+            members[member] = {
+                "kind": kind,
+                "offset": offset,
+                "length": len(data),
+                "records": len(lines),
+                "raw_bytes": raw_bytes,
+                "sha256": hashlib.sha256(payload).hexdigest(),
+            }
+            offset += len(data)
+
+        for file in _files():
+            kind, lines = _encode(file)
+            if kind == "list":
+                refs.update(_content_refs(lines))
+            _member(file, kind, lines, os.path.getsize(file))
+
+        blobs = []
+        for ref in sorted(refs):
+            text = blob_store.get(ref)
+            if text is not None:
+                blobs.append(_line({"ref": ref, "text": text}))
+        _member(BLOBS_MEMBER, "blobs", blobs, sum(len(b) for b in blobs))
+    os.replace(tmp, path)
+
+    manifest = {
+        "date": day.isoformat(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "bundle": name,
+        "codec": codec,
+        "size": offset,
+        "raw_bytes": sum(m["raw_bytes"] for m in members.values()),
+        "members": members,
+    }
+    schema.write_json(_manifest_path(day.isoformat()), manifest)
+    schema.write_json(
+        LATEST_FILE,
+        {
+            "date": manifest["date"],
+            "bundle": name,
+            "manifest": os.path.basename(_manifest_path(manifest["date"])),
+            "size": manifest["size"],
+            "raw_bytes": manifest["raw_bytes"],
+            "files": len(members) - 1,
+            "articles": members.get("data/news_data.json", {}).get("records", 0),
+        },
+    )
+    return manifest
+
+
+def _manifest_path(day: str) -> str:
+    return os.path.join(ARTIFACT_DIR, f"{day}.manifest.json")
+
+
+def manifests() -> List[Dict[str, Any]]:
+    """Return every available manifest, newest first."""
+    found = []
+    for path in glob.glob(os.path.join(ARTIFACT_DIR, "*.manifest.json")):
+        data = schema.read_json(path)
+        if data and os.path.exists(os.path.join(ARTIFACT_DIR, data["bundle"])):
+            found.append(data)
+    return sorted(found, key=lambda m: m["date"], reverse=True)
+
+
+def latest(before: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """Return the newest manifest, optionally only from days before ``before``."""
+    for manifest in manifests():
+        if before is None or manifest["date"] < before.isoformat():
+            return manifest
+    return None
+
+
+def read(manifest: Dict[str, Any], member: str) -> Any:
+    """Return one file of a bundle, decompressing only that member."""
+    entry = manifest["members"].get(member)
+    if entry is None:
+        raise KeyError(f"{member} is not in the {manifest['date']} bundle")
+    with open(os.path.join(ARTIFACT_DIR, manifest["bundle"]), "rb") as f:
+        f.seek(entry["offset"])
+        data = f.read(entry["length"])
+    payload = _decompress(data, manifest["codec"])
+    return _decode(entry["kind"], payload.decode("utf-8").splitlines())
+
+
+def restore(files: Optional[List[str]] = None, overwrite: bool = False) -> int:
+    """Write the previous run's ``files`` (and their bodies) back; return how many."""
+    manifest = latest()
+    if manifest is None:
+        print("ℹ️ No previous run bundle to restore from")
+        return 0
+    restored = 0
+    wanted_refs: set = set()
+    for file in files or RESTORE_FILES:
+        if file not in manifest["members"] or (os.path.exists(file) and not overwrite):
+            continue
+        data = read(manifest, file)
+        schema.write_json(file, data)
+        if isinstance(data, list):
+            wanted_refs.update(
+                a["content_ref"] for a in data if isinstance(a, dict) and a.get("content_ref")
+            )
+        restored += 1
+    missing = {ref for ref in wanted_refs if not blob_store.exists(ref)}
+    if missing:
+        for blob in read(manifest, BLOBS_MEMBER):
+            if blob["ref"] in missing:
+                blob_store.put(blob["text"])
+    print(f"♻️ Restored {restored} file(s) and {len(missing)} article bodies from {manifest['bundle']}")
+    return restored
+
+
+def prune(retention_days: int = RETENTION_DAYS, today: Optional[date] = None) -> List[str]:
+    """Delete bundles older than ``retention_days``, always keeping the newest."""
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = (today - timedelta(days=retention_days)).isoformat()
+    removed = []
+    for manifest in manifests()[1:]:
+        if manifest["date"] >= cutoff:
+            continue
+        os.remove(os.path.join(ARTIFACT_DIR, manifest["bundle"]))
+        os.remove(_manifest_path(manifest["date"]))
+        removed.append(manifest["bundle"])
+    return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run artifact bundles")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("bundle", help="bundle this run's outputs and prune old bundles")
+    restore_p = sub.add_parser("restore", help="restore the previous run's state files")
+    restore_p.add_argument("--overwrite", action="store_true")
+    show_p = sub.add_parser("show", help="list a bundle, or print one of its files")
+    show_p.add_argument("file", nargs="?")
+    show_p.add_argument("--date", help="bundle date (default: newest)")
+    args = parser.parse_args()
+
+    if args.command == "bundle":
+        manifest = bundle()
+        ratio = manifest["raw_bytes"] / manifest["size"] if manifest["size"] else 0
+        print(
+            f"📦 Bundled {len(manifest['members']) - 1} files into {manifest['bundle']} "
+            f"({manifest['size'] / 1024:.0f} KiB, {ratio:.1f}x smaller)"
+        )
+        for name in prune():
+            print(f"🗑️ Removed {name}")
+    elif args.command == "restore":
+        restore(overwrite=args.overwrite)
+    else:
+        if args.date:
+            manifest = next((m for m in manifests() if m["date"] == args.date), None)
+        else:
+            manifest = latest()
+        if manifest is None:
+            raise SystemExit("No bundle found")
+        if args.file:
+            print(json.dumps(read(manifest, args.file), ensure_ascii=False, indent=2))
+        else:
+            for member, entry in manifest["members"].items():
+                print(f"{entry['records']:7d} records  {entry['length'] / 1024:8.1f} KiB  {member}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Shared asynchronous audit log for the LLM stages.
+
+Writing one JSON line per model call with blocking file I/O inside the
+event loop (and inside the request semaphore) slows every call down, and
+storing the full multi-kilobyte prompt in each entry makes the logs grow
+quickly. ``AuditLog`` instead:
+
+* queues entries and lets a background task write them in batches, with
+  the file I/O running in a worker thread,
+* stores each prompt template once under ``PROMPTS_DIR`` keyed by its hash
+  and only references that hash from the entries, and
+* rotates a log file once it grows past ``MAX_LOG_BYTES`` or the day
+  changes, gzip-compressing the rotated file.
+
+Stages call ``get_log(...).log(entry)`` and ``await close_all()`` before
+their event loop ends.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+LOG_DIR = "logs"
+PROMPTS_DIR = "logs/prompts"
+
+MAX_LOG_BYTES = 5 * 1024 * 1024
+FLUSH_INTERVAL_SECONDS = 1.0
+MAX_BATCH = 200
+
+_logs: Dict[str, "AuditLog"] = {}
+
+
+def register_template(template: str) -> str:
+    """Store ``template`` once and return its hash reference."""
+    digest = hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(PROMPTS_DIR, f"{digest}.txt")
+    if not os.path.exists(path):
+        os.makedirs(PROMPTS_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(template)
+    return digest
+
+
+class AuditLog:
+    """Buffered, rotating JSONL log for one stage and prompt version."""
+
+    def __init__(self, stage: str, version: str, template: str = "") -> None:
+        self.stage = stage
+        self.version = version
+        self.path = os.path.join(LOG_DIR, f"{stage}_log_{version}.jsonl")
+        self.template = register_template(template) if template else None
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    def log(self, entry: Dict[str, Any]) -> None:
+        """Queue ``entry`` without blocking the caller."""
+        if self._writer is None or self._writer.done():
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.create_task(self._run())
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "stage": self.stage,
+            "version": self.version,
+        }
+        if self.template:
+            record["template"] = self.template
+        record.update(entry)
+        self._queue.put_nowait(record)
+
+    async def close(self) -> None:
+        """Flush everything queued so far and stop the writer."""
+        if self._writer is None:
+            return
+        self._queue.put_nowait(None)
+        await self._writer
+        self._writer = None
+
+    async def _run(self) -> None:
+        queue = self._queue
+        closing = False
+        while not closing:
+            batch: List[Dict[str, Any]] = []
+            item = await queue.get()
+            if item is None:
+                closing = True
+            else:
+                batch.append(item)
+            # Collect whatever else arrives within the flush interval
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + FLUSH_INTERVAL_SECONDS
+            while not closing and len(batch) < MAX_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                else:
+                    batch.append(item)
+            if batch:
+                lines = "".join(
+                    json.dumps(record, ensure_ascii=False) + "\n" for record in batch
+                )
+                await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: str) -> None:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        self._rotate_if_needed()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def _rotate_if_needed(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        stat = os.stat(self.path)
+        day = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).strftime("%Y%m%d")
+        today = datetime.now(timezone.utc).strftime("%Y%m%d")
+        if stat.st_size < MAX_LOG_BYTES and day == today:
+            return
+        base = self.path[: -len(".jsonl")]
+        n = 0
+        while os.path.exists(f"{base}.{day}.{n}.jsonl.gz"):
+            n += 1
+        with open(self.path, "rb") as src, gzip.open(
+            f"{base}.{day}.{n}.jsonl.gz", "wb"
+        ) as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self.path)
+
+
+def get_log(stage: str, version: str, template: str = "") -> AuditLog:
+    """Return the shared log for ``stage`` and ``version``."""
+    key = f"{stage}:{version}"
+    if key not in _logs:
+        _logs[key] = AuditLog(stage, version, template)
+    return _logs[key]
+
+
+async def close_all() -> None:
+    """Flush and stop every log writer started in the current event loop."""
+    for audit in list(_logs.values()):
+        await audit.close()
@@ -0,0 +1,245 @@
+"""Regenerate digests for a range of past days.
+
+After a prompt change or an outage, ``python backfill.py --since
+2026-10-12 --until 2026-10-18`` rebuilds each day's digest from the
+archive instead of re-fetching anything:
+
+1. candidates – articles the archive has for the day and the day before
+   (``filter_articles_by_date.recent_dates``), with their stored bodies;
+   bodies already garbage-collected from ``data/blobs`` are brought back
+   from the run bundles in ``artifacts/``,
+2. relevance, classify, select, summarize and validate as in a normal run,
+3. the digest is rendered with the day's date.
+
+Days are processed ``--parallel`` at a time in one process, so every day
+shares the stages' request semaphores (the per-stage LLM rate limits).
+Consecutive days overlap by one publish date; each article's relevance,
+classification and summary is computed once and shared by every day that
+needs it, and answers from earlier runs come from ``llm_cache``.
+
+Outputs go to ``data/backfill/<day>/news_data.json`` and
+``result/backfill/<day>/digest.html`` (under ``data/profiles/<name>/``
+etc. when ``DIGEST_PROFILE`` is set).
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import archive
+import artifacts
+import audit_log
+import blob_store
+import classify_articles_gpt
+import filter_articles_by_date
+import filter_relevance_gpt
+import generate_digest
+import profiles
+import schema
+import select_top_articles
+import summarize_articles
+import validate_news_data
+
+DATA_DIR = "data/backfill"
+RESULT_DIR = "result/backfill"
+DEFAULT_PARALLEL_DAYS = 3
+
+# Archive fields a fresh run would not have yet; stale labels must not leak
+# into the day's candidates
+_CANDIDATE_FIELDS = ("title", "url", "source", "publishedAt", "content_ref")
+
+
+class SharedCalls:
+    """One task per (stage, article URL), awaited by every day that needs it."""
+
+    def __init__(self) -> None:
+        self.tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.reused = 0
+
+    def run(self, stage: str, key: str, call: Callable[[], Awaitable[Any]]) -> Awaitable[Any]:
+        task = self.tasks.get((stage, key))
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self.tasks[(stage, key)] = task
+        else:
+            self.reused += 1
+        return task
+
+
+def days_between(since: date, until: date) -> List[date]:
+    return [since + timedelta(days=i) for i in range((until - since).days + 1)]
+
+
+def output_paths(day: date) -> Tuple[str, str]:
+    return (
+        profiles.path(os.path.join(DATA_DIR, day.isoformat(), "news_data.json")),
+        profiles.path(os.path.join(RESULT_DIR, day.isoformat(), "digest.html")),
+    )
+
+
+def restore_bodies(articles: List[Dict]) -> int:
+    """Put bodies that left the blob store back from the run bundles; return how many."""
+    missing = {
+        a["content_ref"] for a in articles
+        if a.get("content_ref") and not blob_store.exists(a["content_ref"])
+    }
+    restored = 0
+    for manifest in artifacts.manifests():
+        if not missing:
+            break
+        if artifacts.BLOBS_MEMBER not in manifest["members"]:
+            continue
+        for blob in artifacts.read(manifest, artifacts.BLOBS_MEMBER):
+            if blob["ref"] in missing:
+                blob_store.put(blob["text"])
+                missing.discard(blob["ref"])
+                restored += 1
+    return restored
+
+
+def load_candidates(days: List[date]) -> Dict[date, List[Dict]]:
+    """Return each day's recent articles from the archive, with bodies available."""
+    windows = {day: filter_articles_by_date.recent_dates(day) for day in days}
+    since = min(min(w) for w in windows.values())
+    rows = archive.query(since=since, until=max(days))
+    restored = restore_bodies(rows)
+    if restored:
+        print(f"♻️ Restored {restored} article bodies from run bundles")
+
+    by_date: Dict[date, List[Dict]] = {}
+    without_body = 0
+    for row in rows:
+        if not (row.get("content_ref") and blob_store.exists(row["content_ref"])):
+            without_body += 1
+            continue
+        published = filter_articles_by_date.parse_date(row.get("publishedAt"))
+        if published:
+            by_date.setdefault(published, []).append(
+                {field: row[field] for field in _CANDIDATE_FIELDS if field in row}
+            )
+    if without_body:
+        print(f"⚠️ {without_body} archived articles have no stored body and are skipped")
+    return {
+        day: [dict(art) for d in sorted(windows[day]) for art in by_date.get(d, [])]
+        for day in days
+    }
+
+
+async def backfill_day(
+    day: date, candidates: List[Dict], shared: SharedCalls, config: Dict, keywords: List[str]
+) -> int:
+    """Build and render the digest for ``day``; return the number of summaries."""
+    valid = [
+        art for art in candidates
+        if art.get("title") and filter_relevance_gpt.passes_prefilter(art, keywords)
+    ]
+    answers = await asyncio.gather(*(
+        shared.run("relevance", art["url"], lambda art=art: filter_relevance_gpt.check_relevance(art))
+        for art in valid
+    ))
+    relevant = [
+        art for art, resp in zip(valid, answers)
+        if filter_relevance_gpt.apply_relevance(art, resp, keywords)
+    ]
+    archive.record(relevant, "relevant")
+
+    valid = classify_articles_gpt.valid_articles_of(relevant)
+    labels = await asyncio.gather(*(
+        shared.run("classify", art["url"], lambda art=art: classify_articles_gpt.classify_article(art))
+        for art in valid
+    ))
+    classified = [
+        art for art, result in zip(valid, labels) if classify_articles_gpt.apply_result(art, result)
+    ]
+    archive.record(classified, "classified")
+
+    selected = [
+        select_top_articles.selection_record(top)
+        for top in select_top_articles.CandidateIndex(classified).select(config)
+    ]
+    bodies = [blob_store.article_text(art) for art in selected]
+    summaries = await asyncio.gather(*(
+        shared.run(
+            "summarize",
+            art["url"],
+            lambda art=art, body=body: summarize_articles.gemma_summarize(art["title"], body),
+        )
+        for art, body in zip(selected, bodies)
+    ))
+    items = [
+        summarize_articles.digest_item(art, body, summary)
+        for art, body, summary in zip(selected, bodies, summaries)
+        if summary.text
+    ]
+    archive.record(items, "summarized")
+
+    items = validate_news_data.ensure_all_categories(validate_news_data.deduplicate(items))
+    data_path, html_path = output_paths(day)
+    schema.write_digest_items(data_path, items)
+    os.makedirs(os.path.dirname(html_path), exist_ok=True)
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(generate_digest.generate_html(items, day=day))
+
+    summarized = sum(1 for item in items if item.get("url") != "#")
+    print(
+        f"📅 {day}: {len(candidates)} candidates → {len(relevant)} relevant → "
+        f"{len(classified)} classified → {summarized} summarized, wrote {html_path}"
+    )
+    return summarized
+
+
+async def backfill(days: List[date], parallel: int = DEFAULT_PARALLEL_DAYS) -> Dict[date, int]:
+    started = time.monotonic()
+    candidates = load_candidates(days)
+    config = select_top_articles.load_selection_config()
+    keywords = filter_relevance_gpt.load_keywords()
+    shared = SharedCalls()
+    gate = asyncio.Semaphore(max(1, parallel))
+
+    async def _one(day: date) -> int:
+        async with gate:
+            return await backfill_day(day, candidates[day], shared, config, keywords)
+
+    results = await asyncio.gather(*(_one(day) for day in days), return_exceptions=True)
+    await audit_log.close_all()
+
+    done: Dict[date, int] = {}
+    for day, result in zip(days, results):
+        if isinstance(result, Exception):
+            print(f"❌ {day}: {result.__class__.__name__} - {result}")
+        else:
+            done[day] = result
+    print(
+        f"✅ Backfilled {len(done)}/{len(days)} day(s) in {time.monotonic() - started:.1f}s; "
+        f"{len(shared.tasks)} model tasks, {shared.reused} reused across days"
+    )
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Regenerate digests for past days")
+    parser.add_argument("--since", type=date.fromisoformat, required=True)
+    parser.add_argument("--until", type=date.fromisoformat, help="last day (default: --since)")
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=DEFAULT_PARALLEL_DAYS,
+        help="days processed at the same time",
+    )
+    args = parser.parse_args()
+    until: Optional[date] = args.until or args.since
+    if until < args.since:
+        parser.error("--until is before --since")
+    results = asyncio.run(backfill(days_between(args.since, until), args.parallel))
+    if len(results) < (until - args.since).days + 1:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
+    main()
@@ -0,0 +1,113 @@
+"""Import-time benchmark with a startup budget for every entry point.
+
+Each entry point is imported in a fresh interpreter with ``-X importtime``
+and the module's cumulative import time is compared with its budget in
+``BUDGETS_MS`` (the median of ``--runs`` runs, to smooth out disk cache
+noise). The heaviest direct imports are listed so a regression points at
+its cause. Exits with status 1 if any entry point is over budget::
+
+    python bench_startup.py
+    python bench_startup.py --runs 7 --only webhook send_digest
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Milliseconds of import time allowed per entry point. Rendering, sending
+# and the webhook are on the cold-start path and must stay near-instant;
+# the LLM stages load the Gemini SDK only when they first call the model.
+# The fetch stages need aiohttp straight away, hence their larger budgets.
+BUDGETS_MS: Dict[str, float] = {
+    "generate_digest": 150,
+    "send_digest": 200,
+    "send_to_line": 250,
+    "webhook": 400,
+    "main": 50,
+    "fetch_rss_articles": 450,
+    "filter_articles_by_date": 50,
+    "filter_relevance_gpt": 200,
+    "classify_articles_gpt": 200,
+    "select_top_articles": 100,
+    "summarize_articles": 200,
+    "validate_news_data": 50,
+    "stream_pipeline": 450,
+    "daemon": 450,
+}
+
+# The webhook refuses to import without LINE credentials
+DUMMY_ENV = {
+    "LINE_CHANNEL_ACCESS_TOKEN": "bench",
+    "LINE_CHANNEL_SECRET": "bench",
+}
+
+
+def _parse(stderr: str, module: str) -> Tuple[float, List[Tuple[float, str]]]:
+    """Return the module's cumulative import ms and its direct imports by cost."""
+    total = 0.0
+    children: List[Tuple[float, str]] = []
+    # Nested imports are printed before the import that triggered them
+    pending: List[Tuple[float, str]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        try:
+            cumulative_ms = int(cumulative) / 1000
+        except ValueError:
+            continue  # header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                total, children = cumulative_ms, pending
+            pending = []
+        elif depth == 1:
+            pending.append((cumulative_ms, name.strip()))
+    return total, sorted(children, reverse=True)
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[float, str]]]:
+    env = dict(os.environ, **DUMMY_ENV)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return _parse(result.stderr, module)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check entry point import times")
+    parser.add_argument("--runs", type=int, default=5, help="imports per entry point")
+    parser.add_argument("--top", type=int, default=3, help="heaviest imports to list")
+    parser.add_argument("--only", nargs="*", help="entry points to check")
+    args = parser.parse_args()
+
+    over = []
+    for module in args.only or BUDGETS_MS:
+        budget = BUDGETS_MS.get(module, float("inf"))
+        samples = [measure(module) for _ in range(args.runs)]
+        median = statistics.median(total for total, _ in samples)
+        heaviest = samples[-1][1][: args.top]
+        status = "✅" if median <= budget else "❌"
+        print(f"{status} {module:<24} {median:7.1f} ms (budget {budget:.0f} ms)")
+        for cost, name in heaviest:
+            print(f"     {cost:7.1f} ms  {name}")
+        if median > budget:
+            over.append(module)
+
+    if over:
+        print(f"❌ Over the startup budget: {', '.join(over)}")
+        sys.exit(1)
+    print("✅ Every entry point is within its startup budget")
+
+
+if __name__ == "__main__":
+    main()
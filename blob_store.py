@@ -0,0 +1,110 @@
+"""Content-addressed store for article bodies.
+
+The full text of an article used to be copied into every stage output
+(rss_articles.json, recent_articles.json, classified_articles.json, the
+categorized files, news_data.json and selected_articles.json). Now each
+body is written once, gzip-compressed, under ``BLOB_DIR`` keyed by its
+SHA-256 hash, and stage outputs carry only a ``content_ref``. Stages that
+actually need the text (relevance, classification, summarization) load it
+lazily with ``article_text``.
+"""
+
+import gzip
+import hashlib
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+BLOB_DIR = "data/blobs"
+
+# Unreferenced blobs younger than this are kept, so a rerun or the next
+# run can still reuse them
+GC_MIN_AGE_DAYS = 2
+
+
+def _path(ref: str) -> str:
+    return os.path.join(BLOB_DIR, ref[:2], f"{ref}.txt.gz")
+
+
+def put(content: str) -> str:
+    """Store ``content`` if it is new and return its reference."""
+    data = content.encode("utf-8")
+    ref = hashlib.sha256(data).hexdigest()
+    path = _path(ref)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        # mtime=0 keeps the compressed bytes identical for identical content
+        with open(tmp, "wb") as f:
+            f.write(gzip.compress(data, mtime=0))
+        os.replace(tmp, path)
+    else:
+        # Mark the blob as in use so garbage collection keeps it
+        os.utime(path)
+    return ref
+
+
+@lru_cache(maxsize=256)
+def _read(ref: str) -> str:
+    # Raises on a miss, so only bodies that were found are cached and a
+    # blob stored later (e.g. restored by ``backfill``) is seen
+    with open(_path(ref), "rb") as f:
+        return gzip.decompress(f.read()).decode("utf-8")
+
+
+def get(ref: str) -> Optional[str]:
+    """Return the body stored under ``ref``, or None if it is missing."""
+    try:
+        return _read(ref)
+    except FileNotFoundError:
+        return None
+
+
+def exists(ref: str) -> bool:
+    return os.path.exists(_path(ref))
+
+
+def article_text(article: Dict) -> str:
+    """Return the article body, loading it from the store when needed."""
+    if article.get("content"):
+        return article["content"]
+    ref = article.get("content_ref")
+    text = get(ref) if ref else None
+    return text or article.get("description") or ""
+
+
+def has_text(article: Dict) -> bool:
+    """Return whether the article has a body, without loading it."""
+    return bool(
+        article.get("content") or article.get("content_ref") or article.get("description")
+    )
+
+
+def stash(article: Dict) -> Dict:
+    """Return a copy of ``article`` with an inline ``content`` moved to the store."""
+    if not article.get("content"):
+        return article
+    stored = {k: v for k, v in article.items() if k != "content"}
+    stored["content_ref"] = put(article["content"])
+    return stored
+
+
+def collect_garbage(referenced: Iterable[str]) -> int:
+    """Delete blobs that are not referenced and older than ``GC_MIN_AGE_DAYS``."""
+    keep = set(referenced)
+    cutoff = time.time() - GC_MIN_AGE_DAYS * 86400
+    removed = 0
+    if not os.path.isdir(BLOB_DIR):
+        return 0
+    for prefix in os.listdir(BLOB_DIR):
+        folder = os.path.join(BLOB_DIR, prefix)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            ref = name.split(".", 1)[0]
+            path = os.path.join(folder, name)
+            if ref not in keep and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed
@@ -5,21 +5,33 @@ human-readable category and region label to each article. The results
 are stored for later summarization.
 """
 
-import json
+import argparse
+import bisect
 import os
-import re
 import asyncio
-import google.generativeai as genai
 from dotenv import load_dotenv
-from typing import Dict, List, Any
-
-INPUT_FILE = "data/classified_articles.json"
-OUTPUT_ALL_FILE = "data/news_data.json"
-CATEGORY_DIR = "data/categorized"
+from functools import lru_cache
+from typing import Dict, List, Any, TypedDict
+
+import archive
+import audit_log
+import blob_store
+import llm_cache
+import llm_client
+import local_classifier
+import profiles
+import run_budget
+import schema
+import search_index
+
+INPUT_FILE = profiles.path("data/classified_articles.json")
+OUTPUT_ALL_FILE = profiles.path("data/news_data.json")
+# 選文步驟讀取的候選檔；news_data.json 之後會被摘要步驟覆寫
+CANDIDATES_FILE = profiles.path("data/categorized_articles.json")
+CATEGORY_DIR = profiles.path("data/categorized")
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash")
+MODEL_NAME = "gemini-2.5-flash"
 
 CATEGORY_MAPPING = {
     "Research": "Research",
@@ -46,149 +58,272 @@ def load_prompt(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
-VERSION = "v2.1"
+VERSION = profiles.setting("classify_prompt", "v2.1")
 PROMPT_PATH = f"prompts/classify_articles_{VERSION}.txt" # 確保這個路徑指向你的新 Prompt 檔案
-PROMPT_TEMPLATE = load_prompt(PROMPT_PATH)
+
+
+@lru_cache(maxsize=None)
+def prompt_template() -> str:
+    """第一次需要時才讀取 Prompt 檔案，匯入模組時不做任何 I/O。"""
+    return load_prompt(PROMPT_PATH)
+
+
+@lru_cache(maxsize=None)
+def get_model() -> llm_client.PrefixModel:
+    # 指示內容只以快取前綴傳送一次，每次呼叫只附上文章本身
+    return llm_client.prefix_model(
+        MODEL_NAME, prompt_template().strip(), "classify_articles", VERSION
+    )
 
 
 def load_articles(path: str) -> List[Dict[str, Any]]:
     """載入待分類的文章列表。"""
-    if not os.path.exists(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            raise RuntimeError(f"Invalid JSON in {path}")
+    return schema.read_articles(path)
 
 
 semaphore = asyncio.Semaphore(3) # 限制併發請求數量，避免 API 速率限制
+# 提早結束模式下同時進行中的請求上限；略大於 semaphore 以保持管線滿載
+EARLY_EXIT_IN_FLIGHT = 6
 
 
-def _parse_response(text: str) -> Dict[str, Any]:
-    """解析模型的回應文本，提取類別和地區資訊。"""
-    raw_text = text
-    try:
-        # 嘗試找到 JSON 物件，通常模型會將 JSON 包裹在 ```json ... ``` 中
-        match = re.search(r"\{[^{}]*\}", raw_text, re.DOTALL)
-        if match:
-            raw_text = match.group(0)
-        else:
-            # 如果沒有找到 JSON 包裹，則嘗試移除常見的 Markdown 標記
-            raw_text = raw_text.replace("```json", "").replace("```", "").strip()
-
-        data = json.loads(raw_text)
-        # 模型應返回 "category" 和 "region"
-        return {
-            "category": data.get("category", ""),
-            "region": data.get("region", "Global"),
-            "keep": data.get("keep", False) # 從模型回應中獲取 keep 屬性
-        }
-    except Exception as e:
-        print("⚠️ 無法解析模型回應:", e)
-        print("🧪 原始回應文本為:", repr(raw_text))
-        # 返回預設值，確保程式不會崩潰
-        return {"category": "", "region": "Global", "keep": False}
+class ClassifyResult(TypedDict):
+    category: str
+    region: str
+    keep: bool
 
 
 async def classify_article(article: Dict[str, Any]) -> Dict[str, Any] | None:
     """對單篇文章進行分類。"""
     title = article.get("title", "")
-    content = article.get("content") or article.get("description", "")
+    content = blob_store.article_text(article)
     if not title or not content:
         return None # 如果沒有標題或內容則跳過
 
     short_content = truncate_text(content)
     # 將文章標題和截斷後的內容組合成 Prompt
-    prompt = f"{PROMPT_TEMPLATE.strip()}\n\nTitle: {title}\n\n Content:\n{short_content}"
+    suffix = f"\n\nTitle: {title}\n\n Content:\n{short_content}"
+    model = get_model()
+    cache_key = llm_cache.make_key("classify_articles", MODEL_NAME, model.prefix + suffix)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return cached # 已快取的模型答案不需花費，優先於本地分類器
+
+    # 本地分類器有把握時直接採用其結果，只有不確定的文章才呼叫模型
+    local = local_classifier.classify(article, content, VERSION)
+    if local is not None:
+        return local
 
     async with semaphore: # 使用 semaphore 限制併發請求
         try:
             # 異步呼叫模型進行內容生成
-            resp = await model.generate_content_async(prompt)
-            text = resp.text
+            parsed, text = await llm_client.generate_json(
+                model, suffix, ClassifyResult, "classify_articles", VERSION
+            )
             print("📩 模型原始回應:", text)
-            return _parse_response(text)
+            if parsed is None:
+                print("⚠️ 重新詢問後仍無法解析模型回應")
+                return None
+            llm_cache.put(cache_key, "classify_articles", parsed)
+            audit_log.get_log("classify_articles", VERSION, prompt_template()).log(
+                {"title": title, "url": article.get("url"), "response": text, "parsed": parsed}
+            )
+            return parsed
         except Exception as e:
             print(f"❌ 請求期間發生例外: {e}")
             return None # 發生錯誤時返回 None
 
 
-async def main_async() -> None:
-    """主異步函數，負責載入、分類、儲存文章。"""
-    articles = load_articles(INPUT_FILE)
-    os.makedirs(CATEGORY_DIR, exist_ok=True)
-
-    # 初始化分組字典，使用 STANDARD_CATEGORIES
-    grouped = {region: {cat: [] for cat in STANDARD_CATEGORIES} for region in REGIONS}
-    results: List[Dict[str, Any]] = [] # 儲存所有分類後的文章
-
+def valid_articles_of(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """過濾掉沒有標題或內容的文章。"""
     valid_articles: List[Dict[str, Any]] = []
     for art in articles:
         title = art.get("title", "")
-        content = art.get("content") or art.get("description", "")
-        if not title or not content:
+        if not title or not blob_store.has_text(art):
             continue
         valid_articles.append(art)
+    return valid_articles
+
+
+# 定義你認為是 AI 相關的類別列表
+AI_RELATED_CATEGORIES = ["Research", "Infrastructure", "FinTech", "Startup"]
+# 這裡的列表需要根據你對「AI相關」的具體定義來調整
+# 如果你認為所有這四個類別都可能包含AI，那就保留，否則可以更具體
+# 例如，如果只有 Research 和 Infrastructure 的 AI 部分你感興趣，那就調整
+
+
+def apply_result(art: Dict[str, Any], result: Dict[str, Any] | None) -> bool:
+    """將模型結果寫回文章，回傳文章是否應保留。"""
+    if not result:
+        return False
+
+    raw_category_from_model = result.get("category", "")
+    region = result.get("region", "Global")
+    keep = result.get("keep", False)
+
+    standardized_category = CATEGORY_MAPPING.get(raw_category_from_model, "Unknown")
+
+    art["category"] = standardized_category
+    art["region"] = region
+    art["keep"] = keep
+
+    # 新增的 AI 相關篩選邏輯
+    # 只有當 keep 為 True 且 category 屬於 AI_RELATED_CATEGORIES 時才保留
+    if keep and standardized_category in AI_RELATED_CATEGORIES:
+        return True
+    # 如果文章不保留（keep=false）或者不屬於 AI 相關類別，都將其排除
+    if not keep:
+        print(f"文章 '{art.get('title', '無標題')}' 因 keep=false 而被拒絕。")
+    else: # 這表示 keep 是 true，但 category 不在 AI_RELATED_CATEGORIES 中
+        print(f"文章 '{art.get('title', '無標題')}' 因類別 '{standardized_category}' 不屬於 AI 相關而被排除。")
+    return False
+
+
+async def classify_articles(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """分類所有有效文章，回傳保留下來的文章。"""
+    # 執行預算吃緊時只分類分數較高的候選文章
+    valid_articles = run_budget.trim_low_scores(valid_articles_of(articles), "classify_articles")
 
     # 併發執行所有文章的分類任務
     tasks = [classify_article(art) for art in valid_articles]
     responses = await asyncio.gather(*tasks)
 
-    # 定義你認為是 AI 相關的類別列表
-    AI_RELATED_CATEGORIES = ["Research", "Infrastructure", "FinTech", "Startup"]
-    # 這裡的列表需要根據你對「AI相關」的具體定義來調整
-    # 如果你認為所有這四個類別都可能包含AI，那就保留，否則可以更具體
-    # 例如，如果只有 Research 和 Infrastructure 的 AI 部分你感興趣，那就調整
+    return [art for art, result in zip(valid_articles, responses) if apply_result(art, result)]
+
+
+async def classify_articles_early_exit(
+    articles: List[Dict[str, Any]], config: Dict[str, Any] | None = None
+) -> List[Dict[str, Any]]:
+    """依相關性分數由高到低分類文章，並在所有地區／類別欄位底定後提早結束。
+
+    每次都以選文步驟的規則（每欄篇數、來源上限、重複新聞、新穎度加權）
+    從已分類的文章中挑出目前的入選文章。文章的 MMR 值不會超過它的分數，
+    因此分數低於所有入選值的候選文章不可能被選上：不再為它送出分類請求，
+    並取消進行中的請求。入選結果與完整分類後再選文相同。
+    """
+    import select_top_articles
+
+    config = config or select_top_articles.load_selection_config()
+    # 依分數由高到低排序後反轉，從尾端取出；取消的文章可以依分數插回
+    candidates = run_budget.trim_low_scores(valid_articles_of(articles), "classify_articles")
+    remaining = sorted(candidates, key=lambda a: a.get("score", 0), reverse=True)[::-1]
+    # 結果依輸入順序排列，同分時選文挑到的文章才會與完整分類時相同
+    position = {id(art): i for i, art in enumerate(candidates)}
+    results: List[Dict[str, Any]] = []
+
+    def bar() -> float | None:
+        """回傳要被選上至少需要的分數；仍有欄位未滿時回傳 None。"""
+        chosen = select_top_articles.CandidateIndex(results).choose(config)
+        values: List[float] = []
+        for slot, picks in chosen.items():
+            if len(picks) < select_top_articles.slot_size(config, *slot):
+                return None
+            values.extend(value for _, value in picks)
+        return min(values, default=None)
+
+    pending: Dict[asyncio.Task, Dict[str, Any]] = {}
+    issued = 0
+    cancelled = 0
+    while True:
+        threshold = bar()
+
+        def can_win(art: Dict[str, Any]) -> bool:
+            # 同分的文章可能因排在前面而勝出，所以仍要分類
+            return threshold is None or art.get("score", 0) >= threshold
+
+        while remaining and len(pending) < EARLY_EXIT_IN_FLIGHT and can_win(remaining[-1]):
+            art = remaining.pop()
+            pending[asyncio.create_task(classify_article(art))] = art
+            issued += 1
+
+        for task, art in list(pending.items()):
+            if not can_win(art):
+                task.cancel()
+                del pending[task]
+                cancelled += 1
+                # 來源上限或重複檢查可能讓門檻之後再下降，所以放回候選清單
+                bisect.insort(remaining, art, key=lambda a: a.get("score", 0))
+        if not pending:
+            break
+
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            art = pending.pop(task)
+            if apply_result(art, task.result()):
+                bisect.insort(results, art, key=lambda a: position[id(a)])
 
-    for art, result in zip(valid_articles, responses):
-        if not result:
-            continue
+    print(
+        f"⏩ 提早結束：送出 {issued} 次分類請求、取消 {cancelled} 次，"
+        f"略過 {len(remaining)} 篇候選文章"
+    )
+    return results
 
-        raw_category_from_model = result.get("category", "")
-        region = result.get("region", "Global")
-        keep = result.get("keep", False)
 
-        standardized_category = CATEGORY_MAPPING.get(raw_category_from_model, "Unknown")
+def group_articles(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """依地區與標準化類別將文章分組。"""
+    # 初始化分組字典，使用 STANDARD_CATEGORIES
+    grouped = {region: {cat: [] for cat in STANDARD_CATEGORIES} for region in REGIONS}
+    for art in results:
+        region = art.get("region", "Global")
+        category = art.get("category", "")
+        if region in grouped and category in grouped[region]:
+            grouped[region][category].append(art)
+        else:
+            print(f"Warning: Article with category '{category}' or region '{region}' not added to grouped dictionary.")
+    return grouped
 
-        art["category"] = standardized_category
-        art["region"] = region
-        art["keep"] = keep
 
-        # 新增的 AI 相關篩選邏輯
-        # 只有當 keep 為 True 且 category 屬於 AI_RELATED_CATEGORIES 時才保留
-        if keep and standardized_category in AI_RELATED_CATEGORIES:
-            results.append(art)
-            if region in grouped and standardized_category in grouped[region]:
-                grouped[region][standardized_category].append(art)
-            else:
-                print(f"Warning: Article with category '{standardized_category}' or region '{region}' not added to grouped dictionary.")
-        else:
-            # 如果文章不保留（keep=false）或者不屬於 AI 相關類別，都將其排除
-            if not keep:
-                print(f"文章 '{art.get('title', '無標題')}' 因 keep=false 而被拒絕。")
-            else: # 這表示 keep 是 true，但 category 不在 AI_RELATED_CATEGORIES 中
-                print(f"文章 '{art.get('title', '無標題')}' 因類別 '{standardized_category}' 不屬於 AI 相關而被排除。")
+def write_outputs(results: List[Dict[str, Any]]) -> None:
+    """寫出總檔案以及各地區／類別的分檔。"""
+    os.makedirs(CATEGORY_DIR, exist_ok=True)
+    grouped = group_articles(results)
 
     # 將所有已分類並保留的文章寫入一個總檔案
-    with open(OUTPUT_ALL_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    schema.write_articles(OUTPUT_ALL_FILE, results)
+    schema.write_articles(CANDIDATES_FILE, results)
 
     # 將文章按照地區和標準化類別分別寫入檔案
     for region, cats in grouped.items():
         for cat, items in cats.items(): # 這裡的 'cat' 已經是標準化後的類別
+            # 確保檔案名稱是有效的，將空格替換為底線
+            filename = f"{region}_{cat.replace(' ', '_')}.json"
+            path = os.path.join(CATEGORY_DIR, filename)
             # 只有當該類別下有文章時才建立檔案
             if items:
-                # 確保檔案名稱是有效的，將空格替換為底線
-                filename = f"{region}_{cat.replace(' ', '_')}.json"
-                path = os.path.join(CATEGORY_DIR, filename)
-                with open(path, "w", encoding="utf-8") as f:
-                    json.dump(items, f, ensure_ascii=False, indent=2)
+                schema.write_articles(path, items)
+            elif os.path.exists(path):
+                # 移除上一輪留下的舊檔，避免選文時讀到過期文章
+                os.remove(path)
+
+
+async def main_async(early_exit: bool = False) -> None:
+    """主異步函數，負責載入、分類、儲存文章。"""
+    articles = load_articles(INPUT_FILE)
+    if early_exit:
+        # 欄位大小與多樣性規則都來自選文設定
+        results = await classify_articles_early_exit(articles)
+    else:
+        results = await classify_articles(articles)
+    await audit_log.close_all()
+    write_outputs(results)
+    archive.record(results, "classified")
+    search_index.update()
     print(
         f"已將 {len(results)} 篇已分類的文章寫入 {OUTPUT_ALL_FILE}"
     )
     print(f"✅ 成功分類並保留的文章數量: {len(results)}")
+    if local_classifier.summary():
+        print(local_classifier.summary())
 
 
 if __name__ == "__main__":
-    asyncio.run(main_async())
\ No newline at end of file
+    import profiler
+
+    profiler.enable_from_args()
+    parser = argparse.ArgumentParser(description="Classify relevant articles")
+    parser.add_argument(
+        "--early-exit",
+        action="store_true",
+        help="classify by descending score and stop once every slot is decided",
+    )
+    args = parser.parse_args()
+    asyncio.run(main_async(early_exit=args.early_exit))
\ No newline at end of file
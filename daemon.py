@@ -0,0 +1,212 @@
+"""Long-running service mode for the digest pipeline.
+
+Instead of a cold batch that fetches a full day's backlog at once, the
+daemon keeps one aiohttp session, the loaded configuration, prompts and
+models warm for its whole lifetime. Feeds are polled on the adaptive
+schedule from ``poll_schedule.py`` and new articles go through the date
+filter, relevance check and classification as soon as they arrive. At the
+daily cutoff only selection, summarization, rendering and delivery remain.
+
+Run it with ``python main.py --daemon``.
+"""
+
+import asyncio
+import os
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import aiohttp
+
+import archive
+import blob_store
+import classify_articles_gpt
+import fetch_rss_articles
+import filter_articles_by_date
+import filter_relevance_gpt
+import poll_schedule
+import schema
+import search_index
+
+STATE_FILE = "data/daemon_state.json"
+
+# How often the daemon wakes up to check which feeds are due
+POLL_TICK_SECONDS = int(os.getenv("DAEMON_POLL_TICK_SECONDS", "300"))
+# Daily digest cutoff in UTC, "HH:MM" (the GitHub Actions cron runs at 01:00)
+DIGEST_CUTOFF = os.getenv("DIGEST_CUTOFF", "01:00")
+
+
+def next_cutoff(now: datetime) -> datetime:
+    """Return the next cutoff time strictly after ``now``."""
+    hour, minute = (int(part) for part in DIGEST_CUTOFF.split(":", 1))
+    cutoff = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if cutoff <= now:
+        cutoff += timedelta(days=1)
+    return cutoff
+
+
+class DaemonState:
+    """Articles the daemon has seen, fetched and classified so far."""
+
+    def __init__(self) -> None:
+        # URL -> fetched article, reused for full text on later polls
+        self.fetched: Dict[str, Dict] = {}
+        # URLs that already went through the relevance check
+        self.checked: set[str] = set()
+        # URL -> relevant, classified article waiting for the cutoff
+        self.classified: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, path: str = STATE_FILE) -> "DaemonState":
+        state = cls()
+        try:
+            data = schema.read_json(path)
+        except RuntimeError:
+            print(f"⚠️ Invalid JSON in {path}, starting with empty state")
+            return state
+        if not data:
+            return state
+        state.fetched = {a["url"]: a for a in data.get("fetched", []) if a.get("url")}
+        state.checked = set(data.get("checked", []))
+        state.classified = {
+            a["url"]: a for a in data.get("classified", []) if a.get("url")
+        }
+        return state
+
+    def save(self, path: str = STATE_FILE) -> None:
+        schema.write_json(
+            path,
+            {
+                "fetched": list(self.fetched.values()),
+                "checked": sorted(self.checked),
+                "classified": list(self.classified.values()),
+            },
+        )
+
+    def prune(self) -> None:
+        """Drop everything that fell out of the today/yesterday window."""
+        recent = filter_articles_by_date.filter_recent(list(self.fetched.values()))
+        self.fetched = {a["url"]: a for a in recent}
+        self.checked &= set(self.fetched)
+        self.classified = {
+            url: art for url, art in self.classified.items() if url in self.fetched
+        }
+
+
+class Daemon:
+    def __init__(self) -> None:
+        self.sources = fetch_rss_articles.load_sources()
+        self.keywords = fetch_rss_articles.load_keywords()
+        self.history = poll_schedule.load_history()
+        self.state = DaemonState.load()
+
+    async def ingest(self, session: aiohttp.ClientSession) -> None:
+        """Poll the due feeds and push new articles through the LLM stages."""
+        now = datetime.now(timezone.utc)
+        fetched, _ = await fetch_rss_articles.fetch_due_sources(
+            self.sources,
+            session,
+            self.keywords,
+            self.history,
+            self.state.fetched,
+            now,
+        )
+        poll_schedule.save_history(self.history)
+
+        new_articles: List[Dict] = []
+        for batch in fetched.values():
+            for art in batch:
+                url = art.get("url")
+                if not url or url in self.state.checked:
+                    continue
+                self.state.fetched[url] = art
+                new_articles.append(art)
+
+        archive.record(new_articles, "fetched")
+        recent = filter_articles_by_date.filter_recent(new_articles)
+        if recent:
+            relevant = await filter_relevance_gpt.score_articles(recent, self.keywords)
+            classified = await classify_articles_gpt.classify_articles(relevant)
+            archive.record(relevant, "relevant")
+            archive.record(classified, "classified")
+            search_index.update()
+            self.state.checked.update(a["url"] for a in recent)
+            for art in classified:
+                self.state.classified[art["url"]] = art
+        self.state.save()
+        print(
+            f"📥 Polled {len(fetched)} feeds, {len(recent)} new recent articles, "
+            f"{len(self.state.classified)} classified candidates"
+        )
+
+    async def publish(self) -> None:
+        """Run the post-cutoff stages on the warm, already classified pool."""
+        # Imported here so a missing mail or LINE setting only affects
+        # delivery and never stops ingestion.
+        import generate_digest
+        import select_top_articles
+        import summarize_articles
+        import validate_news_data
+
+        self.state.prune()
+        blob_store.collect_garbage(
+            a["content_ref"] for a in self.state.fetched.values() if a.get("content_ref")
+        )
+        classify_articles_gpt.write_outputs(list(self.state.classified.values()))
+
+        steps = [
+            ("select_top_articles", select_top_articles.main),
+            ("summarize_articles", summarize_articles.main_async),
+            ("validate_news_data", validate_news_data.main),
+            ("generate_digest", generate_digest.main),
+            ("send_digest", self._send),
+        ]
+        for name, step in steps:
+            print(f"🔧 Running {name}...")
+            try:
+                result = step()
+                if asyncio.iscoroutine(result):
+                    await result
+                print(f"✅ {name} completed")
+            except Exception as exc:
+                print(f"❌ {name} failed: {exc}")
+                traceback.print_exc()
+        self.state.save()
+
+    @staticmethod
+    def _send() -> None:
+        import send_digest
+
+        send_digest.main()
+
+    async def run(self) -> None:
+        cutoff = next_cutoff(datetime.now(timezone.utc))
+        print(f"⏰ Daemon started, next digest cutoff at {cutoff.isoformat()}")
+        async with aiohttp.ClientSession(
+            headers=fetch_rss_articles.DEFAULT_HEADERS
+        ) as session:
+            while True:
+                try:
+                    await self.ingest(session)
+                except Exception as exc:
+                    print(f"❌ Ingestion failed: {exc}")
+                    traceback.print_exc()
+
+                now = datetime.now(timezone.utc)
+                if now >= cutoff:
+                    print(f"⏰ Cutoff reached at {now.isoformat()}, publishing digest")
+                    await self.publish()
+                    cutoff = next_cutoff(datetime.now(timezone.utc))
+                    print(f"⏰ Next digest cutoff at {cutoff.isoformat()}")
+                    continue
+
+                remaining = (cutoff - datetime.now(timezone.utc)).total_seconds()
+                await asyncio.sleep(max(0.0, min(POLL_TICK_SECONDS, remaining)))
+
+
+def run_forever() -> None:
+    asyncio.run(Daemon().run())
+
+
+if __name__ == "__main__":
+    run_forever()
@@ -0,0 +1,436 @@
+"""Coordinator/worker mode for the fetch, relevance and classify stages.
+
+One event loop in one process used to fetch every feed and make every
+LLM call, so more sources or profiles meant proportionally longer runs.
+Here a coordinator splits the work into jobs on a shared ``work_queue``
+and any number of workers pull them:
+
+1. fetch – due sources are sharded by a hash of their name into one job
+   per worker; a worker fetches its shard and returns the articles (with
+   their bodies) and the shard's polling history,
+2. relevance – one job per recent article,
+3. classify – one job per relevant article.
+
+Between the phases the coordinator merges the results exactly like the
+batch steps do and writes the usual ``data/`` outputs, so selection and
+everything after it run unchanged. A worker that dies loses only its
+leases, which expire and are picked up by another worker.
+
+``python distributed.py run --workers 8`` starts eight local worker
+processes; ``--serve 8765 --host 0.0.0.0`` also exposes the queue over
+HTTP so that ``python distributed.py worker --queue
+http://coordinator:8765`` can join from other machines (both sides need
+the same ``WORK_QUEUE_TOKEN``). Only the default digest profile runs here; other
+profiles start from the relevance step as usual (``main.py --workers``).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import archive
+import blob_store
+import filter_articles_by_date
+import poll_schedule
+import run_budget
+import schema
+import work_queue
+
+FETCH = "fetch"
+RELEVANCE = "relevance"
+CLASSIFY = "classify"
+# Fetch shards download whole feeds, so they hold their lease longer
+LEASE_SECONDS = {FETCH: 900, RELEVANCE: 180, CLASSIFY: 180}
+# Jobs a worker keeps in flight; a little above the LLM semaphores
+IN_FLIGHT = 6
+POLL_SECONDS = 0.2
+PHASE_TIMEOUT_SECONDS = 1800
+
+
+def shard_of(name: str, shards: int) -> int:
+    """Stable shard of a source; the same source goes to the same worker slot."""
+    return int(hashlib.sha1(name.encode("utf-8")).hexdigest(), 16) % shards
+
+
+def _key(article: Dict) -> str:
+    return article.get("url") or article.get("title", "")
+
+
+def _source_name(article: Dict) -> str:
+    src = article.get("source")
+    return (src.get("name") if isinstance(src, dict) else src) or ""
+
+
+def _stop_kind(worker: str) -> str:
+    return f"stop:{worker}"
+
+
+# ---------------------------------------------------------------------------
+# Worker
+
+
+async def _fetch_shard(payload: Dict[str, Any]) -> Dict[str, Any]:
+    import aiohttp
+
+    import fetch_rss_articles
+
+    history = payload["history"]
+    keywords = fetch_rss_articles.load_keywords()
+    async with aiohttp.ClientSession(headers=fetch_rss_articles.DEFAULT_HEADERS) as session:
+        batches = await asyncio.gather(
+            *(
+                fetch_rss_articles.process_feed_async(
+                    src,
+                    session,
+                    keywords,
+                    max_entries=src["window"],
+                    history=history,
+                    previous=payload["previous"],
+                )
+                for src in payload["sources"]
+            )
+        )
+    articles = {}
+    for src, batch in zip(payload["sources"], batches):
+        # Bodies travel with the result, so workers need no shared disk
+        for art in batch:
+            art["content"] = blob_store.get(art.pop("content_ref"))
+        articles[src.get("name", "")] = batch
+    return {"articles": articles, "history": history}
+
+
+async def _handle(job: work_queue.Job) -> Any:
+    if job.kind == FETCH:
+        return await _fetch_shard(job.payload)
+    if job.kind == RELEVANCE:
+        import filter_relevance_gpt
+
+        result = await filter_relevance_gpt.check_relevance(job.payload)
+    elif job.kind == CLASSIFY:
+        import classify_articles_gpt
+
+        result = await classify_articles_gpt.classify_article(job.payload)
+    else:
+        raise ValueError(f"Unknown job kind {job.kind!r}")
+    if result is None:
+        raise RuntimeError("no usable model answer")
+    return result
+
+
+async def work(
+    queue, worker: str, exit_when_idle: bool = False, parent: Optional[int] = None
+) -> int:
+    """Pull and run jobs until told to stop; return how many were completed.
+
+    A local worker is given its coordinator's pid as ``parent`` and stops on
+    its own once the coordinator is gone, whatever killed it.
+    """
+    kinds = [_stop_kind(worker), CLASSIFY, RELEVANCE, FETCH]
+    running: Dict[asyncio.Task, work_queue.Job] = {}
+    completed = 0
+    stopping = False
+
+    while True:
+        if parent is not None and os.getppid() != parent:
+            print(f"⚠️ {worker}: coordinator {parent} is gone, stopping")
+            for task in running:
+                task.cancel()
+            break
+        for kind in kinds:
+            if stopping or len(running) >= IN_FLIGHT:
+                break
+            jobs = queue.lease(
+                worker, [kind], n=IN_FLIGHT - len(running),
+                lease_seconds=LEASE_SECONDS.get(kind, work_queue.LEASE_SECONDS),
+            )
+            for job in jobs:
+                if job.kind.startswith("stop:"):
+                    queue.complete(job.id, worker, None)
+                    stopping = True
+                else:
+                    running[asyncio.create_task(_handle(job))] = job
+        if not running:
+            if stopping or exit_when_idle:
+                break
+            await asyncio.sleep(POLL_SECONDS)
+            continue
+
+        done, _ = await asyncio.wait(
+            running, timeout=POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            job = running.pop(task)
+            try:
+                queue.complete(job.id, worker, task.result())
+                completed += 1
+            except Exception as exc:
+                print(f"⚠️ {worker}: {job.kind} {job.key} failed (attempt {job.attempts}): {exc}")
+                queue.fail(job.id, worker, f"{type(exc).__name__}: {exc}")
+
+    import audit_log
+
+    await audit_log.close_all()
+    return completed
+
+
+def run_worker(
+    worker: str, queue_url: Optional[str] = None, parent: Optional[int] = None
+) -> None:
+    queue = work_queue.RemoteQueue(queue_url) if queue_url else work_queue.WorkQueue()
+    completed = asyncio.run(work(queue, worker, parent=parent))
+    print(f"👷 Worker {worker} finished {completed} job(s)")
+
+
+# ---------------------------------------------------------------------------
+# Coordinator
+
+
+class Coordinator:
+    def __init__(
+        self, workers: int, serve_port: Optional[int] = None,
+        serve_host: str = work_queue.DEFAULT_HOST,
+    ) -> None:
+        self.run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self.queue = work_queue.WorkQueue()
+        self.queue.reset(self.run_id)
+        self.shards = max(1, workers)
+        self.serving = serve_port is not None
+        if self.serving:
+            work_queue.serve(self.queue, host=serve_host, port=serve_port)
+            print(f"📡 Work queue served on {serve_host}:{serve_port}")
+        self.worker_ids: List[str] = []
+        self.procs: List[subprocess.Popen] = []
+        for _ in range(workers):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        """Start one more local worker process."""
+        wid = f"{socket.gethostname()}-{os.getpid()}-{len(self.worker_ids)}"
+        self.worker_ids.append(wid)
+        self.procs.append(subprocess.Popen([
+            sys.executable, os.path.abspath(__file__),
+            "worker", "--id", wid, "--parent", str(os.getpid()),
+        ]))
+
+    def _wait(self, kind: str, total: int) -> Dict[str, Any]:
+        remaining = run_budget.remaining_seconds()
+        timeout = PHASE_TIMEOUT_SECONDS if remaining is None else max(remaining, 60)
+        deadline = time.monotonic() + timeout
+        started = time.monotonic()
+        while True:
+            counts = self.queue.counts(self.run_id, kind)
+            if counts["pending"] + counts["leased"] == 0:
+                break
+            if not self.serving and not any(p.poll() is None for p in self.procs):
+                # Every local worker is gone: start a fresh one rather than
+                # running jobs here, as the stages' semaphores and locks are
+                # bound to the first event loop that uses them. Jobs still
+                # leased by the dead workers wait for their leases to run out.
+                print(f"⚠️ No live workers, starting a new one for the remaining {kind} jobs")
+                self._spawn()
+            if time.monotonic() > deadline:
+                abandoned = self.queue.abandon(self.run_id, kind)
+                print(f"⏱️ Gave up on {abandoned} {kind} job(s) at the deadline")
+                break
+            time.sleep(POLL_SECONDS)
+        counts = self.queue.counts(self.run_id, kind)
+        print(
+            f"🧮 {kind}: {counts['done']}/{total} done, {counts['failed']} failed "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        return self.queue.results(self.run_id, kind)
+
+    def fetch(self) -> List[Dict]:
+        import fetch_rss_articles
+
+        sources = fetch_rss_articles.load_sources()
+        history = poll_schedule.load_history()
+        now = datetime.now(timezone.utc)
+        previous_by_source, previous_by_url = fetch_rss_articles.index_previous_articles(
+            fetch_rss_articles.load_previous_articles(), now
+        )
+        horizon_start = (now - poll_schedule.RECENCY_HORIZON).date()
+        for art in archive.query(since=horizon_start):
+            if art.get("content_ref"):
+                previous_by_url.setdefault(art["url"], art)
+        plans = {
+            src.get("name", ""): poll_schedule.plan_source(
+                src.get("name", ""), history, now, fetch_rss_articles.MAX_ARTICLES_PER_SOURCE
+            )
+            for src in sources
+        }
+        shards: List[List[Dict]] = [[] for _ in range(self.shards)]
+        for src in sources:
+            name = src.get("name", "")
+            if plans[name]["due"]:
+                window = run_budget.entries_cap(plans[name]["window"])
+                shards[shard_of(name, self.shards)].append(dict(src, window=window))
+
+        jobs = []
+        for index, shard in enumerate(shards):
+            if not shard:
+                continue
+            names = {src.get("name", "") for src in shard}
+            jobs.append((f"shard-{index}", {
+                "sources": shard,
+                "history": {n: history[n] for n in names if n in history},
+                # Bodies of known URLs are reused where the worker can see them
+                "previous": {
+                    url: {"content_ref": art["content_ref"]}
+                    for url, art in previous_by_url.items()
+                    if _source_name(art) in names and art.get("content_ref")
+                },
+            }))
+        self.queue.enqueue(self.run_id, FETCH, jobs)
+        results = self._wait(FETCH, len(jobs))
+
+        fetched: Dict[str, List[Dict]] = {}
+        for result in results.values():
+            history.update(result["history"])
+            fetched.update(result["articles"])
+
+        articles: List[Dict] = []
+        fetch_counts: Dict[str, int] = {}
+        for src in sources:
+            name = src.get("name", "")
+            if name in fetched:
+                batch = fetch_rss_articles.with_carried_forward(
+                    [blob_store.stash(art) for art in fetched[name]],
+                    previous_by_source.get(name, []),
+                )
+                print(
+                    f"✅ Fetched {len(fetched[name])} articles from {name}, "
+                    f"kept {len(batch) - len(fetched[name])} from earlier polls"
+                )
+            else:
+                # Not due, or its shard failed: carry the previous articles forward
+                batch = previous_by_source.get(name, [])
+            fetch_counts[name] = len(batch)
+            articles.extend(batch)
+        poll_schedule.save_history(history)
+        fetch_rss_articles.write_fetch_counts(fetch_counts)
+        schema.write_articles(fetch_rss_articles.OUTPUT_FILE, articles)
+        return articles
+
+    def relevance(self, recent: List[Dict]) -> List[Dict]:
+        import filter_relevance_gpt
+
+        keywords = filter_relevance_gpt.load_keywords()
+        candidates = [
+            art for art in recent
+            if art.get("title") and blob_store.has_text(art)
+            and filter_relevance_gpt.passes_prefilter(art, keywords)
+        ]
+        self.queue.enqueue(self.run_id, RELEVANCE, [
+            (_key(art), dict(art, content=blob_store.article_text(art))) for art in candidates
+        ])
+        results = self._wait(RELEVANCE, len(candidates))
+        relevant = [
+            art for art in candidates
+            if filter_relevance_gpt.apply_relevance(art, results.get(_key(art)), keywords)
+        ]
+        schema.write_articles(filter_relevance_gpt.OUTPUT_FILE, relevant)
+        return relevant
+
+    def classify(self, relevant: List[Dict]) -> List[Dict]:
+        import classify_articles_gpt
+
+        candidates = run_budget.trim_low_scores(
+            classify_articles_gpt.valid_articles_of(relevant), "classify_articles"
+        )
+        self.queue.enqueue(self.run_id, CLASSIFY, [
+            (_key(art), dict(art, content=blob_store.article_text(art))) for art in candidates
+        ])
+        results = self._wait(CLASSIFY, len(candidates))
+        classified = [
+            art for art in candidates
+            if classify_articles_gpt.apply_result(art, results.get(_key(art)))
+        ]
+        classify_articles_gpt.write_outputs(classified)
+        return classified
+
+    def stop(self, graceful: bool = True) -> None:
+        """Stop the local workers; without ``graceful`` they are terminated at once."""
+        if graceful:
+            # Each worker only leases its own stop job
+            for wid in self.worker_ids:
+                self.queue.enqueue(self.run_id, _stop_kind(wid), [("stop", None)])
+        else:
+            for proc in self.procs:
+                if proc.poll() is None:
+                    proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=60 if graceful else 5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def run(self) -> None:
+        import search_index
+
+        started = time.monotonic()
+        finished = False
+        try:
+            fetched = self.fetch()
+            # NewsAPI articles join at the date filter, as in the batch step
+            newsapi = filter_articles_by_date.load_json(filter_articles_by_date.NEWSAPI_FILE)
+            recent = filter_articles_by_date.filter_recent_indexed(fetched + newsapi)
+            schema.write_articles(filter_articles_by_date.OUTPUT_FILE, recent)
+            relevant = self.relevance(recent)
+            archive.record(relevant, "relevant")
+            classified = self.classify(relevant)
+            archive.record(classified, "classified")
+            search_index.update()
+            finished = True
+        finally:
+            # On an error or SIGTERM from main.py the workers go down with us
+            self.stop(graceful=finished)
+        print(
+            f"\U0001F4E5 {len(fetched)} fetched → {len(recent)} recent → "
+            f"{len(relevant)} relevant → {len(classified)} classified "
+            f"with {len(self.worker_ids)} worker(s) in {time.monotonic() - started:.1f}s"
+        )
+
+
+def _exit_on_sigterm(signum: int, frame: Any) -> None:
+    raise SystemExit(128 + signum)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Distributed fetch, relevance and classify")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_p = sub.add_parser("run", help="coordinate a run with local worker processes")
+    run_p.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    run_p.add_argument("--serve", type=int, metavar="PORT", help="also serve the queue over HTTP")
+    run_p.add_argument(
+        "--host",
+        default=work_queue.DEFAULT_HOST,
+        help="address to serve on; anything but loopback needs WORK_QUEUE_TOKEN",
+    )
+    worker_p = sub.add_parser("worker", help="pull jobs until stopped")
+    worker_p.add_argument("--id", default=f"{socket.gethostname()}-{os.getpid()}")
+    worker_p.add_argument("--queue", metavar="URL", help="coordinator queue URL (default: local file)")
+    worker_p.add_argument("--parent", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        # SystemExit instead of dying outright, so ``run`` still stops the workers
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
+        Coordinator(args.workers, args.serve, args.host).run()
+    else:
+        run_worker(args.id, args.queue, args.parent)
+
+
+if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
+    main()
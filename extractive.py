@@ -0,0 +1,132 @@
+"""Local extractive summaries (TextRank over sentences).
+
+Used by ``summarize_articles.py`` in two places:
+
+* ``summarize`` – a short summary made of the article's most central
+  sentences, for when the model call fails or the run budget allows no
+  more calls, so a selected article never drops out of the digest;
+* ``compress`` – the top-ranked sentences up to a character budget, in
+  their original order, sent to the model instead of the full body.
+
+Sentences are split on Chinese and English sentence punctuation and on
+line breaks. Each sentence is represented by its English words and CJK
+character bigrams (the same tokens the selection step compares titles
+with), so English and Traditional Chinese articles are ranked alike.
+"""
+
+import math
+import re
+from typing import List
+
+from select_top_articles import title_tokens
+
+# Sentences beyond this are not ranked (the graph is quadratic); long
+# articles rarely hold their key sentences that far down
+MAX_SENTENCES = 120
+MIN_SENTENCE_CHARS = 12
+DAMPING = 0.85
+ITERATIONS = 50
+TOLERANCE = 1e-6
+
+# Full-width terminators end a sentence wherever they appear (after any
+# closing quote); ". ! ?" only before whitespace, so "3.5" stays whole
+_SENTENCE_END = re.compile(
+    r"(?<=[。！？；])(?![」』”’）])"
+    r"|(?<=[。！？；][」』”’）])"
+    r"|(?<=[.!?;])(?=\s)"
+    r"|(?<=[.!?;][\"')”’])(?=\s)"
+    r"|\n+"
+)
+# Sentences ending in CJK text are joined without a space
+_CJK_END = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uff00-\uffef]$")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split ``text`` into sentences, for English and CJK text alike."""
+    return [" ".join(part.split()) for part in _SENTENCE_END.split(text or "") if part.strip()]
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    overlap = len(a & b)
+    if not overlap:
+        return 0.0
+    # TextRank's normalisation keeps long sentences from dominating
+    return overlap / (math.log(len(a) + 1) + math.log(len(b) + 1))
+
+
+def rank(sentences: List[str]) -> List[float]:
+    """Return the TextRank score of each sentence."""
+    n = len(sentences)
+    if n <= 2:
+        return [1.0] * n
+    tokens = [title_tokens(s) for s in sentences]
+    weights = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            weights[i][j] = weights[j][i] = _similarity(tokens[i], tokens[j])
+    out_sums = [sum(row) for row in weights]
+    # Incoming edges with their normalised weights, so each iteration only
+    # walks the edges that exist
+    incoming = [
+        [(j, weights[j][i] / out_sums[j]) for j in range(n) if weights[j][i]]
+        for i in range(n)
+    ]
+
+    scores = [1.0] * n
+    for _ in range(ITERATIONS):
+        new = [
+            (1 - DAMPING) + DAMPING * sum(w * scores[j] for j, w in edges)
+            for edges in incoming
+        ]
+        delta = max(abs(a - b) for a, b in zip(new, scores))
+        scores = new
+        if delta < TOLERANCE:
+            break
+    return scores
+
+
+def _pick(text: str, max_chars: int, max_sentences: int) -> List[str]:
+    sentences = split_sentences(text)
+    # Very short fragments (bylines, captions) only count if nothing else is left
+    sentences = [s for s in sentences if len(s) >= MIN_SENTENCE_CHARS] or sentences
+    sentences = sentences[:MAX_SENTENCES]
+    if not sentences:
+        return []
+    scores = rank(sentences)
+    # Ties go to the earlier sentence, as leads tend to carry the news
+    order = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))
+    chosen: List[int] = []
+    used = 0
+    for i in order:
+        if len(chosen) >= max_sentences:
+            break
+        if used + len(sentences[i]) > max_chars and chosen:
+            continue
+        chosen.append(i)
+        used += len(sentences[i]) + 1
+    return [sentences[i] for i in sorted(chosen)]
+
+
+def _join(sentences: List[str]) -> str:
+    text = ""
+    for sentence in sentences:
+        if text and not _CJK_END.search(text):
+            text += " "
+        text += sentence
+    return text
+
+
+def summarize(text: str, max_chars: int = 200, max_sentences: int = 3) -> str:
+    """Return the most central sentences of ``text`` in their original order."""
+    summary = _join(_pick(text, max_chars, max_sentences))
+    if len(summary) > max_chars:
+        summary = summary[: max_chars - 1].rstrip() + "…"
+    return summary
+
+
+def compress(text: str, max_chars: int) -> str:
+    """Return ``text`` cut down to its top-ranked sentences within ``max_chars``."""
+    if len(text) <= max_chars:
+        return text
+    # ``_pick`` always keeps one sentence, which alone may be over the budget
+    return (_join(_pick(text, max_chars, MAX_SENTENCES)) or text)[:max_chars]
@@ -1,13 +1,16 @@
 import json
 import os
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 
 import asyncio
 import aiohttp
 
-import feedparser
-from bs4 import BeautifulSoup
+import archive
+import blob_store
+import poll_schedule
+import run_budget
+import schema
 
 ALLOWED_CATEGORIES = {
     "tech",
@@ -77,16 +80,64 @@ def load_sources() -> List[Dict]:
 
 
 
-def parse_timestamp(entry: dict) -> str:
-    """Convert feedparser timestamp to ISO 8601."""
+def entry_datetime(entry: dict) -> Optional[datetime]:
+    """Return the feedparser timestamp as an aware datetime, if any."""
     ts = entry.get("published_parsed") or entry.get("updated_parsed")
     if not ts:
-        return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    dt = datetime.fromtimestamp(
+        return None
+    return datetime.fromtimestamp(
         getattr(__import__("calendar"), "timegm")(ts), tz=timezone.utc
     )
+
+
+def parse_timestamp(entry: dict) -> str:
+    """Convert feedparser timestamp to ISO 8601."""
+    dt = entry_datetime(entry) or datetime.now(timezone.utc)
     return dt.isoformat().replace("+00:00", "Z")
 
+
+def load_previous_articles() -> List[Dict]:
+    """Return the articles written by the previous run, if any."""
+    try:
+        return schema.read_articles(OUTPUT_FILE)
+    except RuntimeError:
+        return []
+
+def index_previous_articles(
+    articles: List[Dict],
+    now: Optional[datetime] = None,
+) -> Tuple[Dict[str, List[Dict]], Dict[str, Dict]]:
+    """Return the previous run's articles grouped by source name and by URL.
+
+    With ``now``, the by-source groups (carried forward for sources that are
+    not due) only keep articles that can still pass the date filter, so
+    stale ones are not sent downstream run after run until the next poll.
+    Every article stays in the by-URL index for body reuse.
+    """
+    by_source: Dict[str, List[Dict]] = {}
+    by_url: Dict[str, Dict] = {}
+    for art in articles:
+        src = art.get("source")
+        name = src.get("name") if isinstance(src, dict) else src
+        published = poll_schedule.parse_iso(art.get("publishedAt") or "")
+        if now is None or (published and poll_schedule.is_fresh(published, now)):
+            by_source.setdefault(name or "", []).append(art)
+        if art.get("url"):
+            by_url[art["url"]] = art
+    return by_source, by_url
+
+
+def with_carried_forward(batch: List[Dict], carried: List[Dict]) -> List[Dict]:
+    """Return ``batch`` plus the carried-forward articles it does not list again.
+
+    A due source is only fetched for its entry window (what it published
+    since the last poll), so its older articles still within the recency
+    horizon come from the previous run.
+    """
+    urls = {art.get("url") for art in batch}
+    return batch + [art for art in carried if art.get("url") not in urls]
+
+
 def load_keywords():
     """Return the flat keyword list."""
     with open("config/keywords.json", "r", encoding="utf-8") as f:
@@ -104,6 +155,10 @@ async def fetch_full_text_async(
                 html = await resp.text()
         except (aiohttp.ClientError, asyncio.TimeoutError):
             continue
+        # Imported here so the stages that only reuse this module's helpers
+        # do not pay for the HTML and feed parsers at startup
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(html, "html.parser")
         article = soup.find("article")
         if article:
@@ -115,12 +170,17 @@ async def fetch_full_text_async(
     return None
 
 
-async def process_feed_async(
+async def fetch_feed_entries(
     src: Dict,
     session: aiohttp.ClientSession,
-    keywords: List[str],
-) -> List[Dict]:
-    """Fetch a single RSS feed and return processed articles."""
+    max_entries: int = MAX_ARTICLES_PER_SOURCE,
+    history: Optional[Dict[str, Dict]] = None,
+) -> List[dict]:
+    """Download a feed and return the entries worth fetching in full.
+
+    ``history`` receives the observed entry timestamps for the polling
+    schedule.
+    """
     name = src.get("name", "")
     url = src.get("rss_url")
     if not url:
@@ -133,61 +193,216 @@ async def process_feed_async(
     except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
         print(f"\u26a0\ufe0f Failed to fetch feed for {name}: {exc}")
         return []
+    import feedparser
+
     feed = feedparser.parse(feed_data)
+    now = datetime.now(timezone.utc)
+    if history is not None:
+        timestamps = [entry_datetime(e) for e in feed.entries]
+        dated = [t for t in timestamps if t]
+        poll_schedule.record_poll(
+            history, name, dated, now, len(feed.entries), len(timestamps) - len(dated)
+        )
     # 🚧 [Polaris Dev] Disabled keyword/category filtering for GPT/ML classification
-    filtered_entries: List[dict] = feed.entries[:MAX_ARTICLES_PER_SOURCE]
+    # Entries older than the recency horizon never survive the date filter,
+    # so their full text is not worth fetching.
+    return [
+        e for e in feed.entries[:max_entries]
+        if poll_schedule.is_fresh(entry_datetime(e), now)
+    ]
+
+
+async def fetch_entry_ref(
+    entry: dict,
+    session: aiohttp.ClientSession,
+    previous: Optional[Dict[str, Dict]] = None,
+) -> Optional[str]:
+    """Return the blob reference of the entry's full text.
+
+    Articles in ``previous`` already point at a stored body, which is
+    reused instead of fetched again.
+    """
+    cached = (previous or {}).get(entry.get("link"))
+    if cached:
+        if cached.get("content_ref") and blob_store.exists(cached["content_ref"]):
+            return cached["content_ref"]
+        if cached.get("content"):
+            return blob_store.put(cached["content"])
+    content = await fetch_full_text_async(entry.get("link"), session)
+    return blob_store.put(content) if content else None
+
 
-    tasks = [fetch_full_text_async(e.get("link"), session) for e in filtered_entries]
+def build_article(entry: dict, name: str, content_ref: str) -> Dict:
+    return {
+        "title": entry.get("title"),
+        "content_ref": content_ref,
+        "url": entry.get("link"),
+        "source": name,
+        "publishedAt": parse_timestamp(entry),
+    }
+
+
+async def process_feed_async(
+    src: Dict,
+    session: aiohttp.ClientSession,
+    keywords: List[str],
+    max_entries: int = MAX_ARTICLES_PER_SOURCE,
+    history: Optional[Dict[str, Dict]] = None,
+    previous: Optional[Dict[str, Dict]] = None,
+) -> List[Dict]:
+    """Fetch a single RSS feed and return processed articles.
+
+    ``history`` receives the observed entry timestamps for the polling
+    schedule, and ``previous`` maps URLs to articles from the last run whose
+    full text can be reused instead of fetched again.
+    """
+    name = src.get("name", "")
+    filtered_entries = await fetch_feed_entries(src, session, max_entries, history)
+
+    tasks = [fetch_entry_ref(e, session, previous) for e in filtered_entries]
     if not tasks:
         return []
-    contents = await asyncio.gather(*tasks)
+    refs = await asyncio.gather(*tasks)
     articles: List[Dict] = []
-    for entry, content in zip(filtered_entries, contents):
-        if not content:
+    for entry, ref in zip(filtered_entries, refs):
+        if not ref:
             continue
-        article = {
-            "title": entry.get("title"),
-            "content": content,
-            "url": entry.get("link"),
-            "source": {"name": name},
-            "publishedAt": parse_timestamp(entry),
-        }
         # 🚧 [Polaris Dev] Skip keyword_score filtering
-        articles.append(article)
+        articles.append(build_article(entry, name, ref))
     return articles
 
 
+async def iter_feed_articles(
+    src: Dict,
+    session: aiohttp.ClientSession,
+    max_entries: int = MAX_ARTICLES_PER_SOURCE,
+    history: Optional[Dict[str, Dict]] = None,
+    previous: Optional[Dict[str, Dict]] = None,
+) -> AsyncIterator[Dict]:
+    """Like ``process_feed_async`` but yield each article as soon as its
+    full text arrives, so downstream stages can start right away."""
+    name = src.get("name", "")
+    entries = await fetch_feed_entries(src, session, max_entries, history)
+
+    async def _fetch(entry: dict) -> Tuple[dict, Optional[str]]:
+        return entry, await fetch_entry_ref(entry, session, previous)
+
+    for next_done in asyncio.as_completed([_fetch(e) for e in entries]):
+        entry, ref = await next_done
+        if ref:
+            yield build_article(entry, name, ref)
+
+
+async def fetch_due_sources(
+    sources: List[Dict],
+    session: aiohttp.ClientSession,
+    keywords: List[str],
+    history: Dict[str, Dict],
+    previous_by_url: Dict[str, Dict],
+    now: datetime,
+) -> Tuple[Dict[str, List[Dict]], Dict[str, Dict]]:
+    """Fetch every source that is due and return ``(fetched, plans)``.
+
+    ``fetched`` maps source names to their articles; sources that were not
+    due are absent from it.
+    """
+    plans = {
+        src.get("name", ""): poll_schedule.plan_source(
+            src.get("name", ""), history, now, MAX_ARTICLES_PER_SOURCE
+        )
+        for src in sources
+    }
+    due_sources = [src for src in sources if plans[src.get("name", "")]["due"]]
+    results = await asyncio.gather(
+        *(
+            process_feed_async(
+                src,
+                session,
+                keywords,
+                max_entries=run_budget.entries_cap(plans[src.get("name", "")]["window"]),
+                history=history,
+                previous=previous_by_url,
+            )
+            for src in due_sources
+        )
+    )
+    fetched = {src.get("name", ""): batch for src, batch in zip(due_sources, results)}
+    return fetched, plans
+
+
 async def fetch_rss_articles_async() -> List[Dict]:
     sources = load_sources()
     keywords = load_keywords()
+    history = poll_schedule.load_history()
+    now = datetime.now(timezone.utc)
+
+    previous_by_source, previous_by_url = index_previous_articles(
+        load_previous_articles(), now
+    )
+    # Articles archived within the recency horizon already have a stored body
+    horizon_start = (now - poll_schedule.RECENCY_HORIZON).date()
+    for art in archive.query(since=horizon_start):
+        if art.get("content_ref"):
+            previous_by_url.setdefault(art["url"], art)
+
     async with aiohttp.ClientSession(headers=DEFAULT_HEADERS) as session:
-        results = await asyncio.gather(
-            *(process_feed_async(src, session, keywords) for src in sources)
+        fetched, plans = await fetch_due_sources(
+            sources, session, keywords, history, previous_by_url, now
         )
+
     articles: List[Dict] = []
     fetch_counts: Dict[str, int] = {}
-    for src, batch in zip(sources, results):
+    for src in sources:
         name = src.get("name", "")
-        count = len(batch)
-        fetch_counts[name] = count
-        print(f"\u2705 Fetched {count} articles from {name}")
+        if name in fetched:
+            batch = with_carried_forward(fetched[name], previous_by_source.get(name, []))
+            print(
+                f"\u2705 Fetched {len(fetched[name])} articles from {name}, "
+                f"kept {len(batch) - len(fetched[name])} from earlier polls"
+            )
+        else:
+            # Not due yet: carry the previous run's articles forward so the
+            # source still contributes to today's candidates.
+            batch = previous_by_source.get(name, [])
+            interval = plans[name]["interval"]
+            print(
+                f"\u23ed\ufe0f Skipped {name} (polled every "
+                f"{interval.total_seconds() / 3600:.1f}h), reused {len(batch)} articles"
+            )
+        fetch_counts[name] = len(batch)
         for art in batch:
             # 🚧 [Polaris Dev] Skip keyword_score filtering
             articles.append(art)
-    os.makedirs("logs", exist_ok=True)
+    poll_schedule.save_history(history)
+    write_fetch_counts(fetch_counts)
+    return articles
+
+
+def write_fetch_counts(fetch_counts: Dict[str, int]) -> None:
+    """Write the per-source article counts of this run to ``FETCH_COUNTS_FILE``."""
+    os.makedirs(os.path.dirname(FETCH_COUNTS_FILE), exist_ok=True)
     with open(FETCH_COUNTS_FILE, "w", encoding="utf-8") as f:
         json.dump(fetch_counts, f, ensure_ascii=False, indent=2)
-    return articles
 
 
 async def main_async() -> None:
     os.makedirs("data", exist_ok=True)
     articles = await fetch_rss_articles_async()
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(articles, f, ensure_ascii=False, indent=2)
+    # Carried-forward articles from older runs may still hold inline content
+    articles = [blob_store.stash(art) for art in articles]
+    schema.write_articles(OUTPUT_FILE, articles)
+    archive.record(articles, "fetched")
     print(f"Wrote {len(articles)} articles to {OUTPUT_FILE}")
+    removed = blob_store.collect_garbage(
+        a["content_ref"] for a in articles if a.get("content_ref")
+    )
+    if removed:
+        print(f"\U0001F5D1\ufe0f Removed {removed} unreferenced article bodies")
     print(f"\U0001F4E5 RSS \u6587\u7AE0\u6578\u91CF: {len(articles)}")
 
 
 if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
     asyncio.run(main_async())
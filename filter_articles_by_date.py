@@ -1,7 +1,7 @@
-import json
-import os
-from datetime import datetime, timedelta, timezone
-from typing import List, Dict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+import schema
 
 RSS_FILE = "data/rss_articles.json"
 NEWSAPI_FILE = "data/newsapi_ai_articles.json"
@@ -9,13 +9,7 @@ OUTPUT_FILE = "data/recent_articles.json"
 
 
 def load_json(path: str) -> List[Dict]:
-    if not os.path.exists(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            raise RuntimeError(f"Invalid JSON in {path}")
+    return schema.read_articles(path)
 
 
 def parse_date(ts: str):
@@ -33,33 +27,55 @@ def parse_date(ts: str):
             return None
 
 
-def filter_recent(articles: List[Dict]) -> List[Dict]:
-    today = datetime.now(timezone.utc).date()
-    yesterday = today - timedelta(days=1)
-    recent_dates = {today, yesterday}
+def recent_dates(today: Optional[date] = None) -> Set[date]:
+    """Publish dates that count as recent on ``today`` (default: the current UTC day)."""
+    today = today or datetime.now(timezone.utc).date()
+    return {today, today - timedelta(days=1)}
+
+
+def filter_recent(articles: List[Dict], today: Optional[date] = None) -> List[Dict]:
+    dates = recent_dates(today)
 
     filtered: List[Dict] = []
     for art in articles:
         date_str = art.get("publishedAt")
-        date = parse_date(date_str) if date_str else None
-        if date and date in recent_dates:
+        published = parse_date(date_str) if date_str else None
+        if published and published in dates:
             filtered.append(art)
     return filtered
 
 
+def filter_recent_indexed(articles: List[Dict], today: Optional[date] = None) -> List[Dict]:
+    """Like ``filter_recent`` but answered by the archive's date index.
+
+    Each article's publish date is parsed once when it is recorded; the
+    recency check itself is an index lookup. Articles the archive already
+    holds unchanged (those carried forward from the previous run) are not
+    written again.
+    """
+    import archive
+
+    archive.record(articles, "fetched")
+    recent_urls = archive.urls_published_on(recent_dates(today))
+    recent = [art for art in articles if art.get("url") in recent_urls]
+    archive.record(recent, "recent")
+    return recent
+
+
 def main() -> None:
     rss_articles = load_json(RSS_FILE)
     newsapi_articles = load_json(NEWSAPI_FILE)
     combined = rss_articles + newsapi_articles
-    recent = filter_recent(combined)
+    recent = filter_recent_indexed(combined)
 
-    os.makedirs("data", exist_ok=True)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(recent, f, ensure_ascii=False, indent=2)
+    schema.write_articles(OUTPUT_FILE, recent)
     print(f"Wrote {len(recent)} articles to {OUTPUT_FILE}")
     filtered = recent
     print(f"\U0001F4C5 \u4FDD\u7559\u7684\u6700\u65B0\u6587\u7AE0\u6578\u91CF: {len(filtered)}")
 
 
 if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
     main()
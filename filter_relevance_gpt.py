@@ -1,25 +1,44 @@
 import json
-import os
 import asyncio
-import google.generativeai as genai
 from dotenv import load_dotenv
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, List, TypedDict
+
+import archive
+import audit_log
+import blob_store
+import llm_cache
+import llm_client
+import profiles
+import run_budget
+import schema
 
 INPUT_FILE = "data/recent_articles.json"
-OUTPUT_FILE = "data/classified_articles.json"
+OUTPUT_FILE = profiles.path("data/classified_articles.json")
 MAX_CONTENT_TOKENS = 1000  # Adjust based on your model's token limit
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash")
+MODEL_NAME = "gemini-2.5-flash"
 
 def load_prompt(version: str) -> str:
     path = f"prompts/filter_relevance_{version}.txt"
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
-VERSION = "v2"
-PROMPT_TEMPLATE = load_prompt(VERSION)
+VERSION = profiles.setting("relevance_prompt", "v2")
+
+
+@lru_cache(maxsize=None)
+def prompt_template() -> str:
+    return load_prompt(VERSION)
+
+
+@lru_cache(maxsize=None)
+def get_model() -> llm_client.PrefixModel:
+    # The instructions are sent once as a cached prefix; calls add the article
+    return llm_client.prefix_model(
+        MODEL_NAME, prompt_template().strip(), "filter_relevance", VERSION
+    )
 
 
 semaphore = asyncio.Semaphore(3)
@@ -29,37 +48,17 @@ def truncate_text(text: str, max_tokens: int = MAX_CONTENT_TOKENS) -> str:
     return " ".join(words[:max_tokens])
 
 def load_articles(path: str) -> List[Dict[str, Any]]:
-    if not os.path.exists(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            raise RuntimeError(f"Invalid JSON in {path}")
-
-def _parse_response(text: str) -> Dict[str, int]:
-    try:
-        import re
-        match = re.search(r"{[^{}]*}", text, re.DOTALL)
-        if match:
-            text = match.group(0)
-        else:
-            text = text.replace("```json", "").replace("```", "").strip()
-        data = json.loads(text)
-        keep = bool(data.get("keep", False))
-        try:
-            score = int(data.get("score", 0))
-        except (TypeError, ValueError):
-            score = 0
-        return {"keep": keep, "score": score}
-    except Exception as e:
-        print("⚠️ Failed to parse model response:", e)
-        print("🧪 Raw inner text was:", repr(text))
-        return {"keep": False, "score": 0}
-    
+    return schema.read_articles(path)
+
+class RelevanceResult(TypedDict):
+    keep: bool
+    score: int
+
+
 def load_keywords():
     """Return the flat keyword list."""
-    with open("config/keywords.json", "r", encoding="utf-8") as f:
+    path = profiles.setting("keywords", "config/keywords.json")
+    with open(path, "r", encoding="utf-8") as f:
         return json.load(f)["keywords"]
 
 
@@ -75,55 +74,101 @@ def keyword_score(article_text: str, keywords: List[str]) -> int:
     return score
 
 
+def passes_prefilter(article: Dict[str, Any], keywords: List[str]) -> bool:
+    """Return whether the run budget still allows a relevance call for ``article``."""
+    min_hits = run_budget.prefilter_min_hits()
+    if not min_hits:
+        return True
+    text = f"{article.get('title', '')} {blob_store.article_text(article)}"
+    if keyword_score(text, keywords) >= min_hits:
+        return True
+    run_budget.degrade("raise_prefilter", "filter_relevance", f"at least {min_hits} keyword hit(s)")
+    return False
+
+
 async def check_relevance(article: Dict[str, Any]) -> Dict[str, int] | None:
     title = article.get("title", "")
-    content = article.get("content") or article.get("description", "")
+    content = blob_store.article_text(article)
     if not title or not content:
         return None
     short_content = truncate_text(content)
-    prompt = f"{PROMPT_TEMPLATE.strip()}\n\nTitle: {title}\n\nArticle Content:\n{short_content}"
-
-    full_prompt = prompt + "\nPlease answer only in JSON format like {\"keep\": true, \"score\": 18}."
+    suffix = (
+        f"\n\nTitle: {title}\n\nArticle Content:\n{short_content}"
+        "\nPlease answer only in JSON format like {\"keep\": true, \"score\": 18}."
+    )
+    model = get_model()
+    cache_key = llm_cache.make_key("filter_relevance", MODEL_NAME, model.prefix + suffix)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     async with semaphore:
         try:
-            resp = await model.generate_content_async(full_prompt)
-            text = resp.text
+            parsed, text = await llm_client.generate_json(
+                model, suffix, RelevanceResult, "filter_relevance", VERSION
+            )
             print("📩 Model raw response:", text)
-            return _parse_response(text)
+            if parsed is None:
+                print("⚠️ Unreadable model response even after re-asking")
+                return None
+            llm_cache.put(cache_key, "filter_relevance", parsed)
+            audit_log.get_log("filter_relevance", VERSION, prompt_template()).log(
+                {"title": title, "url": article.get("url"), "response": text, "parsed": parsed}
+            )
+            return parsed
         except Exception as e:
             print(f"❌ Exception during request: {e.__class__.__name__} - {e}")
             return None
 
-async def main_async() -> None:
-    articles = load_articles(INPUT_FILE)
-    keywords = load_keywords()
+def apply_relevance(
+    art: Dict[str, Any], resp: Dict[str, int] | None, keywords: List[str]
+) -> bool:
+    """Set the combined ``score`` on a kept article and return whether it is kept."""
+    if resp and resp.get("keep"):
+        text = f"{art.get('title', '')} {blob_store.article_text(art)}"
+        kw_score = keyword_score(text, keywords)
+        gpt_score = resp.get("score", 0)
+        art["score"] = gpt_score + kw_score
+        return True
+    if resp is None:
+        print(f"⚠️ Skipped article due to LLM error: {art['title']}")
+    return False
+
+
+async def score_articles(
+    articles: List[Dict[str, Any]], keywords: List[str]
+) -> List[Dict[str, Any]]:
+    """Return the relevant articles with their combined ``score`` set."""
     valid_articles = []
     results = []
 
     for art in articles:
-        if art.get("title") and (art.get("content") or art.get("description")):
+        if art.get("title") and blob_store.has_text(art) and passes_prefilter(art, keywords):
             valid_articles.append(art)
 
     tasks = [check_relevance(art) for art in valid_articles]
     responses = await asyncio.gather(*tasks)
 
     for art, resp in zip(valid_articles, responses):
-        if resp and resp.get("keep"):
-            text = f"{art.get('title', '')} {art.get('content') or art.get('description', '')}"
-            kw_score = keyword_score(text, keywords)
-            gpt_score = resp.get("score", 0)
-            art["score"] = gpt_score + kw_score
+        if apply_relevance(art, resp, keywords):
             results.append(art)
-        elif resp is None:
-            print(f"⚠️ Skipped article due to LLM error: {art['title']}")
+    return results
+
 
-    os.makedirs("data", exist_ok=True)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+async def main_async() -> None:
+    articles = load_articles(INPUT_FILE)
+    keywords = load_keywords()
+    results = await score_articles(articles, keywords)
+    await audit_log.close_all()
+
+    schema.write_articles(OUTPUT_FILE, results)
+    archive.record(results, "relevant")
     print(f"✅ Wrote {len(results)} relevant articles to {OUTPUT_FILE}")
     relevant_articles = results
     print(f"\U0001F9E0 GPT \u5224\u5B9A\u70BA\u76F8\u95DC\u7684\u6587\u7AE0\u6578\u91CF: {len(relevant_articles)}")
 
 if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
     asyncio.run(main_async())
@@ -1,16 +1,19 @@
-import json
 import math
 from datetime import datetime
-from jinja2 import Template
+from functools import lru_cache
+from jinja2 import Environment, FileSystemLoader
 from collections import defaultdict
 import os
-import asyncio
-import google.generativeai as genai
-from dotenv import load_dotenv
 
-TEMPLATE_FILE = "templates/digest_single_column.html"
-JSON_PATH = "data/news_data.json"
-OUTPUT_FILE = "result/digest.html"
+import blob_store
+import profiles
+import schema
+import segments
+from segments import normalize_category as normalize
+
+TEMPLATE_FILE = profiles.setting("template", "templates/digest_single_column.html")
+JSON_PATH = profiles.path("data/news_data.json")
+OUTPUT_FILE = profiles.path("result/digest.html")
 REGIONS = ["Taiwan", "Global"]
 
 CATEGORY_DISPLAY_NAME = {
@@ -21,32 +24,8 @@ CATEGORY_DISPLAY_NAME = {
 }
 CATEGORIES = list(CATEGORY_DISPLAY_NAME.keys())
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-summary_model = genai.GenerativeModel("gemini-2.5-flash")
-
 def load_articles(path: str):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Invalid JSON in {path}") from e
-
-
-def normalize(cat: str) -> str:
-    cat = cat or ""
-    if "\u2013" in cat:
-        cat = cat.split("\u2013", 1)[1].strip()
-    if "-" in cat and cat.split("-", 1)[0].strip() in ["Global", "Taiwan"]:
-        cat = cat.split("-", 1)[1].strip()
-    return {
-        "Research": "Research",
-        "Startup": "Startup",
-        "Infrastructure": "Infrastructure",
-        "FinTech": "FinTech",
-    }.get(cat, cat)
+    return schema.read_digest_items(path)
 
 
 def prepare_articles(articles):
@@ -57,7 +36,7 @@ def prepare_articles(articles):
         article["source"] = src or "Unknown Source"
 
         if not article.get("read_time"):
-            content = article.get("content", "")
+            content = blob_store.article_text(article)
             word_count = len(content.split())
             article["read_time"] = f"{max(1, math.ceil(word_count / 200))} min read"
 
@@ -80,11 +59,11 @@ def group_articles_by_region(articles):
     return grouped
 
 
-def group_articles_by_category(articles_list):
+def group_articles_by_category(articles_list, categories=None):
     grouped = defaultdict(list)
     for article in articles_list:
         grouped[article["category_key"]].append(article)
-    for cat_key in CATEGORIES:
+    for cat_key in categories or CATEGORIES:
         if cat_key not in grouped or not grouped[cat_key]:
             grouped[cat_key].append({
                 "title": "(No article selected)",
@@ -100,37 +79,69 @@ def group_articles_by_category(articles_list):
     return grouped
 
 
-def generate_html(articles):
-    prepare_articles(articles)
-    grouped = group_articles_by_region(articles)
+@lru_cache(maxsize=None)
+def get_template():
+    """Compile the digest template once per process."""
+    env = Environment(
+        loader=FileSystemLoader(os.path.dirname(TEMPLATE_FILE)),
+        auto_reload=False,
+    )
+    return env.get_template(os.path.basename(TEMPLATE_FILE))
 
-    global_articles = grouped.get("Global", [])
-    taiwan_articles = grouped.get("Taiwan", []) 
 
-    filtered_global_articles = [a for a in global_articles if a.get("title") and a["title"] != "(No article selected)"]
-    filtered_taiwan_articles = [a for a in taiwan_articles if a.get("title") and a["title"] != "(No article selected)"] 
+def generate_html(articles, regions=None, categories=None, day=None):
+    """Render the digest, limited to ``regions`` / ``categories`` when given.
 
-    grouped_global = group_articles_by_category(filtered_global_articles)
-    grouped_taiwan = group_articles_by_category(filtered_taiwan_articles) 
+    ``day`` is the date shown in the digest (default: today).
+    """
+    prepare_articles(articles)
+    articles = segments.select_articles(articles, regions, categories)
+    grouped = group_articles_by_region(articles)
+
+    global_articles = grouped.get("Global", []) if not regions or "Global" in regions else None
+    taiwan_articles = grouped.get("Taiwan", []) if not regions or "Taiwan" in regions else None
 
-    with open(TEMPLATE_FILE, "r", encoding="utf-8") as f:
-        template = Template(f.read())
+    def by_category(region_articles):
+        if region_articles is None:
+            return {}
+        filtered = [a for a in region_articles if a.get("title") and a["title"] != "(No article selected)"]
+        return group_articles_by_category(filtered, categories)
 
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    return template.render(
+    date_str = (day or datetime.now()).strftime("%Y-%m-%d")
+    return get_template().render(
         date=date_str,
-        global_articles=grouped_global,
-        taiwan_articles=grouped_taiwan,
+        global_articles=by_category(global_articles),
+        taiwan_articles=by_category(taiwan_articles),
     )
 
 
+def write_segments(articles):
+    """Render each subscriber segment once and return ``{name: path}``."""
+    paths = {}
+    for segment in segments.load_segments():
+        if segment["name"] == segments.FULL_DIGEST:
+            continue
+        path = segments.html_path(segment)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate_html(articles, segment["regions"], segment["categories"]))
+        paths[segment["name"]] = path
+    return paths
+
+
 def main():
     articles = load_articles(JSON_PATH)
     html = generate_html(articles)
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
         f.write(html)
     print(f"✅ Generated {OUTPUT_FILE}")
+    for name, path in write_segments(articles).items():
+        print(f"✅ Generated {path} for segment {name}")
 
 
 if __name__ == '__main__':
+    import profiler
+
+    profiler.enable_from_args()
     main()
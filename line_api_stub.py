@@ -0,0 +1,88 @@
+"""Minimal local stand-in for the LINE Messaging API.
+
+Accepts push, multicast, broadcast and reply requests, checks the payload
+limits the real API enforces, and prints what would have been delivered.
+A share of requests can be answered with 429 to exercise retries::
+
+    python line_api_stub.py --port 8080 --throttle 0.2
+    LINE_API_BASE=http://localhost:8080 LINE_USER_IDS=U1,U2 python send_to_line.py
+"""
+
+import argparse
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_RECIPIENTS = 500
+MAX_MESSAGES = 5
+
+stats = {"requests": 0, "throttled": 0, "deliveries": 0}
+seen_retry_keys = set()
+lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    throttle = 0.0
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            return self._reply(400, {"message": "invalid JSON"})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._reply(401, {"message": "missing token"})
+
+        with lock:
+            stats["requests"] += 1
+            if random.random() < self.throttle:
+                stats["throttled"] += 1
+                return self._reply(429, {"message": "rate limited"})
+            retry_key = self.headers.get("X-Line-Retry-Key")
+            if retry_key and retry_key in seen_retry_keys:
+                return self._reply(409, {"message": "already accepted"})
+            if retry_key:
+                seen_retry_keys.add(retry_key)
+
+        messages = payload.get("messages") or []
+        if not 1 <= len(messages) <= MAX_MESSAGES:
+            return self._reply(400, {"message": f"{len(messages)} messages"})
+        if self.path.endswith("/multicast"):
+            recipients = len(payload.get("to") or [])
+            if not 1 <= recipients <= MAX_RECIPIENTS:
+                return self._reply(400, {"message": f"{recipients} recipients"})
+        else:
+            recipients = 1
+        with lock:
+            stats["deliveries"] += recipients * len(messages)
+        print(f"📨 {self.path}: {len(messages)} message(s) to {recipients} recipient(s) {stats}")
+        self._reply(200, {})
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local LINE Messaging API stub")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--throttle", type=float, default=0.0,
+                        help="share of requests answered with 429")
+    args = parser.parse_args()
+    Handler.throttle = args.throttle
+    print(f"🧪 LINE API stub listening on http://localhost:{args.port}")
+    ThreadingHTTPServer(("localhost", args.port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Persistent cache of parsed LLM answers.
+
+The relevance, classification and summarization prompts are deterministic
+functions of the prompt template and the article, so the same article seen
+again (a rerun, the daemon's next poll, another digest profile with the
+same prompt) does not need another model call. Answers are stored in a
+small SQLite table keyed by a hash of the stage, model and full prompt;
+changing the template or the article changes the key. Entries older than
+``MAX_AGE_DAYS`` are dropped when the cache is opened.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+CACHE_FILE = "data/llm_cache.sqlite"
+MAX_AGE_DAYS = 30
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        folder = os.path.dirname(CACHE_FILE)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        _conn = sqlite3.connect(CACHE_FILE, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, stage TEXT NOT NULL,"
+            " value TEXT NOT NULL, created_at TEXT NOT NULL)"
+        )
+        cutoff = datetime.now(timezone.utc) - timedelta(days=MAX_AGE_DAYS)
+        _conn.execute("DELETE FROM answers WHERE created_at < ?", (cutoff.isoformat(),))
+    return _conn
+
+
+def make_key(stage: str, model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{stage}\0{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[Any]:
+    with _lock:
+        row = _connect().execute("SELECT value FROM answers WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def put(key: str, stage: str, value: Any) -> None:
+    with _lock:
+        _connect().execute(
+            "INSERT OR REPLACE INTO answers (key, stage, value, created_at) VALUES (?, ?, ?, ?)",
+            (key, stage, json.dumps(value, ensure_ascii=False),
+             datetime.now(timezone.utc).isoformat()),
+        )
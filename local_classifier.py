@@ -0,0 +1,434 @@
+"""Local category/region classifier distilled from the LLM's labels.
+
+``classify_articles_gpt.py`` picks one of four categories and two regions
+and a keep flag, a small label space that a linear model learns well from
+the answers the LLM has already given. This module trains one softmax
+regression per field (``category``, ``region``, ``keep``) over hashed
+features:
+
+* English words and CJK character bigrams of the title and of the start
+  of the body,
+* the source name and the ``region`` it has in ``config/sources.json``,
+  which often decides the region on its own.
+
+Labels come from the classify audit logs (``logs/`` and the run bundles
+in ``artifacts/``), so only LLM answers are learned from; bodies and
+sources are looked up in the archive. At run time ``classify`` answers
+when every field is at least ``min_confidence`` likely and returns
+``None`` otherwise, so only uncertain articles reach the model. Local
+answers go to their own audit log and never become training labels.
+
+::
+
+    python local_classifier.py train     # fit, report held-out agreement, write MODEL_FILE
+    python local_classifier.py eval      # agreement and coverage of the saved model
+
+A model is only used for the classify prompt version it was trained on.
+Set ``LOCAL_CLASSIFIER=0`` to send every article to the LLM.
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import math
+import os
+import random
+import zlib
+from collections import Counter
+from contextlib import closing
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import schema
+from select_top_articles import source_name, title_tokens
+
+MODEL_FILE = "models/local_classifier.json"
+ENABLED = os.getenv("LOCAL_CLASSIFIER", "1") != "0"
+SOURCES_FILE = "config/sources.json"
+
+BUCKETS = 2 ** 18
+# Only the start of the body is used; it carries the topic and keeps
+# training fast
+BODY_CHARS = 1500
+EPOCHS = 6
+LEARNING_RATE = 0.5
+# Weights this small are dropped from the saved model
+PRUNE_BELOW = 1e-3
+MIN_CONFIDENCE = 0.9
+MIN_EXAMPLES = 200
+# One article in HOLDOUT_EVERY is kept out of training for the metrics
+HOLDOUT_EVERY = 5
+THRESHOLDS = [0.6, 0.7, 0.8, 0.9, 0.95, 0.98]
+
+# Answers per run, reported by the classify step
+stats: Counter = Counter()
+
+
+class Example(NamedTuple):
+    url: str
+    title: str
+    body: str
+    source: str
+    labels: Dict[str, Any]
+
+
+# ---------------------------------------------------------------------------
+# Features
+
+
+@lru_cache(maxsize=None)
+def source_regions() -> Dict[str, str]:
+    data = schema.read_json(SOURCES_FILE) or {}
+    return {
+        src.get("name", ""): src.get("region", "")
+        for src in data.get("rss_sources", []) + data.get("rsshub_sources", [])
+    }
+
+
+def _bucket(name: str) -> int:
+    # crc32 rather than hash(): the buckets must not change between processes
+    return zlib.crc32(name.encode("utf-8")) % BUCKETS
+
+
+def features(title: str, body: str, source: str) -> Dict[int, float]:
+    names = {f"t:{tok}" for tok in title_tokens(title)}
+    names.update(f"b:{tok}" for tok in title_tokens(body[:BODY_CHARS]))
+    if source:
+        names.add(f"src:{source}")
+        region = source_regions().get(source)
+        if region:
+            names.add(f"src_region:{region}")
+    names.add("bias")
+    value = 1 / math.sqrt(len(names))
+    return {_bucket(name): value for name in names}
+
+
+# ---------------------------------------------------------------------------
+# Model
+
+
+class Head:
+    """Softmax regression over hashed features for one label field."""
+
+    def __init__(self, classes: List[Any], weights: Optional[Dict[int, List[float]]] = None) -> None:
+        self.classes = classes
+        self.weights: Dict[int, List[float]] = weights or {}
+
+    def probabilities(self, x: Dict[int, float]) -> List[float]:
+        scores = [0.0] * len(self.classes)
+        for index, value in x.items():
+            row = self.weights.get(index)
+            if row:
+                for c, w in enumerate(row):
+                    scores[c] += w * value
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, x: Dict[int, float]) -> Tuple[Any, float]:
+        probs = self.probabilities(x)
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.classes[best], probs[best]
+
+    def update(self, x: Dict[int, float], label: Any, rate: float) -> None:
+        probs = self.probabilities(x)
+        target = self.classes.index(label)
+        for index, value in x.items():
+            row = self.weights.setdefault(index, [0.0] * len(self.classes))
+            for c, p in enumerate(probs):
+                row[c] -= rate * (p - (c == target)) * value
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "classes": self.classes,
+            "weights": {
+                str(index): [round(w, 4) for w in row]
+                for index, row in self.weights.items()
+                if max(abs(w) for w in row) >= PRUNE_BELOW
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Head":
+        return cls(data["classes"], {int(k): v for k, v in data["weights"].items()})
+
+
+class LocalClassifier:
+    def __init__(
+        self,
+        heads: Dict[str, Head],
+        prompt_version: str,
+        min_confidence: float = MIN_CONFIDENCE,
+        metrics: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.heads = heads
+        self.prompt_version = prompt_version
+        self.min_confidence = min_confidence
+        self.metrics = metrics or {}
+
+    def predict(self, title: str, body: str, source: str) -> Tuple[Dict[str, Any], float]:
+        """Return the labels and the confidence of the least certain field."""
+        x = features(title, body, source)
+        labels: Dict[str, Any] = {}
+        confidences: Dict[str, float] = {}
+        for field, head in self.heads.items():
+            labels[field], p = head.predict(x)
+            confidences[field] = p
+        # Category and region of a rejected article are never used
+        fields = [f for f in confidences if labels["keep"] or f == "keep"]
+        return labels, min(confidences[f] for f in fields)
+
+    def save(self, path: str = MODEL_FILE) -> None:
+        schema.write_json(
+            path,
+            {
+                "trained_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                "prompt_version": self.prompt_version,
+                "buckets": BUCKETS,
+                "min_confidence": self.min_confidence,
+                "metrics": self.metrics,
+                "heads": {field: head.to_json() for field, head in self.heads.items()},
+            },
+        )
+
+    @classmethod
+    def load(cls, path: str = MODEL_FILE) -> Optional["LocalClassifier"]:
+        data = schema.read_json(path)
+        if not data or data.get("buckets") != BUCKETS:
+            return None
+        return cls(
+            {field: Head.from_json(head) for field, head in data["heads"].items()},
+            data["prompt_version"],
+            float(data.get("min_confidence", MIN_CONFIDENCE)),
+            data.get("metrics"),
+        )
+
+
+@lru_cache(maxsize=None)
+def get_model() -> Optional[LocalClassifier]:
+    return LocalClassifier.load() if ENABLED else None
+
+
+def classify(article: Dict[str, Any], body: str, version: str) -> Optional[Dict[str, Any]]:
+    """Return a confident local answer for ``article``, or ``None`` to ask the LLM."""
+    model = get_model()
+    if model is None or model.prompt_version != version:
+        return None
+    labels, confidence = model.predict(article.get("title", ""), body, source_name(article))
+    if confidence < model.min_confidence:
+        stats["llm"] += 1
+        return None
+    stats["local"] += 1
+    import audit_log
+
+    audit_log.get_log("local_classifier", version).log(
+        {"title": article.get("title"), "url": article.get("url"), "parsed": labels,
+         "confidence": round(confidence, 4)}
+    )
+    return labels
+
+
+def summary() -> str:
+    total = stats["local"] + stats["llm"]
+    if not total:
+        return ""
+    return (
+        f"🏷️ Local classifier answered {stats['local']}/{total} articles, "
+        f"{stats['llm']} went to the LLM"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Training data
+
+
+def _log_lines(version: str) -> Iterator[str]:
+    base = os.path.join("logs", f"classify_articles_log_{version}")
+    for path in sorted(glob.glob(f"{base}.*.jsonl.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            yield from f
+    if os.path.exists(f"{base}.jsonl"):
+        with open(f"{base}.jsonl", encoding="utf-8") as f:
+            yield from f
+
+
+def _bundle_entries(version: str) -> Iterator[Dict[str, Any]]:
+    import artifacts
+
+    member = f"logs/classify_articles_log_{version}.jsonl"
+    for manifest in reversed(artifacts.manifests()):
+        if member in manifest["members"]:
+            yield from artifacts.read(manifest, member)
+
+
+def llm_labels(version: str) -> Dict[str, Dict[str, Any]]:
+    """Return ``url -> entry`` of every logged LLM answer; later answers win."""
+    from classify_articles_gpt import CATEGORY_MAPPING, REGIONS
+
+    def _entries() -> Iterator[Dict[str, Any]]:
+        yield from _bundle_entries(version)
+        for line in _log_lines(version):
+            if line.strip():
+                yield json.loads(line)
+
+    labelled: Dict[str, Dict[str, Any]] = {}
+    for entry in _entries():
+        parsed = entry.get("parsed") or {}
+        category = CATEGORY_MAPPING.get(parsed.get("category", ""))
+        region = parsed.get("region", "Global")
+        if not entry.get("url") or category is None or region not in REGIONS:
+            continue
+        labelled[entry["url"]] = {
+            "title": entry.get("title") or "",
+            "labels": {"category": category, "region": region, "keep": bool(parsed.get("keep"))},
+        }
+    return labelled
+
+
+def load_examples(version: str) -> List[Example]:
+    import archive
+    import blob_store
+
+    labelled = llm_labels(version)
+    rows: Dict[str, Any] = {}
+    with closing(archive.connect()) as conn:
+        urls = list(labelled)
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT * FROM articles WHERE url IN ({marks})", chunk):
+                rows[row["url"]] = archive.to_article(row)
+    examples = []
+    for url, entry in labelled.items():
+        art = rows.get(url, {})
+        body = blob_store.article_text(art) if art else ""
+        examples.append(
+            Example(url, entry["title"], body, source_name(art), entry["labels"])
+        )
+    return examples
+
+
+def _held_out(url: str) -> bool:
+    return zlib.crc32(url.encode("utf-8")) % HOLDOUT_EVERY == 0
+
+
+# ---------------------------------------------------------------------------
+# Training and evaluation
+
+
+def train(examples: List[Example], version: str, min_confidence: float = MIN_CONFIDENCE) -> LocalClassifier:
+    from classify_articles_gpt import REGIONS, STANDARD_CATEGORIES
+
+    heads = {
+        "keep": Head([False, True]),
+        "category": Head(sorted(STANDARD_CATEGORIES)),
+        "region": Head(list(REGIONS)),
+    }
+    data = [(features(ex.title, ex.body, ex.source), ex.labels) for ex in examples]
+    order = list(range(len(data)))
+    rng = random.Random(0)
+    for epoch in range(EPOCHS):
+        rng.shuffle(order)
+        rate = LEARNING_RATE / (1 + epoch)
+        for i in order:
+            x, labels = data[i]
+            heads["keep"].update(x, labels["keep"], rate)
+            # Category and region of rejected articles are never used
+            if labels["keep"]:
+                heads["category"].update(x, labels["category"], rate)
+                heads["region"].update(x, labels["region"], rate)
+    return LocalClassifier(heads, version, min_confidence)
+
+
+def _agrees(predicted: Dict[str, Any], expected: Dict[str, Any]) -> bool:
+    if predicted["keep"] != expected["keep"]:
+        return False
+    return not expected["keep"] or (
+        predicted["category"] == expected["category"] and predicted["region"] == expected["region"]
+    )
+
+
+def evaluate(model: LocalClassifier, examples: List[Example]) -> Dict[str, Any]:
+    """Agreement with the LLM labels, overall and above each confidence threshold."""
+    predictions = [
+        (model.predict(ex.title, ex.body, ex.source), ex.labels) for ex in examples
+    ]
+    n = len(predictions) or 1
+    fields: Dict[str, float] = {}
+    for field in ("keep", "category", "region"):
+        relevant = [(p, e) for (p, _), e in predictions if field == "keep" or e["keep"]]
+        hits = sum(p[field] == e[field] for p, e in relevant)
+        fields[field] = round(hits / (len(relevant) or 1), 4)
+    by_threshold = {}
+    for threshold in sorted(set(THRESHOLDS + [model.min_confidence])):
+        confident = [(p, e) for (p, c), e in predictions if c >= threshold]
+        agreed = sum(_agrees(p, e) for p, e in confident)
+        by_threshold[str(threshold)] = {
+            "coverage": round(len(confident) / n, 4),
+            "agreement": round(agreed / (len(confident) or 1), 4),
+        }
+    return {
+        "examples": len(predictions),
+        "accuracy": fields,
+        "agreement": round(sum(_agrees(p, e) for (p, _), e in predictions) / n, 4),
+        "thresholds": by_threshold,
+    }
+
+
+def print_metrics(metrics: Dict[str, Any], min_confidence: float) -> None:
+    accuracy = metrics["accuracy"]
+    print(
+        f"📊 {metrics['examples']} articles: keep {accuracy['keep']:.1%}, "
+        f"category {accuracy['category']:.1%}, region {accuracy['region']:.1%}, "
+        f"all fields {metrics['agreement']:.1%} agreement with the LLM"
+    )
+    for threshold, row in metrics["thresholds"].items():
+        marker = "  ← in use" if float(threshold) == min_confidence else ""
+        print(
+            f"   confidence ≥ {float(threshold):.2f}: {row['coverage']:6.1%} answered locally, "
+            f"{row['agreement']:6.1%} agree{marker}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train or evaluate the local classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_p = sub.add_parser("train", help="fit on the logged LLM labels and save the model")
+    train_p.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE)
+    eval_p = sub.add_parser("eval", help="compare the saved model with the LLM labels")
+    for p in (train_p, eval_p):
+        p.add_argument("--version", help="classify prompt version (default: the active one)")
+    args = parser.parse_args()
+
+    from classify_articles_gpt import VERSION
+
+    version = args.version or VERSION
+    examples = load_examples(version)
+    if args.command == "train":
+        if len(examples) < MIN_EXAMPLES:
+            raise SystemExit(
+                f"Only {len(examples)} labelled articles for prompt {version}; "
+                f"need at least {MIN_EXAMPLES}"
+            )
+        held_out = [ex for ex in examples if _held_out(ex.url)]
+        trial = train([ex for ex in examples if not _held_out(ex.url)], version, args.min_confidence)
+        metrics = evaluate(trial, held_out)
+        print("Held-out articles:")
+        print_metrics(metrics, args.min_confidence)
+        model = train(examples, version, args.min_confidence)
+        model.metrics = metrics
+        model.save()
+        print(f"✅ Trained on {len(examples)} articles, wrote {MODEL_FILE}")
+    else:
+        model = LocalClassifier.load()
+        if model is None:
+            raise SystemExit(f"No model in {MODEL_FILE}; run `python local_classifier.py train`")
+        # Labels logged since training are new to the model
+        print_metrics(evaluate(model, examples), model.min_confidence)
+
+
+if __name__ == "__main__":
+    main()
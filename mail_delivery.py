@@ -0,0 +1,200 @@
+"""SMTP delivery engine for the email digest.
+
+``send_digest`` used to open one SMTP session and hand every address to a
+single ``sendmail`` call, so one refused recipient or a dropped connection
+failed the whole send, and everybody shared one To header. This module
+instead:
+
+* serializes each digest variant once and only prepends a per-recipient
+  ``To`` header, so every subscriber gets their own copy,
+* keeps a small pool of persistent, logged-in SMTP connections and sends
+  batches of recipients concurrently over them,
+* retries recipients that failed with a temporary error (4xx replies,
+  dropped connections) on a fresh connection, and
+* appends one outcome line per recipient to ``OUTCOMES_FILE``.
+
+Server settings come from the environment, so a local stand-in works too::
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_SSL=0 python send_digest.py
+"""
+
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email import policy
+from email.message import EmailMessage
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("SMTP_SSL", "1").lower() not in ("0", "false", "no")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "").lower() in ("1", "true", "yes")
+
+OUTCOMES_FILE = "logs/mail_outcomes.jsonl"
+
+# Gmail allows only a few simultaneous sessions per account
+MAX_CONNECTIONS = int(os.getenv("SMTP_CONNECTIONS", "3"))
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 5
+TIMEOUT_SECONDS = 30
+
+
+class Variant(NamedTuple):
+    """One rendered digest and the addresses that should receive it."""
+
+    name: str
+    message: EmailMessage
+    recipients: List[str]
+
+
+class SMTPPool:
+    """Hands out persistent, logged-in SMTP connections, at most ``size`` at a time."""
+
+    def __init__(self, user: Optional[str], password: Optional[str], size: int = MAX_CONNECTIONS) -> None:
+        self.user = user
+        self.password = password
+        self.idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+        self.size = size
+        # Callers beyond ``size`` wait here, so the server never sees more sessions
+        self.slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        if SMTP_SSL:
+            conn = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=TIMEOUT_SECONDS)
+        else:
+            conn = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=TIMEOUT_SECONDS)
+            if SMTP_STARTTLS:
+                conn.starttls()
+        if self.user and self.password:
+            conn.login(self.user, self.password)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        self.slots.acquire()
+        try:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            except BaseException:
+                # The session may be broken or mid-command: never reuse it
+                _quit(conn)
+                raise
+            else:
+                self.idle.put(conn)
+        finally:
+            self.slots.release()
+
+    def close(self) -> None:
+        while not self.idle.empty():
+            _quit(self.idle.get_nowait())
+
+
+def _quit(conn: smtplib.SMTP) -> None:
+    try:
+        conn.quit()
+    except (smtplib.SMTPException, OSError):
+        conn.close()
+
+
+def _is_temporary(code: int) -> bool:
+    return 400 <= code < 500
+
+
+def _send_batch(
+    pool: SMTPPool, sender: str, body: bytes, recipients: List[str]
+) -> Dict[str, Tuple[str, str]]:
+    """Send ``body`` to each recipient; return ``{recipient: (status, error)}``."""
+    results: Dict[str, Tuple[str, str]] = {}
+    pending = list(recipients)
+    try:
+        with pool.connection() as conn:
+            while pending:
+                rcpt = pending[0]
+                try:
+                    conn.sendmail(sender, [rcpt], f"To: {rcpt}\r\n".encode("utf-8") + body)
+                    results[rcpt] = ("sent", "")
+                except smtplib.SMTPRecipientsRefused as exc:
+                    code, reply = exc.recipients.get(rcpt, (550, b""))
+                    status = "retry" if _is_temporary(code) else "failed"
+                    results[rcpt] = (status, f"{code} {reply.decode(errors='replace')}")
+                except smtplib.SMTPResponseException as exc:
+                    if isinstance(exc, smtplib.SMTPAuthenticationError):
+                        raise
+                    status = "retry" if _is_temporary(exc.smtp_code) else "failed"
+                    results[rcpt] = (status, f"{exc.smtp_code} {exc.smtp_error!r}")
+                    conn.rset()
+                pending.pop(0)
+    except smtplib.SMTPAuthenticationError:
+        raise
+    except (smtplib.SMTPException, OSError) as exc:
+        # The connection dropped: everything not yet sent is retried
+        for rcpt in pending:
+            results[rcpt] = ("retry", str(exc) or type(exc).__name__)
+    return results
+
+
+def _record(outcomes: List[Dict]) -> None:
+    os.makedirs(os.path.dirname(OUTCOMES_FILE), exist_ok=True)
+    with open(OUTCOMES_FILE, "a", encoding="utf-8") as f:
+        for outcome in outcomes:
+            f.write(json.dumps(outcome, ensure_ascii=False) + "\n")
+
+
+def deliver(
+    variants: List[Variant], sender: str, password: Optional[str] = None
+) -> Dict[str, int]:
+    """Send every variant to its recipients and return outcome counts."""
+    pool = SMTPPool(sender, password)
+    now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    counts = {"sent": 0, "failed": 0}
+    outcomes: List[Dict] = []
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            for variant in variants:
+                # The recipient header is the only per-copy difference
+                message = variant.message
+                del message["To"]
+                body = message.as_bytes(policy=policy.SMTP)
+                pending = list(dict.fromkeys(variant.recipients))
+                for attempt in range(1, MAX_ATTEMPTS + 1):
+                    batches = [
+                        pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)
+                    ]
+                    results: Dict[str, Tuple[str, str]] = {}
+                    for batch_results in executor.map(
+                        lambda batch: _send_batch(pool, sender, body, batch), batches
+                    ):
+                        results.update(batch_results)
+                    pending = []
+                    for rcpt, (status, error) in results.items():
+                        if status == "retry" and attempt < MAX_ATTEMPTS:
+                            pending.append(rcpt)
+                            continue
+                        status = "sent" if status == "sent" else "failed"
+                        counts[status] += 1
+                        outcomes.append(
+                            {
+                                "ts": now, "variant": variant.name, "recipient": rcpt,
+                                "status": status, "attempts": attempt, "error": error,
+                            }
+                        )
+                    if not pending:
+                        break
+                    print(f"⚠️ Retrying {len(pending)} recipient(s) of {variant.name}")
+                    time.sleep(RETRY_DELAY_SECONDS * attempt)
+    finally:
+        pool.close()
+        _record(outcomes)
+    return counts
@@ -1,15 +1,21 @@
+import argparse
 import os
 import sys
 import subprocess
+import time
 from datetime import datetime
 
+import profiler
+import profiles
+import run_budget
+
 # Define all steps and expected output files
 STEPS = [
 
     ("fetch_rss_articles.py", "data/rss_articles.json"),
     ("filter_articles_by_date.py", "data/recent_articles.json"),
     ("filter_relevance_gpt.py", "data/classified_articles.json"),
-    ("classify_articles_gpt.py", "data/news_data.json"),
+    ("classify_articles_gpt.py", "data/categorized_articles.json"),
     ("select_top_articles.py", "data/selected_articles.json"),
     ("summarize_articles.py", "data/news_data.json"),
     ("validate_news_data.py", "data/news_data.json"),
@@ -17,6 +23,28 @@ STEPS = [
     ("send_digest.py", None),
 ]
 
+# ``stream_pipeline.py`` replaces the first four steps (fetch, date filter,
+# relevance and classify) with overlapping, queue-connected workers.
+STREAM_STEP = ("stream_pipeline.py", "data/categorized_articles.json")
+STREAMED_STEPS = 4
+# ``distributed.py`` replaces the same four steps with jobs shared out to
+# worker processes.
+DISTRIBUTED_STEP = ("distributed.py", "data/categorized_articles.json")
+# Fetch and date filter are shared by every digest profile; the remaining
+# steps run once per profile in ``config/profiles.json``.
+SHARED_STEPS = 2
+# Rendering and sending always run, even after the deadline; the other
+# steps are stopped early enough to leave them this much time.
+DELIVERY_STEPS = ("generate_digest.py", "send_digest.py")
+DELIVERY_RESERVE_SECONDS = 180
+MIN_STEP_SECONDS = 60
+# A step past its timeout gets SIGTERM (it saves its budget usage and
+# exits); it is killed if it is still running after this long.
+STOP_GRACE_SECONDS = 20
+# Steps that rewrite their input in place; their output may come from an
+# earlier step of the same run.
+IN_PLACE_STEPS = ("validate_news_data.py",)
+
 
 def check_output_file(path: str) -> None:
     if not path:
@@ -25,34 +53,199 @@ def check_output_file(path: str) -> None:
         print(f"⚠️ Warning: {path} is missing or empty")
 
 
-def run_step(index: int, script: str, output: str | None) -> None:
-    print(f"🔧 [Step {index}] Running {script}...")
+def discard_stale_output(path: str | None, since: float) -> None:
+    """Move aside ``path`` if it was not written after ``since``.
+
+    A step that failed or was stopped leaves the previous run's file behind;
+    the next steps must not mistake it for this run's output.
+    """
+    if not path or not os.path.exists(path) or os.path.getmtime(path) >= since:
+        return
+    os.replace(path, f"{path}.stale")
+    print(f"🗑️ Moved stale {path} aside to {path}.stale")
+
+
+def step_timeout(script: str) -> float | None:
+    """Return how long ``script`` may run before the run deadline is at risk."""
+    remaining = run_budget.remaining_seconds()
+    if remaining is None or script in DELIVERY_STEPS:
+        return None
+    return max(remaining - DELIVERY_RESERVE_SECONDS, MIN_STEP_SECONDS)
+
+
+def run_step(
+    index: int,
+    script: str,
+    output: str | None,
+    args: list[str] | None = None,
+    profile: str = profiles.DEFAULT_PROFILE,
+    run_started: float = 0.0,
+) -> None:
+    label = script if profile == profiles.DEFAULT_PROFILE else f"{script} ({profile})"
+    print(f"🔧 [Step {index}] Running {label}...")
+    env = os.environ.copy()  # ✅ pass all current environment variables
+    env["DIGEST_PROFILE"] = profile
+    started = time.time()
+    completed = False
     try:
-        result = subprocess.run(
-            [sys.executable, script],
-            check=True,
-            env=os.environ.copy()  # ✅ pass all current environment variables
-        )
-        if result.returncode == 0:
-            print(f"✅ [Step {index}] {script} completed")
+        proc = subprocess.Popen([sys.executable, script, *(args or [])], env=env)
+        timeout = step_timeout(script)
+        try:
+            returncode = proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f"⏱️ [Step {index}] {script} stopped after {timeout:.0f}s to meet the deadline")
+            run_budget.degrade("step_timeout", script, "stopped to keep the deadline")
+            proc.terminate()
+            try:
+                proc.wait(timeout=STOP_GRACE_SECONDS)
+            except subprocess.TimeoutExpired:
+                print(f"⚠️ [Step {index}] {script} ignored SIGTERM, killing it")
+                proc.kill()
+                proc.wait()
         else:
-            print(f"❌ [Step {index}] {script} exited with code {result.returncode}")
-    except subprocess.CalledProcessError as exc:
-        print(f"❌ [Step {index}] {script} failed: {exc}")
+            completed = returncode == 0
+            if completed:
+                print(f"✅ [Step {index}] {script} completed")
+            else:
+                print(f"❌ [Step {index}] {script} exited with code {returncode}")
     except Exception as exc:
         print(f"❌ [Step {index}] {script} error: {exc}")
     finally:
+        if not completed:
+            discard_stale_output(output, run_started if script in IN_PLACE_STEPS else started)
         check_output_file(output)
 
 
-def main() -> None:
+def report_budget(report: dict) -> None:
+    print(
+        f"💰 Run used {report['tokens']}/{report['max_tokens']} tokens and "
+        f"{report['requests']}/{report['max_requests']} requests in "
+        f"{report['elapsed_seconds'] / 60:.1f}/{report['deadline_seconds'] / 60:.0f} min"
+    )
+    for item in report["degraded"]:
+        print(f"🐢 {item['stage']}: {item['action']} x{item['count']} ({item['detail']})")
+    print(f"📄 Run report written to {run_budget.REPORT_FILE}")
+
+
+def run_batch(
+    stream: bool = False,
+    early_exit: bool = False,
+    deadline_minutes: float = run_budget.DEFAULT_DEADLINE_MINUTES,
+    max_tokens: int = run_budget.DEFAULT_MAX_TOKENS,
+    max_requests: int = run_budget.DEFAULT_MAX_REQUESTS,
+    workers: int = 0,
+) -> None:
+    run_started = time.time()
     start = datetime.now().strftime("%Y-%m-%d %H:%M")
     print(f"⏰ Starting Polaris Digest Run: {start}")
-    for i, (script, output) in enumerate(STEPS, start=1):
-        run_step(i, script, output)
+    run_budget.start(deadline_minutes, max_tokens, max_requests)
+    step_args: dict[str, list[str]] = {}
+    if early_exit:
+        step_args["classify_articles_gpt.py"] = ["--early-exit"]
+
+    if workers:
+        step_args[DISTRIBUTED_STEP[0]] = ["run", "--workers", str(workers)]
+
+    # In stream and distributed mode the first step also runs relevance and
+    # classification for the default profile; other profiles start from
+    # relevance.
+    if workers:
+        shared = [DISTRIBUTED_STEP]
+    else:
+        shared = [STREAM_STEP] if stream else STEPS[:SHARED_STEPS]
+    combined = stream or bool(workers)
+    index = 0
+    for index, (script, output) in enumerate(shared, start=1):
+        run_step(index, script, output, step_args.get(script), run_started=run_started)
+    for profile in profiles.load_profiles():
+        name = profile["name"]
+        first = STREAMED_STEPS if combined and name == profiles.DEFAULT_PROFILE else SHARED_STEPS
+        for offset, (script, output) in enumerate(STEPS[first:], start=1):
+            run_step(
+                index + offset,
+                script,
+                profiles.path(output, name) if output else None,
+                step_args.get(script),
+                name,
+                run_started,
+            )
+    report_budget(run_budget.finish())
     end = datetime.now().strftime("%Y-%m-%d %H:%M")
     print(f"⏰ Polaris Digest Run finished: {end}")
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the Polaris digest pipeline")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="run continuously, ingesting feeds and publishing at DIGEST_CUTOFF",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="overlap fetch, date filter, relevance and classify through queues",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="shard fetch, relevance and classify across N worker processes",
+    )
+    parser.add_argument(
+        "--early-exit",
+        action="store_true",
+        help="stop classifying once every region/category slot is decided",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile CPU and memory of every step into logs/profile/",
+    )
+    parser.add_argument(
+        "--deadline-minutes",
+        type=float,
+        default=run_budget.DEFAULT_DEADLINE_MINUTES,
+        help="wall-clock budget for the run (RUN_DEADLINE_MINUTES)",
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=run_budget.DEFAULT_MAX_TOKENS,
+        help="Gemini token budget shared by all stages (RUN_MAX_TOKENS)",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=run_budget.DEFAULT_MAX_REQUESTS,
+        help="Gemini request budget shared by all stages (RUN_MAX_REQUESTS)",
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        # Every step finds the folder in its environment and profiles itself
+        folder = profiler.run_folder()
+        os.environ[profiler.ENV_VAR] = folder
+        print(f"🔬 Profiling every step into {folder}")
+
+    if args.daemon:
+        import daemon
+
+        # The daemon runs in this process; it is profiled until it stops
+        profiler.enable_from_args()
+
+        daemon.run_forever()
+    else:
+        run_batch(
+            stream=args.stream,
+            early_exit=args.early_exit,
+            deadline_minutes=args.deadline_minutes,
+            max_tokens=args.max_tokens,
+            max_requests=args.max_requests,
+            workers=args.workers,
+        )
+
+
 if __name__ == "__main__":
     main()
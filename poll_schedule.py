@@ -0,0 +1,190 @@
+"""Adaptive per-source polling schedule.
+
+Each RSS source publishes at its own pace, so polling every feed with the
+same window on every run wastes requests on slow blogs and full-text
+fetches on stale entries. This module learns a publication rate for each
+source from the entry timestamps seen on previous runs (stored in
+``HISTORY_FILE``) and turns it into:
+
+* a poll interval – how long to wait before fetching the feed again, and
+* an entry window – how many feed entries are worth considering, i.e.
+  what the source publishes between two polls; a busy source is polled
+  often and only needs its latest few entries each time.
+
+Sources without enough history are always polled with the full window, and
+so are feeds listing entries without a timestamp: those entries are dated
+at fetch time and pass the date filter, so their pace cannot be learned and
+a long interval would only delay them.
+"""
+
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+HISTORY_FILE = "data/source_history.json"
+
+# Only the last week of publication timestamps is used to estimate the rate
+HISTORY_DAYS = 7
+MAX_TIMESTAMPS_PER_SOURCE = 500
+
+# ``filter_articles_by_date.py`` keeps today and yesterday, so an entry older
+# than this can never reach the digest and a source must be polled at least
+# this often to avoid missing an article entirely.
+RECENCY_HORIZON = timedelta(hours=48)
+
+MIN_POLL_INTERVAL = timedelta(minutes=30)
+MAX_POLL_INTERVAL = timedelta(hours=47)
+# Runs are scheduled by cron, so allow a little jitter before a source is due
+DUE_TOLERANCE = timedelta(minutes=30)
+
+# Aim to pick up roughly this many new entries per poll
+TARGET_NEW_PER_POLL = 15
+MIN_WINDOW = 5
+WINDOW_SLACK = 1.5
+# Poll again before this fraction of a feed's listed entries is replaced
+FEED_ROLLOVER_SAFETY = 0.7
+
+
+def parse_iso(ts: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _to_iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def load_history(path: str = HISTORY_FILE) -> Dict[str, Dict]:
+    """Return the per-source polling history, or an empty dict."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"⚠️ Invalid JSON in {path}, starting with empty history")
+        return {}
+
+
+def save_history(history: Dict[str, Dict], path: str = HISTORY_FILE) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+
+
+def publication_rate(record: Dict, now: datetime) -> Optional[float]:
+    """Return the estimated number of entries published per hour.
+
+    ``None`` means the source has not been observed long enough to tell, or
+    that its feed lists undated entries.
+    """
+    if record.get("undated"):
+        return None
+    first_seen = parse_iso(record.get("first_seen", ""))
+    if not first_seen:
+        return None
+    cutoff = now - timedelta(days=HISTORY_DAYS)
+    recent = [
+        ts for ts in (parse_iso(t) for t in record.get("timestamps", []))
+        if ts and cutoff <= ts <= now
+    ]
+    if not recent:
+        # Nothing published for a day or more means a quiet source; a
+        # brand-new record without timestamps is simply unknown.
+        return 0.0 if now - first_seen >= timedelta(days=1) else None
+    # The feed itself reveals its pace: the oldest entry still listed marks
+    # the start of the observed span.
+    span = now - min(min(recent), first_seen)
+    if span < timedelta(hours=1):
+        return None
+    return len(recent) / (span.total_seconds() / 3600)
+
+
+def poll_interval(rate: Optional[float], feed_size: int = 0) -> timedelta:
+    """Return how long to wait between two polls of a source.
+
+    Besides the target number of new entries per poll, the interval must
+    stay short enough that a feed listing only its latest ``feed_size``
+    entries does not roll over between two polls.
+    """
+    if not rate:
+        # Unknown or silent sources are still checked before entries fall
+        # out of the recency window.
+        return MAX_POLL_INTERVAL if rate == 0 else MIN_POLL_INTERVAL
+    new_per_poll = TARGET_NEW_PER_POLL
+    if feed_size:
+        new_per_poll = min(new_per_poll, feed_size * FEED_ROLLOVER_SAFETY)
+    interval = timedelta(hours=new_per_poll / rate)
+    return max(MIN_POLL_INTERVAL, min(MAX_POLL_INTERVAL, interval))
+
+
+def entry_window(rate: Optional[float], interval: timedelta, max_entries: int) -> int:
+    """Return how many feed entries are worth considering on a poll.
+
+    The window covers what a source is expected to publish between two
+    polls, with some slack for bursts. Older entries still within the
+    recency horizon were picked up by earlier polls and are carried forward
+    alongside the new ones.
+    """
+    if rate is None:
+        return max_entries
+    window = math.ceil(rate * interval.total_seconds() / 3600 * WINDOW_SLACK)
+    return max(MIN_WINDOW, min(max_entries, window))
+
+
+def plan_source(
+    name: str,
+    history: Dict[str, Dict],
+    now: datetime,
+    max_entries: int,
+) -> Dict:
+    """Return ``{"due", "window", "interval", "rate"}`` for a source."""
+    record = history.get(name, {})
+    rate = publication_rate(record, now)
+    interval = poll_interval(rate, record.get("feed_size", 0))
+    last_polled = parse_iso(record.get("last_polled", ""))
+    due = last_polled is None or now - last_polled + DUE_TOLERANCE >= interval
+    return {
+        "due": due,
+        "window": entry_window(rate, interval, max_entries),
+        "interval": interval,
+        "rate": rate,
+    }
+
+
+def is_fresh(published_at: Optional[datetime], now: datetime) -> bool:
+    """Return False for entries too old to survive the date filter."""
+    return published_at is None or now - published_at <= RECENCY_HORIZON
+
+
+def record_poll(
+    history: Dict[str, Dict],
+    name: str,
+    timestamps: Iterable[datetime],
+    now: datetime,
+    feed_size: int = 0,
+    undated: int = 0,
+) -> None:
+    """Store the entry timestamps observed while polling ``name``.
+
+    ``undated`` is the number of listed entries that had no timestamp.
+    """
+    record = history.setdefault(name, {"first_seen": _to_iso(now), "timestamps": []})
+    cutoff = now - timedelta(days=HISTORY_DAYS)
+    seen = set(record.get("timestamps", []))
+    seen.update(_to_iso(ts) for ts in timestamps)
+    kept: List[str] = sorted(
+        ts for ts in seen if (parse_iso(ts) or cutoff) >= cutoff
+    )
+    record["timestamps"] = kept[-MAX_TIMESTAMPS_PER_SOURCE:]
+    record["last_polled"] = _to_iso(now)
+    if feed_size:
+        record["feed_size"] = feed_size
+    if undated:
+        record["undated"] = undated
+    else:
+        record.pop("undated", None)
@@ -0,0 +1,272 @@
+"""Built-in CPU and memory profiling for pipeline runs.
+
+``python main.py --profile`` (or ``--profile`` on any stage script) runs
+each stage with:
+
+* a sampling CPU profiler – a background thread records the stack of
+  every running thread every ``SAMPLE_INTERVAL`` seconds, so the stage
+  runs at close to full speed;
+* ``tracemalloc`` – peak traced memory and the top allocation sites.
+
+When the stage exits, ``OUTPUT_DIR/<run>/<stage>.folded`` holds the
+samples as folded stacks (one ``frame;frame;frame count`` line per stack,
+the input format of ``flamegraph.pl`` and speedscope) and
+``<stage>.txt`` a text summary: the hottest functions, the time spent in
+``WATCHED`` calls (feed parsing, HTML parsing, JSON encoding) and the
+allocation sites.
+
+``python profiler.py demo`` profiles a deliberately heavy synthetic
+workload, to check that the hot spot is where the summary points.
+"""
+
+import atexit
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+OUTPUT_DIR = "logs/profile"
+# Set by ``main.py --profile`` to the run's output folder, so every stage
+# of one run writes next to the others
+ENV_VAR = "PIPELINE_PROFILE"
+FLAG = "--profile"
+
+SAMPLE_INTERVAL = 0.005
+# Only the allocating line is reported; deeper tracebacks slow stages down a lot
+TRACEMALLOC_FRAMES = 1
+TOP_FUNCTIONS = 15
+TOP_ALLOCATIONS = 15
+
+# Calls reported separately in the summary: label -> (module, function)
+# pairs. ``co_qualname`` only exists from Python 3.11, hence both names.
+WATCHED: Dict[str, List[Tuple[str, str]]] = {
+    "feedparser.parse": [("feedparser.api", "parse")],
+    "BeautifulSoup": [("bs4", "BeautifulSoup.__init__"), ("bs4", "__init__")],
+    "json.dump": [("json", "dump"), ("json", "dumps"), ("schema", "dumps")],
+}
+
+Frame = Tuple[str, str]
+
+
+class Sampler:
+    """Collect folded stacks of every thread at a fixed interval."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack: List[Frame] = []
+                while frame is not None:
+                    code = frame.f_code
+                    module = frame.f_globals.get("__name__", "?")
+                    stack.append((module, getattr(code, "co_qualname", code.co_name)))
+                    frame = frame.f_back
+                stack.append(("thread", names.get(ident, str(ident))))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+
+def _label(frame: Frame) -> str:
+    module, name = frame
+    return f"{module}:{name}".replace(";", ",").replace(" ", "_")
+
+
+def write_folded(path: str, stacks: Counter) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{';'.join(_label(fr) for fr in stack)} {count}\n")
+
+
+def _hottest(stacks: Counter) -> Tuple[Counter, Counter]:
+    """Return (self, inclusive) sample counts per function."""
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for frame in set(stack[1:]):
+            inclusive[frame] += count
+    return own, inclusive
+
+
+def _watched(stacks: Counter) -> Dict[str, int]:
+    totals = {label: 0 for label in WATCHED}
+    for stack, count in stacks.items():
+        frames = set(stack)
+        for label, targets in WATCHED.items():
+            if any(target in frames for target in targets):
+                totals[label] += count
+    return totals
+
+
+def summary(
+    stage: str,
+    sampler: Sampler,
+    wall: float,
+    snapshot: Optional[tracemalloc.Snapshot],
+    peak: int,
+) -> str:
+    stacks = sampler.stacks
+    # Threads blocked in the event loop or a queue still count towards
+    # their stacks; shares are relative to all samples of all threads
+    total = sum(stacks.values()) or 1
+    own, inclusive = _hottest(stacks)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    lines = [
+        f"Stage: {stage}",
+        f"Wall time: {wall:.2f}s, {sampler.samples} sampling rounds, {total} thread samples",
+        f"Peak traced memory: {peak / 2**20:.1f} MiB, max RSS: {max_rss / 1024:.1f} MiB",
+        "",
+        "Watched calls (share of thread samples):",
+    ]
+    rounds = sampler.samples or 1
+    for label, count in _watched(stacks).items():
+        # A thread seen in n of the rounds spent about n / rounds of the wall time there
+        lines.append(f"  {count / total:6.1%}  {count / rounds * wall:7.2f}s  {label}")
+
+    lines += ["", "Hottest functions (self / inclusive share):"]
+    for frame, count in own.most_common(TOP_FUNCTIONS):
+        lines.append(f"  {count / total:6.1%}  {inclusive[frame] / total:6.1%}  {_label(frame)}")
+
+    if snapshot is not None:
+        lines += ["", "Top allocation sites (live at exit):"]
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            where = stat.traceback[0]
+            lines.append(
+                f"  {stat.size / 2**20:8.2f} MiB  {stat.count:8d} blocks  "
+                f"{where.filename}:{where.lineno}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+class Profile:
+    """CPU sampling plus tracemalloc for one stage process."""
+
+    def __init__(self, stage: str, folder: str) -> None:
+        self.stage = stage
+        self.folder = folder
+        self.sampler = Sampler()
+        self.started = 0.0
+
+    def start(self) -> None:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self) -> str:
+        """Stop profiling, write the folded stacks and summary, return the summary path."""
+        self.sampler.stop()
+        wall = time.perf_counter() - self.started
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        tracemalloc.stop()
+        os.makedirs(self.folder, exist_ok=True)
+        base = os.path.join(self.folder, self.stage)
+        write_folded(f"{base}.folded", self.sampler.stacks)
+        text = summary(self.stage, self.sampler, wall, snapshot, peak)
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(text)
+        return f"{base}.txt"
+
+
+def run_folder() -> str:
+    return os.path.join(OUTPUT_DIR, datetime.now().strftime("%Y%m%d-%H%M%S"))
+
+
+def stage_name() -> str:
+    name = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+    profile = os.getenv("DIGEST_PROFILE")
+    if profile and profile != "default":
+        name = f"{name}.{profile}"
+    return name
+
+
+def enable_from_args() -> Optional[Profile]:
+    """Start profiling this stage if ``--profile`` was given or ``main.py`` asked for it.
+
+    The flag is removed from ``sys.argv`` so the stage's own argument
+    parsing is unaffected. Results are written when the process exits.
+    """
+    folder = os.getenv(ENV_VAR)
+    if FLAG in sys.argv:
+        sys.argv.remove(FLAG)
+        folder = folder or run_folder()
+    if not folder:
+        return None
+    profile = Profile(stage_name(), folder)
+
+    def _finish() -> None:
+        print(f"🔬 Profile of {profile.stage} written to {profile.stop()}")
+
+    # Registered before the stage runs, so it runs after the stages' own
+    # exit handlers (stats files, audit logs) and profiles them too
+    atexit.register(_finish)
+    profile.start()
+    return profile
+
+
+# ---------------------------------------------------------------------------
+# Synthetic demo
+
+
+def _synthetic_feed(entries: int) -> str:
+    items = "".join(
+        f"<item><title>Synthetic article {i}</title><link>https://example.com/{i}</link>"
+        f"<pubDate>Mon, 19 Oct 2026 08:{i % 60:02d}:00 GMT</pubDate>"
+        f"<description>{'AI fintech startup news. ' * 20}</description></item>"
+        for i in range(entries)
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Demo</title>{items}</channel></rss>'
+
+
+def demo(entries: int = 1000) -> str:
+    """Profile a synthetic run whose hot spot is ``feedparser.parse``."""
+    import json
+
+    import feedparser
+    from bs4 import BeautifulSoup
+
+    profile = Profile("synthetic_demo", run_folder())
+    profile.start()
+    feed = feedparser.parse(_synthetic_feed(entries))
+    html = "<article>" + "<p>Paragraph text.</p>" * 2000 + "</article>"
+    text = BeautifulSoup(html, "html.parser").get_text()
+    articles = [{"title": e.title, "url": e.link, "content": text[:500]} for e in feed.entries]
+    json.dumps(articles, ensure_ascii=False, indent=2)
+    return profile.stop()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["demo"]:
+        path = demo()
+        with open(path, encoding="utf-8") as f:
+            print(f.read())
+        print(f"🔬 Written to {path} and {path[:-4]}.folded")
+    else:
+        print("Usage: python profiler.py demo")
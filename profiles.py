@@ -0,0 +1,82 @@
+"""Digest profiles sharing one fetch and enrichment layer.
+
+A profile is another digest (for another team) with its own keywords,
+prompts, selection settings, subscribers and template. Profiles are listed
+in ``PROFILES_FILE``; every field is optional and falls back to the
+default digest's file::
+
+    {
+      "profiles": [
+        {"name": "default"},
+        {"name": "fintech-team",
+         "keywords": "config/keywords_fintech.json",
+         "relevance_prompt": "v2",
+         "classify_prompt": "v2.1",
+         "selection": "config/selection_fintech.json",
+         "subscribers": "config/subscribers_fintech.json",
+         "template": "templates/digest_single_column.html"}
+      ]
+    }
+
+Fetching, date filtering, full text and the archive are shared. Stages
+from relevance onwards run once per profile (``main.py`` sets
+``DIGEST_PROFILE``), write their files under ``data/profiles/<name>/`` and
+``result/profiles/<name>/``, and reuse LLM answers through ``llm_cache``,
+so a second profile only pays for prompts that differ from the first.
+"""
+
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import schema
+
+PROFILES_FILE = "config/profiles.json"
+DEFAULT_PROFILE = "default"
+
+# Folders whose files are written once per profile
+_PROFILE_ROOTS = ("data/", "result/")
+
+
+def load_profiles(path: str = PROFILES_FILE) -> List[Dict[str, Any]]:
+    data = schema.read_json(path) or {}
+    profiles = data.get("profiles") or [{"name": DEFAULT_PROFILE}]
+    names = [p.get("name") for p in profiles]
+    if not all(names) or len(set(names)) != len(names):
+        raise RuntimeError(f"Every profile in {path} needs a unique name")
+    return profiles
+
+
+def active_name() -> str:
+    return os.getenv("DIGEST_PROFILE") or DEFAULT_PROFILE
+
+
+def is_default() -> bool:
+    return active_name() == DEFAULT_PROFILE
+
+
+@lru_cache(maxsize=None)
+def active() -> Dict[str, Any]:
+    name = active_name()
+    for profile in load_profiles():
+        if profile["name"] == name:
+            return profile
+    if name == DEFAULT_PROFILE:
+        return {"name": DEFAULT_PROFILE}
+    raise RuntimeError(f"Unknown digest profile {name!r} in {PROFILES_FILE}")
+
+
+def setting(key: str, default: Any) -> Any:
+    """Return the active profile's ``key``, or the default digest's value."""
+    return active().get(key) or default
+
+
+def path(default_path: str, name: Optional[str] = None) -> str:
+    """Return where profile ``name`` (default: the active one) keeps ``default_path``."""
+    name = name or active_name()
+    if name == DEFAULT_PROFILE:
+        return default_path
+    for root in _PROFILE_ROOTS:
+        if default_path.startswith(root):
+            return os.path.join(root, "profiles", name, default_path[len(root):])
+    return default_path
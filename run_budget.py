@@ -0,0 +1,332 @@
+"""Run-level deadline and token/request budget with graceful degradation.
+
+``main.py`` starts a controller for each batch run: a wall-clock deadline
+plus a Gemini token and request budget shared by every stage. The limits
+live in ``STATE_FILE``; each stage process reads them, adds its own usage
+when it exits, and the next stage sees the running total.
+
+Pressure is the largest of the elapsed share of the deadline and the spent
+shares of the token and request budgets. As it grows, stages degrade one
+level at a time:
+
+1. ``cap_per_source`` – fetch at most ``CAPPED_ENTRIES_PER_SOURCE`` entries
+   per feed,
+2. ``raise_prefilter`` – only send articles with enough keyword hits to
+   the relevance model,
+3. ``skip_low_scores`` – only classify the best-scored share of candidates,
+4. ``cached_summaries`` – summaries come from the cache or a local
+   fallback instead of the model.
+
+Once the budget is exhausted or the deadline has passed, model calls are
+refused outright. ``finish`` writes ``REPORT_FILE`` with the usage and
+every degradation that was applied. Outside a controlled run (a stage
+started by hand, the daemon) everything runs at level 0.
+"""
+
+import atexit
+import json
+import os
+import signal
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+STATE_FILE = "logs/run_state.json"
+REPORT_FILE = "logs/run_report.json"
+# Set by ``start`` so the stage subprocesses find the running controller
+ENV_VAR = "RUN_BUDGET_FILE"
+
+DEFAULT_DEADLINE_MINUTES = float(os.getenv("RUN_DEADLINE_MINUTES", "45"))
+DEFAULT_MAX_TOKENS = int(os.getenv("RUN_MAX_TOKENS", "3000000"))
+DEFAULT_MAX_REQUESTS = int(os.getenv("RUN_MAX_REQUESTS", "3000"))
+
+NORMAL = 0
+CAP_PER_SOURCE = 1
+RAISE_PREFILTER = 2
+SKIP_LOW_SCORES = 3
+CACHED_SUMMARIES = 4
+LEVEL_NAMES = ["normal", "cap_per_source", "raise_prefilter", "skip_low_scores", "cached_summaries"]
+# Pressure at which levels 1-4 start
+LEVEL_THRESHOLDS = [0.5, 0.65, 0.8, 0.9]
+
+CAPPED_ENTRIES_PER_SOURCE = 40
+# Keyword hits an article needs to reach the relevance model, per level
+PREFILTER_MIN_HITS = [0, 0, 1, 2, 2]
+# Share of candidates (by relevance score) still classified at level 3+
+LOW_SCORE_KEEP_SHARE = 0.5
+
+
+class BudgetExhausted(RuntimeError):
+    """Raised instead of a model call once the run is out of time or budget."""
+
+
+_lock = threading.Lock()
+_state: Optional[Dict[str, Any]] = None
+# Usage and degradations of this process, added to the state file at exit
+_used = {"tokens": 0, "requests": 0}
+_degraded: Dict[str, Dict[str, Any]] = {}
+_registered = False
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path: str, data: Dict[str, Any]) -> None:
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def start(
+    deadline_minutes: float = DEFAULT_DEADLINE_MINUTES,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    max_requests: int = DEFAULT_MAX_REQUESTS,
+) -> None:
+    """Begin a controlled run; stages started from now on share its budget."""
+    global _state
+    now = _now()
+    state = {
+        "started": now.isoformat(),
+        "deadline": (now + timedelta(minutes=deadline_minutes)).isoformat(),
+        "max_tokens": max_tokens,
+        "max_requests": max_requests,
+        "tokens": 0,
+        "requests": 0,
+        "degraded": {},
+    }
+    _write(STATE_FILE, state)
+    os.environ[ENV_VAR] = STATE_FILE
+    with _lock:
+        _state = state
+        _used.update(tokens=0, requests=0)
+        _degraded.clear()
+
+
+def _stop_on_sigterm(signum: int, frame: Any) -> None:
+    # SystemExit unwinds the stage normally, so ``save`` still runs at exit
+    raise SystemExit(128 + signum)
+
+
+def _install_stop_handler() -> None:
+    """Let ``main.py`` stop a stage with SIGTERM without losing its usage."""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _stop_on_sigterm)
+
+
+def _active() -> Optional[Dict[str, Any]]:
+    global _state
+    if _state is None:
+        path = os.getenv(ENV_VAR)
+        if path:
+            _state = _read(path)
+            if _state is not None:
+                _install_stop_handler()
+    return _state
+
+
+def active() -> bool:
+    return _active() is not None
+
+
+def remaining_seconds() -> Optional[float]:
+    state = _active()
+    if state is None:
+        return None
+    return (datetime.fromisoformat(state["deadline"]) - _now()).total_seconds()
+
+
+def pressure() -> float:
+    state = _active()
+    if state is None:
+        return 0.0
+    started = datetime.fromisoformat(state["started"])
+    deadline = datetime.fromisoformat(state["deadline"])
+    total = (deadline - started).total_seconds() or 1.0
+    with _lock:
+        tokens = state["tokens"] + _used["tokens"]
+        requests = state["requests"] + _used["requests"]
+    return max(
+        (_now() - started).total_seconds() / total,
+        tokens / state["max_tokens"] if state["max_tokens"] else 0.0,
+        requests / state["max_requests"] if state["max_requests"] else 0.0,
+    )
+
+
+def level() -> int:
+    current = pressure()
+    return sum(1 for threshold in LEVEL_THRESHOLDS if current >= threshold)
+
+
+def exhausted() -> bool:
+    return pressure() >= 1.0
+
+
+def _register() -> None:
+    global _registered
+    if not _registered and os.getenv(ENV_VAR):
+        atexit.register(save)
+        _registered = True
+
+
+def charge(tokens: int, requests: int = 1) -> None:
+    """Count one model call (``tokens`` prompt plus output tokens) against the budget."""
+    if _active() is None:
+        return
+    with _lock:
+        _used["tokens"] += tokens
+        _used["requests"] += requests
+        _register()
+
+
+def check(stage: str) -> None:
+    """Raise ``BudgetExhausted`` if a model call must not be made any more."""
+    if exhausted():
+        degrade("budget_exhausted", stage, "model calls refused")
+        raise BudgetExhausted(f"run budget exhausted, {stage} call refused")
+
+
+def degrade(action: str, stage: str, detail: str = "", count: int = 1) -> None:
+    """Record that ``stage`` applied degradation ``action`` (``count`` times)."""
+    state = _active()
+    if state is None:
+        return
+    key = f"{stage}:{action}"
+    with _lock:
+        entry = _degraded.get(key)
+        if entry is None:
+            started = datetime.fromisoformat(state["started"])
+            entry = _degraded[key] = {
+                "stage": stage,
+                "action": action,
+                "level": _level_for(action),
+                "detail": detail,
+                "count": 0,
+                "first_at_seconds": round((_now() - started).total_seconds(), 1),
+            }
+            print(f"🐢 Run budget: {stage} degrades to {action} ({detail})")
+        entry["count"] += count
+        _register()
+
+
+def _level_for(action: str) -> Optional[int]:
+    return LEVEL_NAMES.index(action) if action in LEVEL_NAMES else None
+
+
+# ---------------------------------------------------------------------------
+# Degradation helpers used by the stages
+
+
+def entries_cap(window: int, stage: str = "fetch") -> int:
+    """Return the feed entry window to use at the current level."""
+    if level() >= CAP_PER_SOURCE and window > CAPPED_ENTRIES_PER_SOURCE:
+        degrade("cap_per_source", stage, f"at most {CAPPED_ENTRIES_PER_SOURCE} entries per feed")
+        return CAPPED_ENTRIES_PER_SOURCE
+    return window
+
+
+def prefilter_min_hits() -> int:
+    """Return the keyword hits an article needs before a relevance call."""
+    return PREFILTER_MIN_HITS[level()]
+
+
+def trim_low_scores(articles: List[Dict[str, Any]], stage: str) -> List[Dict[str, Any]]:
+    """At level 3+, keep only the best-scored share of ``articles``."""
+    if level() < SKIP_LOW_SCORES or len(articles) < 2:
+        return articles
+    ranked = sorted(articles, key=lambda a: a.get("score", 0), reverse=True)
+    keep = max(1, int(len(ranked) * LOW_SCORE_KEEP_SHARE))
+    degrade(
+        "skip_low_scores",
+        stage,
+        f"kept the top {LOW_SCORE_KEEP_SHARE:.0%} by score",
+        len(ranked) - keep,
+    )
+    return ranked[:keep]
+
+
+def skip_low_score(score: float, seen: List[float], stage: str) -> bool:
+    """Streaming variant of ``trim_low_scores``: judge ``score`` against the scores seen so far."""
+    if level() < SKIP_LOW_SCORES or len(seen) < 2:
+        return False
+    higher = sum(1 for s in seen if s > score)
+    if higher < len(seen) * LOW_SCORE_KEEP_SHARE:
+        return False
+    degrade("skip_low_scores", stage, f"kept the top {LOW_SCORE_KEEP_SHARE:.0%} by score")
+    return True
+
+
+def model_summaries_allowed() -> bool:
+    return level() < CACHED_SUMMARIES and not exhausted()
+
+
+# ---------------------------------------------------------------------------
+# Persistence and report
+
+
+def save() -> None:
+    """Add this process's usage and degradations to the shared state file."""
+    path = os.getenv(ENV_VAR)
+    if not path:
+        return
+    with _lock:
+        state = _read(path)
+        if state is None:
+            return
+        state["tokens"] += _used["tokens"]
+        state["requests"] += _used["requests"]
+        for key, entry in _degraded.items():
+            total = state["degraded"].setdefault(key, dict(entry, count=0))
+            total["count"] += entry["count"]
+        _write(path, state)
+        _used.update(tokens=0, requests=0)
+        _degraded.clear()
+        global _state
+        _state = state
+
+
+def finish() -> Dict[str, Any]:
+    """End the run, write ``REPORT_FILE`` and return the report."""
+    global _state
+    save()
+    state = _read(STATE_FILE) or {}
+    os.environ.pop(ENV_VAR, None)
+    _state = None
+    if not state:
+        return {}
+    started = datetime.fromisoformat(state["started"])
+    deadline = datetime.fromisoformat(state["deadline"])
+    finished = _now()
+    degraded = sorted(state["degraded"].values(), key=lambda d: d["first_at_seconds"])
+    report = {
+        "started": state["started"],
+        "finished": finished.isoformat(),
+        "elapsed_seconds": round((finished - started).total_seconds(), 1),
+        "deadline_seconds": round((deadline - started).total_seconds(), 1),
+        "on_time": finished <= deadline,
+        "tokens": state["tokens"],
+        "max_tokens": state["max_tokens"],
+        "requests": state["requests"],
+        "max_requests": state["max_requests"],
+        "within_budget": state["tokens"] <= state["max_tokens"]
+        and state["requests"] <= state["max_requests"],
+        "max_level": max((d["level"] or 0 for d in degraded), default=0),
+        "degraded": degraded,
+    }
+    _write(REPORT_FILE, report)
+    os.remove(STATE_FILE)
+    return report
@@ -0,0 +1,245 @@
+"""Article records and the JSON codec shared by every stage.
+
+Stages used to ``json.load``/``json.dump`` untyped dicts, so field names
+drifted between them (``publishedAt`` vs ``published_at``, ``source`` as a
+dict or a string, ``summary`` vs ``summary_zh``) and malformed records were
+only noticed deep inside a stage. This module defines the two record types
+that cross stage boundaries:
+
+* ``Article`` – a fetched article flowing from fetch to selection, and
+* ``DigestItem`` – a summarized article rendered into the digest,
+
+normalizes the known aliases when decoding, and rejects records that are
+missing required fields at the boundary. Records stay plain dicts
+(``TypedDict``) so stages keep using them as before.
+
+Decoding and encoding use ``msgspec`` or ``orjson`` when installed and fall
+back to the standard ``json`` module otherwise.
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, List, TypedDict
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional speed-up
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+
+class SchemaError(ValueError):
+    """Raised when a record does not match its schema."""
+
+
+class Article(TypedDict, total=False):
+    title: str
+    url: str
+    source: str
+    publishedAt: str
+    content_ref: str
+    # Inline body, only present in records written before the blob store
+    content: str
+    description: str
+    score: int
+    category: str
+    region: str
+    keep: bool
+
+
+class DigestItem(TypedDict, total=False):
+    region: str
+    category: str
+    title: str
+    summary_zh: str
+    # Extractive fallback in the article's own language, set instead of
+    # ``summary_zh`` when no model summary could be had
+    excerpt: str
+    source: str
+    read_time: str
+    url: str
+    published_at: str
+    tags: List[str]
+
+
+# ---------------------------------------------------------------------------
+# Codec
+
+
+def loads(data: bytes | str) -> Any:
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode ``obj`` as indented UTF-8 JSON, keeping non-ASCII readable."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    if msgspec is not None:
+        return msgspec.json.format(msgspec.json.encode(obj), indent=2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def dumps_compact(obj: Any) -> bytes:
+    """Encode ``obj`` as UTF-8 JSON without whitespace, for network payloads."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def read_json(path: str) -> Any:
+    """Return the decoded file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        return loads(data)
+    except ValueError as exc:
+        raise RuntimeError(f"Invalid JSON in {path}") from exc
+
+
+def write_json(path: str, obj: Any) -> None:
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(dumps(obj))
+
+
+# ---------------------------------------------------------------------------
+# Validation
+
+
+def _str(value: Any, field: str) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (str, int, float)):
+        return str(value)
+    raise SchemaError(f"{field} must be a string, got {type(value).__name__}")
+
+
+def _source_name(value: Any) -> str:
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("title")
+    return _str(value, "source")
+
+
+def _int(value: Any, field: str) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise SchemaError(f"{field} must be an integer, got {value!r}") from None
+
+
+def parse_article(raw: Any) -> Article:
+    """Return ``raw`` as a normalized ``Article`` or raise ``SchemaError``."""
+    if not isinstance(raw, dict):
+        raise SchemaError(f"article must be an object, got {type(raw).__name__}")
+    title = _str(raw.get("title"), "title").strip()
+    url = _str(raw.get("url"), "url").strip()
+    if not title or not url:
+        raise SchemaError("article needs a title and a url")
+
+    record: Article = {
+        "title": title,
+        "url": url,
+        "source": _source_name(raw.get("source")),
+        "publishedAt": _str(raw.get("publishedAt") or raw.get("published_at"), "publishedAt"),
+    }
+    for field in ("content_ref", "content", "description", "category", "region"):
+        if raw.get(field):
+            record[field] = _str(raw[field], field)
+    if raw.get("score") is not None:
+        record["score"] = _int(raw["score"], "score")
+    if raw.get("keep") is not None:
+        record["keep"] = bool(raw["keep"])
+    return record
+
+
+def parse_digest_item(raw: Any) -> DigestItem:
+    """Return ``raw`` as a normalized ``DigestItem`` or raise ``SchemaError``."""
+    if not isinstance(raw, dict):
+        raise SchemaError(f"digest item must be an object, got {type(raw).__name__}")
+    title = _str(raw.get("title"), "title").strip()
+    if not title:
+        raise SchemaError("digest item needs a title")
+    tags = raw.get("tags") or []
+    if not isinstance(tags, list):
+        raise SchemaError("tags must be a list")
+    item: DigestItem = {
+        "region": _str(raw.get("region"), "region") or "Global",
+        "category": _str(raw.get("category"), "category"),
+        "title": title,
+        "summary_zh": _str(raw.get("summary_zh") or raw.get("summary"), "summary_zh"),
+        "source": _source_name(raw.get("source")),
+        "read_time": _str(raw.get("read_time"), "read_time"),
+        "url": _str(raw.get("url"), "url") or "#",
+        "published_at": _str(raw.get("published_at") or raw.get("publishedAt"), "published_at"),
+        "tags": [_str(t, "tags") for t in tags],
+    }
+    if raw.get("excerpt"):
+        item["excerpt"] = _str(raw["excerpt"], "excerpt")
+    return item
+
+
+def _read_records(path: str, parse: Callable[[Any], Dict]) -> List[Dict]:
+    data = read_json(path)
+    if data is None:
+        return []
+    if not isinstance(data, list):
+        raise RuntimeError(f"Expected a list of records in {path}")
+    records = []
+    rejected = 0
+    for raw in data:
+        try:
+            records.append(parse(raw))
+        except SchemaError as exc:
+            rejected += 1
+            if rejected <= 3:
+                print(f"⚠️ Rejected record in {path}: {exc}")
+    if rejected:
+        print(f"⚠️ Rejected {rejected} malformed record(s) in {path}")
+    return records
+
+
+def _write_records(path: str, records: List[Dict], parse: Callable[[Any], Dict]) -> None:
+    # A malformed record is dropped with a warning instead of failing the stage
+    valid = []
+    rejected = 0
+    for raw in records:
+        try:
+            valid.append(parse(raw))
+        except SchemaError as exc:
+            rejected += 1
+            if rejected <= 3:
+                print(f"⚠️ Dropped record for {path}: {exc}")
+    if rejected:
+        print(f"⚠️ Dropped {rejected} malformed record(s) for {path}")
+    write_json(path, valid)
+
+
+def read_articles(path: str) -> List[Article]:
+    return _read_records(path, parse_article)
+
+
+def write_articles(path: str, articles: List[Dict]) -> None:
+    _write_records(path, articles, parse_article)
+
+
+def read_digest_items(path: str) -> List[DigestItem]:
+    return _read_records(path, parse_digest_item)
+
+
+def write_digest_items(path: str, items: List[Dict]) -> None:
+    _write_records(path, items, parse_digest_item)
+
@@ -0,0 +1,248 @@
+"""Local full-text index that answers LINE queries without LLM or network calls.
+
+Classified and summarized articles are copied from the archive into an
+SQLite FTS5 table. SQLite's default tokenizer does not split Chinese, so
+text is segmented before indexing: English words are kept as-is and CJK
+runs become overlapping character bigrams (the same segmentation the
+selector uses for titles). Queries such as "latest FinTech in Taiwan" or
+"台灣 金融科技 AI" are split into region/category filters plus keywords,
+matched against the index and ranked by text relevance, recency and score.
+
+The index is updated incrementally after classification and
+summarization (``update()``), and can be updated or queried by hand::
+
+    python search_index.py update
+    python search_index.py query "latest FinTech in Taiwan"
+"""
+
+import argparse
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import archive
+import blob_store
+from select_top_articles import title_tokens
+
+INDEX_FILE = "data/search.sqlite"
+
+# Characters of the article body indexed next to the title and summary
+BODY_CHARS = 2000
+# Candidates pulled from FTS before re-ranking by recency and score
+CANDIDATES = 50
+SCORE_WEIGHT = 0.3
+AGE_PENALTY_PER_DAY = 0.5
+
+REGION_WORDS = {
+    "taiwan": "Taiwan", "tw": "Taiwan", "台灣": "Taiwan", "臺灣": "Taiwan",
+    "global": "Global", "world": "Global", "全球": "Global", "國際": "Global",
+}
+CATEGORY_WORDS = {
+    "fintech": "FinTech", "金融科技": "FinTech",
+    "startup": "Startup", "startups": "Startup", "新創": "Startup",
+    "research": "Research", "研究": "Research",
+    "infrastructure": "Infrastructure", "infra": "Infrastructure", "基礎建設": "Infrastructure",
+}
+STOP_WORDS = {"latest", "news", "in", "on", "about", "the", "of", "最新", "新聞", "的"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    url TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    summary_zh TEXT,
+    source TEXT,
+    region TEXT,
+    category TEXT,
+    score INTEGER,
+    published_at TEXT,
+    published_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_docs_filter ON docs (region, category, published_date);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(tokens);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def segment(text: str) -> str:
+    """Return ``text`` as space-separated index tokens."""
+    return " ".join(sorted(title_tokens(text)))
+
+
+def connect(path: str = INDEX_FILE, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.executescript(_SCHEMA)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def update(path: str = INDEX_FILE) -> int:
+    """Index archive articles classified or summarized since the last update."""
+    with closing(connect(path)) as conn, conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        watermark = row["value"] if row else None
+        articles = archive.updated_since(watermark, "classified")
+        for art in articles:
+            body = blob_store.article_text(art)[:BODY_CHARS]
+            tokens = segment(
+                " ".join(
+                    filter(None, [art["title"], art.get("summary_zh"), art["source"], body])
+                )
+            )
+            published = archive.parse_date(art["publishedAt"]) if art["publishedAt"] else None
+            cur = conn.execute(
+                """
+                INSERT INTO docs (url, title, summary_zh, source, region, category,
+                                  score, published_at, published_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    title = excluded.title, summary_zh = excluded.summary_zh,
+                    source = excluded.source, region = excluded.region,
+                    category = excluded.category, score = excluded.score,
+                    published_at = excluded.published_at,
+                    published_date = excluded.published_date
+                RETURNING id
+                """,
+                (
+                    art["url"], art["title"], art.get("summary_zh"), art["source"],
+                    art.get("region"), art.get("category"), art.get("score"),
+                    art["publishedAt"], published.isoformat() if published else None,
+                ),
+            )
+            doc_id = cur.fetchone()["id"]
+            conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (doc_id,))
+            conn.execute(
+                "INSERT INTO docs_fts (rowid, tokens) VALUES (?, ?)", (doc_id, tokens)
+            )
+        if articles:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)",
+                (articles[-1]["updated_at"],),
+            )
+    return len(articles)
+
+
+def parse_query(text: str) -> Tuple[Optional[str], Optional[str], List[str]]:
+    """Split a user query into ``(region, category, keyword tokens)``."""
+    region = category = None
+    remaining = text.lower()
+    # Multi-character Chinese phrases first, so "金融科技" is not left behind
+    for words, kind in ((CATEGORY_WORDS, "category"), (REGION_WORDS, "region")):
+        for word in sorted(words, key=len, reverse=True):
+            if word.isascii():
+                continue
+            if word in remaining:
+                remaining = remaining.replace(word, " ")
+                if kind == "category":
+                    category = category or words[word]
+                else:
+                    region = region or words[word]
+    keywords: List[str] = []
+    for word in remaining.split():
+        if word in CATEGORY_WORDS:
+            category = category or CATEGORY_WORDS[word]
+        elif word in REGION_WORDS:
+            region = region or REGION_WORDS[word]
+        elif word not in STOP_WORDS:
+            keywords.append(word)
+    tokens = sorted(title_tokens(" ".join(keywords)) - STOP_WORDS)
+    return region, category, tokens
+
+
+def _match(tokens: List[str], operator: str) -> str:
+    return f" {operator} ".join('"' + t.replace('"', '""') + '"' for t in tokens)
+
+
+def _candidates(
+    conn: sqlite3.Connection, tokens: List[str], filters: Dict[str, str]
+) -> List[sqlite3.Row]:
+    where = "".join(f" AND d.{column} = ?" for column in filters)
+    params = list(filters.values())
+    if not tokens:
+        return conn.execute(
+            f"""
+            SELECT d.*, 0.0 AS rank FROM docs d WHERE 1 = 1{where}
+            ORDER BY d.published_date DESC, d.score DESC LIMIT {CANDIDATES}
+            """,
+            params,
+        ).fetchall()
+    # Prefer documents containing every keyword, then any of them
+    for operator in ("AND", "OR"):
+        rows = conn.execute(
+            f"""
+            SELECT d.*, bm25(docs_fts) AS rank FROM docs_fts
+            JOIN docs d ON d.id = docs_fts.rowid
+            WHERE docs_fts MATCH ?{where}
+            ORDER BY rank LIMIT {CANDIDATES}
+            """,
+            [_match(tokens, operator), *params],
+        ).fetchall()
+        if rows:
+            return rows
+    return []
+
+
+def search(text: str, limit: int = 5, path: str = INDEX_FILE) -> List[Dict]:
+    """Return the best matching articles for a free-text query."""
+    if not os.path.exists(path):
+        return []
+    region, category, tokens = parse_query(text)
+    filters = {"region": region, "category": category}
+    filters = {column: value for column, value in filters.items() if value}
+
+    with closing(connect(path, readonly=True)) as conn:
+        rows = _candidates(conn, tokens, filters)
+        if not rows and tokens and filters:
+            # A category or region word may just be part of the topic
+            rows = _candidates(conn, tokens, {})
+
+    today = datetime.now(timezone.utc).date()
+
+    def _rank(row: sqlite3.Row) -> float:
+        age = 0
+        if row["published_date"]:
+            age = (today - date.fromisoformat(row["published_date"])).days
+        # bm25() is lower for better matches
+        return -row["rank"] + SCORE_WEIGHT * (row["score"] or 0) - AGE_PENALTY_PER_DAY * age
+
+    ranked = sorted(rows, key=_rank, reverse=True)[:limit]
+    return [
+        {
+            "title": row["title"],
+            "summary_zh": row["summary_zh"] or "",
+            "source": row["source"] or "",
+            "region": row["region"] or "Global",
+            "category": row["category"] or "",
+            "url": row["url"],
+            "published_at": row["published_at"] or "",
+        }
+        for row in ranked
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local article search index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("update", help="index newly classified or summarized articles")
+    q = sub.add_parser("query", help="search the index")
+    q.add_argument("text")
+    q.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "update":
+        print(f"🔎 Indexed {update()} articles into {INDEX_FILE}")
+    else:
+        for art in search(args.text, args.limit):
+            print(f"{art['published_at'][:10]}  {art['region']}/{art['category']}  {art['title']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Subscriber topic preferences grouped into render-once segments.
+
+Subscribers in ``SUBSCRIBERS_FILE`` may pick the regions and categories
+they want, e.g.::
+
+    [
+      {"email": "a@example.com", "regions": ["Taiwan"]},
+      {"email": "b@example.com", "line_user_id": "U123",
+       "categories": ["FinTech", "Research"]}
+    ]
+
+An empty or missing list means "everything". Addresses configured in the
+environment (``DIGEST_RECIPIENT``, ``DIGEST_BCC``, ``LINE_USER_IDS``) are
+added as subscribers of the default profile's full digest. Subscribers with identical
+preferences share a segment, and each segment's digest is rendered once
+no matter how many subscribers it has.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+import profiles
+import schema
+
+SUBSCRIBERS_FILE = profiles.setting("subscribers", "config/subscribers.json")
+SEGMENTS_DIR = profiles.path("result/segments")
+
+FULL_DIGEST = "all"
+
+
+class Segment(TypedDict):
+    name: str
+    # None means every region / category
+    regions: Optional[List[str]]
+    categories: Optional[List[str]]
+    emails: List[str]
+    line_user_ids: List[str]
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+def load_subscribers(path: str = SUBSCRIBERS_FILE) -> List[Dict]:
+    subscribers = schema.read_json(path) or []
+    if not isinstance(subscribers, list):
+        raise RuntimeError(f"Expected a list of subscribers in {path}")
+    if not profiles.is_default():
+        return subscribers
+    for email in _split(os.getenv("DIGEST_RECIPIENT")) + _split(os.getenv("DIGEST_BCC")):
+        subscribers.append({"email": email})
+    for user_id in _split(os.getenv("LINE_USER_IDS") or os.getenv("LINE_USER_ID")):
+        subscribers.append({"line_user_id": user_id})
+    return subscribers
+
+
+def _key(subscriber: Dict) -> Tuple[Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]:
+    regions = subscriber.get("regions") or None
+    categories = subscriber.get("categories") or None
+    return (
+        tuple(sorted(set(regions))) if regions else None,
+        tuple(sorted(set(categories))) if categories else None,
+    )
+
+
+def segment_name(regions: Optional[List[str]], categories: Optional[List[str]]) -> str:
+    if not regions and not categories:
+        return FULL_DIGEST
+    return "+".join(list(regions or []) + list(categories or []))
+
+
+def load_segments(path: str = SUBSCRIBERS_FILE) -> List[Segment]:
+    """Group subscribers by identical region/category preferences."""
+    segments: Dict[Tuple, Segment] = {}
+    for subscriber in load_subscribers(path):
+        regions, categories = _key(subscriber)
+        key = (regions, categories)
+        if key not in segments:
+            segments[key] = {
+                "name": segment_name(regions, categories),
+                "regions": list(regions) if regions else None,
+                "categories": list(categories) if categories else None,
+                "emails": [],
+                "line_user_ids": [],
+            }
+        segment = segments[key]
+        if subscriber.get("email") and subscriber["email"] not in segment["emails"]:
+            segment["emails"].append(subscriber["email"])
+        user_id = subscriber.get("line_user_id")
+        if user_id and user_id not in segment["line_user_ids"]:
+            segment["line_user_ids"].append(user_id)
+    return list(segments.values())
+
+
+def normalize_category(cat: str) -> str:
+    cat = cat or ""
+    if "\u2013" in cat:
+        cat = cat.split("\u2013", 1)[1].strip()
+    if "-" in cat and cat.split("-", 1)[0].strip() in ["Global", "Taiwan"]:
+        cat = cat.split("-", 1)[1].strip()
+    return {
+        "Research": "Research",
+        "Startup": "Startup",
+        "Infrastructure": "Infrastructure",
+        "FinTech": "FinTech",
+    }.get(cat, cat)
+
+
+def select_articles(
+    articles: List[Dict],
+    regions: Optional[List[str]] = None,
+    categories: Optional[List[str]] = None,
+) -> List[Dict]:
+    """Return the articles matching a region/category preference."""
+    return [
+        a for a in articles
+        if (not regions or (a.get("region") or "Global") in regions)
+        and (not categories or normalize_category(a.get("category", "")) in categories)
+    ]
+
+
+def html_path(segment: Segment) -> str:
+    return os.path.join(SEGMENTS_DIR, f"{segment['name']}.html")
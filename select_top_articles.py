@@ -1,16 +1,27 @@
+import heapq
 import json
 import os
-from typing import List, Dict, Optional
+import re
+from typing import Dict, List, Optional, Tuple
 
-CATEGORY_DIR = "data/categorized"
-OUTPUT_FILE = "data/selected_articles.json"
+import archive
+import blob_store
+import profiles
+import schema
+
+CATEGORY_DIR = profiles.path("data/categorized")
+# ``classify_articles_gpt.py`` writes every kept article to this single file
+# (``data/news_data.json`` is rewritten by the summary step)
+CANDIDATES_FILE = profiles.path("data/categorized_articles.json")
+OUTPUT_FILE = profiles.path("data/selected_articles.json")
+SELECTION_CONFIG_FILE = profiles.setting("selection", "config/selection.json")
 
 # These should mirror the values used in ``classify_articles_gpt.py`` to
 # avoid mismatches in capitalization or spacing when reading the files.
 REGIONS = ["Global", "Taiwan"]
 CATEGORIES = [
     "Research",
-    "Infrastructure", 
+    "Infrastructure",
     "Startup",
     "FinTech",
 ]
@@ -19,51 +30,215 @@ CATEGORIES = [
 # ``CATEGORIES`` are automatically reflected here.
 FILES = [f"{region}_{cat}.json" for region in REGIONS for cat in CATEGORIES]
 
+DEFAULT_SELECTION_CONFIG = {
+    # Articles per (region, category) slot; "k_per_slot" overrides it per
+    # slot using the "<region>_<category>" file stem as key.
+    "default_k": 1,
+    "k_per_slot": {},
+    # Maximum number of selected articles from one source across the digest
+    # (None: no cap)
+    "max_per_source": None,
+    # How strongly similarity to already selected items lowers a score (MMR)
+    "novelty_weight": 0.0,
+    # Title similarity at which two articles are treated as the same story
+    # (None: no duplicate check)
+    "duplicate_threshold": None,
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CJK_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+")
+
+
 def load_json(path: str) -> List[Dict]:
-    if not os.path.exists(path):
-        return []
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
+        return schema.read_articles(path)
+    except RuntimeError:
         print(f"❌ Invalid JSON in {path}")
         return []
 
-def select_top_article(articles: List[Dict]) -> Optional[Dict]:
-    if not articles:
-        return None
-    return max(articles, key=lambda x: x.get("score", 0))
+
+def load_selection_config(path: str = SELECTION_CONFIG_FILE) -> Dict:
+    config = dict(DEFAULT_SELECTION_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config.update(json.load(f))
+        except json.JSONDecodeError:
+            print(f"❌ Invalid JSON in {path}, using default selection settings")
+    return config
+
+
+def slot_size(config: Dict, region: str, category: str) -> int:
+    return int(config["k_per_slot"].get(f"{region}_{category}", config["default_k"]))
+
+
+def title_tokens(text: str) -> frozenset:
+    """Return English words plus CJK character bigrams of ``text``."""
+    text = (text or "").lower()
+    tokens = set(_WORD_RE.findall(text))
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.add(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return frozenset(tokens)
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def source_name(article: Dict) -> str:
+    src = article.get("source")
+    if isinstance(src, dict):
+        src = src.get("name")
+    return src or ""
+
+
+class CandidateIndex:
+    """All classified candidates in memory, bucketed by (region, category)."""
+
+    def __init__(self, articles: List[Dict]) -> None:
+        self.articles = articles
+        self.tokens = [title_tokens(a.get("title", "")) for a in articles]
+        self.slots: Dict[Tuple[str, str], List[int]] = {
+            (region, cat): [] for region in REGIONS for cat in CATEGORIES
+        }
+        for i, art in enumerate(articles):
+            slot = (art.get("region"), art.get("category"))
+            if slot in self.slots:
+                self.slots[slot].append(i)
+
+    @classmethod
+    def load(cls) -> "CandidateIndex":
+        articles = load_json(CANDIDATES_FILE)
+        if not articles:
+            # Older runs only left the per-slot files behind
+            for fname in FILES:
+                articles.extend(load_json(os.path.join(CATEGORY_DIR, fname)))
+        return cls(articles)
+
+    def select(self, config: Dict) -> List[Dict]:
+        """Pick up to k articles per slot, diverse across slots and sources."""
+        chosen = self.choose(config)
+        return [self.articles[i] for slot in self.slots for i, _ in chosen[slot]]
+
+    def choose(self, config: Dict) -> Dict[Tuple[str, str], List[Tuple[int, float]]]:
+        """Return each slot's picks as ``(index, MMR value at pick time)``.
+
+        Each slot keeps a max-heap keyed by an upper bound of its MMR score
+        ``score * (1 - novelty_weight * max_similarity)``. Similarity to the
+        selection only grows, so a popped candidate whose refreshed score
+        still beats the next bound is the true best (lazy greedy), and a
+        slot rarely has to look past its first few candidates.
+        """
+        weight = float(config["novelty_weight"] or 0)
+        duplicate = config["duplicate_threshold"]
+        duplicate = None if duplicate is None else float(duplicate)
+        max_per_source = config["max_per_source"]
+        max_per_source = None if max_per_source is None else int(max_per_source)
+        # With the defaults every slot simply takes its best-scored articles
+        compare = bool(weight) or duplicate is not None
+
+        heaps: Dict[Tuple[str, str], List[Tuple[float, int, int]]] = {}
+        for slot, members in self.slots.items():
+            # (negated bound, position, index): position keeps ties in file
+            # order, matching ``max()`` picking the first best article.
+            heap = [
+                (-float(self.articles[i].get("score", 0) or 0), pos, i)
+                for pos, i in enumerate(members)
+            ]
+            heapq.heapify(heap)
+            heaps[slot] = heap
+
+        chosen: Dict[Tuple[str, str], List[Tuple[int, float]]] = {slot: [] for slot in self.slots}
+        selected: List[int] = []
+        selected_urls: set = set()
+        per_source: Dict[str, int] = {}
+
+        def best_similarity(i: int) -> float:
+            return max(
+                (similarity(self.tokens[i], self.tokens[j]) for j in selected),
+                default=0.0,
+            )
+
+        def pick(slot: Tuple[str, str]) -> Optional[Tuple[int, float]]:
+            heap = heaps[slot]
+            while heap:
+                neg_bound, pos, i = heapq.heappop(heap)
+                art = self.articles[i]
+                if art.get("url") and art.get("url") in selected_urls:
+                    continue
+                if (
+                    max_per_source is not None
+                    and per_source.get(source_name(art), 0) >= max_per_source
+                ):
+                    continue
+                sim = best_similarity(i) if compare else 0.0
+                if duplicate is not None and sim >= duplicate:
+                    continue
+                value = float(art.get("score", 0) or 0) * (1 - weight * sim)
+                if heap and value < -heap[0][0]:
+                    heapq.heappush(heap, (-value, pos, i))
+                    continue
+                return i, value
+            return None
+
+        rounds = max(
+            (slot_size(config, region, cat) for region, cat in self.slots), default=0
+        )
+        # Round-robin over the slots so caps and novelty are shared fairly
+        for _ in range(rounds):
+            for slot in self.slots:
+                if len(chosen[slot]) >= slot_size(config, *slot):
+                    continue
+                picked = pick(slot)
+                if picked is None:
+                    continue
+                i = picked[0]
+                art = self.articles[i]
+                chosen[slot].append(picked)
+                selected.append(i)
+                if art.get("url"):
+                    selected_urls.add(art["url"])
+                name = source_name(art)
+                per_source[name] = per_source.get(name, 0) + 1
+
+        return chosen
+
+
+def selection_record(top: Dict) -> Dict:
+    """Return the fields of a selected article that later steps need."""
+    # Older candidate files may still carry the body inline
+    top = blob_store.stash(top)
+    return {
+        "title": top.get("title"),
+        "content_ref": top.get("content_ref"),
+        "category": top.get("category"),
+        "region": top.get("region"),
+        "score": top.get("score"),
+        "source": top.get("source"),
+        "url": top.get("url"),
+        "publishedAt": top.get("publishedAt"),
+    }
 
 
 def main() -> None:
     os.makedirs("data", exist_ok=True)
-    selected: List[Dict] = []
-
-    for fname in FILES:
-        path = os.path.join(CATEGORY_DIR, fname)
-        articles = load_json(path)
-        top = select_top_article(articles)
-        if not top:
-            continue
-        selected.append(
-            {
-                "title": top.get("title"),
-                "content": top.get("content"),
-                "category": top.get("category"),
-                "region": top.get("region"),
-                "score": top.get("score"),
-                "source": top.get("source"),
-                "url": top.get("url"),
-                "publishedAt": top.get("publishedAt"),
-            }
-        )
+    config = load_selection_config()
+    index = CandidateIndex.load()
+    selected = [selection_record(top) for top in index.select(config)]
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(selected, f, ensure_ascii=False, indent=2)
+    schema.write_articles(OUTPUT_FILE, selected)
+    archive.record(selected, "selected")
 
     print(f"Wrote {len(selected)} articles to {OUTPUT_FILE}")
     print(f"\u2b50 \u6bcf\u985e\u7cbe\u9078\u6587\u7ae0\u7e3d\u6578: {len(selected)}")
 
 
 if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
     main()
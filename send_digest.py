@@ -1,62 +1,67 @@
 import os
-import smtplib
 from email.message import EmailMessage
 from datetime import datetime
 from dotenv import load_dotenv
-from generate_digest import load_articles, generate_html
+
+import mail_delivery
+import segments
+from generate_digest import JSON_PATH, OUTPUT_FILE, load_articles, generate_html
 
 # --- Load environment variables ---
 load_dotenv()
 SENDER = os.getenv("DIGEST_SENDER")
 PASSWORD = os.getenv("DIGEST_PASSWORD")
-RECIPIENTS_RAW = os.getenv("DIGEST_RECIPIENT", "")
-RECIPIENTS = [email.strip() for email in RECIPIENTS_RAW.split(",") if email.strip()]
-BCC_RAW = os.getenv("DIGEST_BCC", "") 
 
-RECIPIENTS = [email.strip() for email in RECIPIENTS_RAW.split(",") if email.strip()]
-BCC = [email.strip() for email in BCC_RAW.split(",") if email.strip()]
 
-if not all([SENDER, PASSWORD]) or not RECIPIENTS:
-    raise RuntimeError("❌ Missing sender, password, or recipient(s) in .env")
+def load_html(segment: segments.Segment) -> str:
+    """Reuse the digest rendered by generate_digest, rendering it only if missing."""
+    if segment["name"] == segments.FULL_DIGEST:
+        path = OUTPUT_FILE
+    else:
+        path = segments.html_path(segment)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    return generate_html(load_articles(JSON_PATH), segment["regions"], segment["categories"])
 
-# --- JSON path ---
-JSON_PATH = "data/news_data.json"
 
-def main():
-    articles = load_articles(JSON_PATH)
-    html_content = generate_html(articles)
+def build_message(html_content: str) -> EmailMessage:
     date_str = datetime.now().strftime("%Y-%m-%d")
-
-    # --- Compose email ---
     msg = EmailMessage()
     msg["Subject"] = f"📬 AI 新知速遞：SysNews Daily – {date_str}"
     msg["From"] = SENDER
-    msg["To"] = ", ".join(RECIPIENTS)  # visible To: header
-    if BCC: 
-        msg["Bcc"] = ", ".join(BCC)
     msg.set_content("This email requires an HTML-capable client.")
     msg.add_alternative(html_content, subtype="html")
-    
-    ALL_RECIPIENTS = RECIPIENTS + BCC
-    if "Bcc" in msg:
-        del msg["Bcc"]
-    
-    # --- Send email ---
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(SENDER, PASSWORD)
-            # ✅ true recipient list here
-            smtp.sendmail(SENDER, ALL_RECIPIENTS, msg.as_string())
+    return msg
+
 
-    except smtplib.SMTPAuthenticationError:
-        raise RuntimeError("❌ Gmail authentication failed — check app password.")
+def main():
+    # DIGEST_RECIPIENT and DIGEST_BCC are part of the full-digest segment;
+    # every recipient gets an individual copy, so BCC addresses stay private
+    variants = [
+        mail_delivery.Variant(seg["name"], build_message(load_html(seg)), seg["emails"])
+        for seg in segments.load_segments()
+        if seg["emails"]
+    ]
+    if not SENDER or not variants:
+        raise RuntimeError("❌ Missing sender or recipient(s) in .env")
+
+    try:
+        counts = mail_delivery.deliver(variants, SENDER, PASSWORD)
     except Exception as exc:
+        if "Authentication" in type(exc).__name__:
+            raise RuntimeError("❌ Gmail authentication failed — check app password.") from exc
         raise RuntimeError(f"❌ Failed to send email: {exc}") from exc
 
-    print("✅ Email sent to:", ", ".join(RECIPIENTS))
-    if BCC:
-        print("✅ BCC sent to:", ", ".join(BCC))
+    print(f"✅ Email sent to {counts['sent']} recipient(s) in {len(variants)} segment(s)")
+    if counts["failed"]:
+        raise RuntimeError(
+            f"❌ {counts['failed']} recipient(s) failed, see {mail_delivery.OUTCOMES_FILE}"
+        )
 
 
 if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
     main()
@@ -1,27 +1,41 @@
-import json
 import os
-from typing import List
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
+import requests
 from dotenv import load_dotenv
-from linebot.v3.messaging import MessagingApi, Configuration, ApiClient
-from linebot.v3.messaging.models import (
-    FlexBubble,
-    FlexBox,
-    FlexCarousel,
-    FlexMessage,
-    PushMessageRequest,
-)
+from requests.adapters import HTTPAdapter
+
+import profiles
+import schema
+import segments
 
 # Load environment variables
 load_dotenv()
 
 ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
-USER_ID = os.getenv("LINE_USER_ID")
-JSON_PATH = "data/news_data.json"
+# Send to every follower of the channel instead of the subscriber segments
+BROADCAST = os.getenv("LINE_BROADCAST", "").lower() in ("1", "true", "yes")
+# Point at a local stub (see line_api_stub.py) to test delivery
+LINE_API_BASE = os.getenv("LINE_API_BASE", "https://api.line.me")
+JSON_PATH = profiles.path("data/news_data.json")
 
 if not ACCESS_TOKEN:
     raise RuntimeError("LINE_CHANNEL_ACCESS_TOKEN not set in environment")
 
+# Messaging API limits
+MAX_RECIPIENTS = 500
+MAX_MESSAGES_PER_REQUEST = 5
+BUBBLES_PER_CAROUSEL = 5
+
+CONCURRENCY = int(os.getenv("LINE_CONCURRENCY", "4"))
+MAX_REQUESTS_PER_SECOND = float(os.getenv("LINE_MAX_RPS", "20"))
+MAX_ATTEMPTS = 4
+REQUEST_TIMEOUT_SECONDS = 15
+
 CATEGORY_LABELS = {
     "Startup_ai": "Startup",
     "finance_ai": "Fintech",
@@ -37,19 +51,19 @@ REGION_ICONS = {
 def load_articles(path: str) -> List[dict]:
     if not os.path.exists(path):
         raise RuntimeError(f"{path} not found")
-    with open(path, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError as exc:
-            raise RuntimeError(f"Invalid JSON in {path}") from exc
+    return schema.read_digest_items(path)
 
 
-def build_bubble(article: dict) -> FlexBubble:
+def bubble_dict(article: dict) -> dict:
     region = article.get("region", "Global")
     category = article.get("category", "")
     header = f"{REGION_ICONS.get(region, '')} {region} | {CATEGORY_LABELS.get(category, category)}"
+    summary = article.get("summary") or article.get("summary_zh")
+    if not summary and article.get("excerpt"):
+        # Extractive fallback in the article's own language, labelled as such
+        summary = "\u539f\u6587\u6458\u9304\uff1a" + article["excerpt"]
 
-    bubble_dict = {
+    bubble = {
         "type": "bubble",
         "size": "mega",
         "body": {
@@ -79,11 +93,7 @@ def build_bubble(article: dict) -> FlexBubble:
                 },
                 {
                     "type": "text",
-                    "text": (
-                        article.get("summary")
-                        or article.get("summary_zh")
-                        or "\uff08\u7121\u6458\u8981\uff09"
-                    ),
+                    "text": summary or "\uff08\u7121\u6458\u8981\uff09",
                     "size": "sm",
                     "color": "#444444",
                     "wrap": True,
@@ -91,7 +101,18 @@ def build_bubble(article: dict) -> FlexBubble:
                 },
             ],
         },
-        "footer": {
+        "styles": {
+            "body": {
+                "backgroundColor": "#FCF9F6",
+                "separator": True,
+                "separatorColor": "#F1EDE6"
+            }
+        }
+    }
+    url = article.get("url") or ""
+    # LINE rejects a URI action without a real link (placeholders use "#")
+    if url.startswith(("http://", "https://")):
+        bubble["footer"] = {
             "type": "box",
             "layout": "vertical",
             "spacing": "sm",
@@ -100,8 +121,8 @@ def build_bubble(article: dict) -> FlexBubble:
                     "type": "button",
                     "action": {
                         "type": "uri",
-                        "label": "\ud83d\udd17 \u95b1\u8b80\u5168\u6587",
-                        "uri": article.get("url", ""),
+                        "label": "\U0001f517 \u95b1\u8b80\u5168\u6587",
+                        "uri": url,
                     },
                     "style": "primary",
                     "color": "#3A405A",
@@ -110,34 +131,137 @@ def build_bubble(article: dict) -> FlexBubble:
                 }
             ],
             "backgroundColor": "#FFFFFF00",
-        },
-        "styles": {
-            "body": {
-                "backgroundColor": "#FCF9F6",
-                "separator": True,
-                "separatorColor": "#F1EDE6"
-            }
         }
-    }
-    return FlexBubble.from_dict(bubble_dict)
-
+    return bubble
 
-def send_messages(articles: List[dict]) -> None:
-    bubbles = [build_bubble(a) for a in articles]
-    configuration = Configuration(access_token=ACCESS_TOKEN)
 
-    with ApiClient(configuration) as api_client:
-        api = MessagingApi(api_client)
-        for i in range(0, len(bubbles), 5):
-            chunk = bubbles[i:i + 5]
-            carousel = FlexCarousel.from_dict({
+def build_messages(bubbles: List[Dict]) -> List[Dict]:
+    """Group bubbles into carousel messages of a few bubbles each."""
+    return [
+        {
+            "type": "flex",
+            "altText": "Polaris Daily Digest",
+            "contents": {
                 "type": "carousel",
-                "contents": [b.to_dict() for b in chunk],
-            })
-            message = FlexMessage(alt_text="Polaris Daily Digest", contents=carousel)
-            req = PushMessageRequest(to=USER_ID, messages=[message])
-            api.push_message(req)
-            print(f"✅ Pushed {len(chunk)} article(s)")
+                "contents": bubbles[i:i + BUBBLES_PER_CAROUSEL],
+            },
+        }
+        for i in range(0, len(bubbles), BUBBLES_PER_CAROUSEL)
+    ]
+
+
+class RateLimiter:
+    """Spaces requests at least ``1 / rate`` seconds apart across threads."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Delivery:
+    """Sends pre-serialized digest messages to many recipients concurrently."""
+
+    def __init__(self, base_url: str = LINE_API_BASE, token: Optional[str] = ACCESS_TOKEN) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=CONCURRENCY)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        )
+        self.limiter = RateLimiter(MAX_REQUESTS_PER_SECOND)
+
+    def post(self, path: str, body: bytes) -> bool:
+        """POST ``body``, retrying throttling and server errors."""
+        # The same retry key on every attempt lets LINE drop duplicates
+        headers = {"X-Line-Retry-Key": str(uuid.uuid4())}
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self.limiter.wait()
+            delay = 2 ** attempt
+            try:
+                resp = self.session.post(
+                    f"{self.base_url}{path}", data=body, headers=headers,
+                    timeout=REQUEST_TIMEOUT_SECONDS,
+                )
+            except requests.RequestException as exc:
+                print(f"⚠️ {path} attempt {attempt} failed: {exc}")
+            else:
+                if resp.ok:
+                    return True
+                # 409 means an earlier attempt with this retry key went through
+                if resp.status_code == 409:
+                    return True
+                if resp.status_code != 429 and resp.status_code < 500:
+                    print(f"❌ {path} rejected ({resp.status_code}): {resp.text[:200]}")
+                    return False
+                delay = float(resp.headers.get("Retry-After") or delay)
+                print(f"⚠️ {path} attempt {attempt} got {resp.status_code}")
+            if attempt < MAX_ATTEMPTS:
+                time.sleep(delay)
+        return False
+
+    def send(self, messages: List[Dict], recipients: List[str], broadcast: bool = False) -> int:
+        """Deliver ``messages`` and return the number of failed requests."""
+        # Serialize each group of messages once; only the recipient list
+        # changes between requests
+        groups = [
+            schema.dumps_compact(messages[i:i + MAX_MESSAGES_PER_REQUEST])
+            for i in range(0, len(messages), MAX_MESSAGES_PER_REQUEST)
+        ]
+        jobs = []
+        for group in groups:
+            if broadcast:
+                jobs.append(("/v2/bot/message/broadcast", b'{"messages":' + group + b"}"))
+                continue
+            for i in range(0, len(recipients), MAX_RECIPIENTS):
+                to = schema.dumps_compact(recipients[i:i + MAX_RECIPIENTS])
+                jobs.append(
+                    ("/v2/bot/message/multicast", b'{"to":' + to + b',"messages":' + group + b"}")
+                )
+
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            results = list(pool.map(lambda job: self.post(*job), jobs))
+        failed = results.count(False)
+        print(f"✅ Sent {len(jobs) - failed}/{len(jobs)} request(s) to LINE")
+        return failed
+
+
+def send_messages(articles: List[dict], recipients: Optional[List[str]] = None) -> int:
+    """Send the digest and return the number of failed requests.
+
+    Without ``recipients`` every subscriber segment (``segments.py``) gets
+    the articles matching its preferences; bubbles are built once and
+    shared between segments.
+    """
+    delivery = Delivery()
+    bubbles = [bubble_dict(a) for a in articles]
+    if BROADCAST or recipients is not None:
+        return delivery.send(build_messages(bubbles), recipients or [], broadcast=BROADCAST)
+
+    by_article = {id(a): b for a, b in zip(articles, bubbles)}
+    failed = sent = 0
+    for segment in segments.load_segments():
+        if not segment["line_user_ids"]:
+            continue
+        selected = segments.select_articles(articles, segment["regions"], segment["categories"])
+        if not selected:
+            continue
+        messages = build_messages([by_article[id(a)] for a in selected])
+        failed += delivery.send(messages, segment["line_user_ids"])
+        sent += 1
+    if not sent:
+        raise RuntimeError("Set LINE_USER_IDS (or LINE_USER_ID), add LINE subscribers or LINE_BROADCAST")
+    return failed
 
 
 def main() -> None:
@@ -145,8 +269,12 @@ def main() -> None:
     if not articles:
         print("No articles to send.")
         return
-    send_messages(articles)
+    if send_messages(articles):
+        raise RuntimeError("Some LINE deliveries failed")
 
 
 if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
     main()
@@ -0,0 +1,212 @@
+"""Streaming mode for the fetch → date filter → relevance → classify stages.
+
+The batch pipeline runs each stage to completion before the next one
+starts, so the first relevance call waits for the slowest feed. Here the
+stages are connected by bounded ``asyncio.Queue`` objects: articles flow
+downstream as soon as their full text arrives, LLM calls start while slow
+feeds are still downloading, and a full queue makes the upstream stage wait
+(backpressure) instead of buffering the whole backlog in memory.
+
+The same output files as the batch steps are written (including
+``logs/fetch_counts.json``), and NewsAPI articles left in
+``data/newsapi_ai_articles.json`` join the stream at the date filter as in
+the batch date step, so the remaining steps (selection onwards) run
+unchanged. Use ``python main.py --stream``.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+
+import aiohttp
+
+import archive
+import audit_log
+import blob_store
+import classify_articles_gpt
+import fetch_rss_articles
+import filter_articles_by_date
+import filter_relevance_gpt
+import poll_schedule
+import run_budget
+import schema
+import search_index
+
+QUEUE_SIZE = 50
+RELEVANCE_WORKERS = 6
+CLASSIFY_WORKERS = 6
+
+# Marks the end of a stream; each worker forwards exactly one downstream
+_DONE = None
+
+
+async def _run_workers(
+    count: int,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue | None,
+    handle: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any] | None]],
+) -> None:
+    """Run ``count`` workers that apply ``handle`` to every queued article.
+
+    Results that are not ``None`` are forwarded to ``outbox``. Once the
+    inbox is drained, one end marker is sent downstream per worker of the
+    next stage (the caller closes it with ``_close``).
+    """
+
+    async def _worker() -> None:
+        while True:
+            art = await inbox.get()
+            if art is _DONE:
+                return
+            try:
+                result = await handle(art)
+            except Exception as exc:
+                print(f"❌ Stream worker failed on '{art.get('title')}': {exc}")
+                continue
+            if result is not None and outbox is not None:
+                await outbox.put(result)
+
+    await asyncio.gather(*(_worker() for _ in range(count)))
+
+
+async def _close(queue: asyncio.Queue, consumers: int) -> None:
+    for _ in range(consumers):
+        await queue.put(_DONE)
+
+
+async def run_stream() -> None:
+    sources = fetch_rss_articles.load_sources()
+    keywords = fetch_rss_articles.load_keywords()
+    history = poll_schedule.load_history()
+    now = datetime.now(timezone.utc)
+    previous_by_source, previous_by_url = fetch_rss_articles.index_previous_articles(
+        fetch_rss_articles.load_previous_articles(), now
+    )
+    plans = {
+        src.get("name", ""): poll_schedule.plan_source(
+            src.get("name", ""), history, now, fetch_rss_articles.MAX_ARTICLES_PER_SOURCE
+        )
+        for src in sources
+    }
+
+    fetched_q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    recent_q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    relevant_q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    # Merged in at the date filter, like ``filter_articles_by_date.main``
+    newsapi = filter_articles_by_date.load_json(filter_articles_by_date.NEWSAPI_FILE)
+    fetch_counts: Dict[str, int] = {src.get("name", ""): 0 for src in sources}
+
+    fetched: List[Dict[str, Any]] = []
+    recent: List[Dict[str, Any]] = []
+    relevant: List[Dict[str, Any]] = []
+    classified: List[Dict[str, Any]] = []
+    # Relevance scores seen by the classify stage, for the run budget
+    scores: List[int] = []
+
+    async def fetch_stage(session: aiohttp.ClientSession) -> None:
+        async def _feed(src: Dict) -> None:
+            name = src.get("name", "")
+            plan = plans[name]
+            count = 0
+            if plan["due"]:
+                batch = []
+                async for art in fetch_rss_articles.iter_feed_articles(
+                    src, session, run_budget.entries_cap(plan["window"]), history, previous_by_url
+                ):
+                    batch.append(art)
+                    await fetched_q.put(art)
+                carried = fetch_rss_articles.with_carried_forward(
+                    batch, previous_by_source.get(name, [])
+                )[len(batch):]
+                for art in carried:
+                    await fetched_q.put(art)
+                count = len(batch) + len(carried)
+                print(
+                    f"✅ Fetched {len(batch)} articles from {name}, "
+                    f"kept {len(carried)} from earlier polls"
+                )
+            else:
+                for art in previous_by_source.get(name, []):
+                    count += 1
+                    await fetched_q.put(art)
+                print(f"⏭️ Skipped {name}, reused {count} articles")
+            fetch_counts[name] = count
+
+        for art in newsapi:
+            await fetched_q.put(dict(art, _newsapi=True))
+        await asyncio.gather(*(_feed(src) for src in sources))
+        await _close(fetched_q, 1)
+
+    async def date_filter(art: Dict[str, Any]) -> Dict[str, Any] | None:
+        # NewsAPI articles are not part of the RSS fetch output
+        if not art.pop("_newsapi", False):
+            fetched.append(art)
+        if filter_articles_by_date.filter_recent([art]):
+            recent.append(art)
+            return art
+        return None
+
+    async def relevance(art: Dict[str, Any]) -> Dict[str, Any] | None:
+        if not (art.get("title") and blob_store.has_text(art)):
+            return None
+        if not filter_relevance_gpt.passes_prefilter(art, keywords):
+            return None
+        resp = await filter_relevance_gpt.check_relevance(art)
+        if filter_relevance_gpt.apply_relevance(art, resp, keywords):
+            relevant.append(art)
+            return art
+        return None
+
+    async def classify(art: Dict[str, Any]) -> Dict[str, Any] | None:
+        if not classify_articles_gpt.valid_articles_of([art]):
+            return None
+        scores.append(art.get("score", 0))
+        if run_budget.skip_low_score(art.get("score", 0), scores, "classify_articles"):
+            return None
+        result = await classify_articles_gpt.classify_article(art)
+        if classify_articles_gpt.apply_result(art, result):
+            classified.append(art)
+        return None
+
+    async def date_stage() -> None:
+        await _run_workers(1, fetched_q, recent_q, date_filter)
+        await _close(recent_q, RELEVANCE_WORKERS)
+
+    async def relevance_stage() -> None:
+        await _run_workers(RELEVANCE_WORKERS, recent_q, relevant_q, relevance)
+        await _close(relevant_q, CLASSIFY_WORKERS)
+
+    async def classify_stage() -> None:
+        await _run_workers(CLASSIFY_WORKERS, relevant_q, None, classify)
+
+    async with aiohttp.ClientSession(
+        headers=fetch_rss_articles.DEFAULT_HEADERS
+    ) as session:
+        await asyncio.gather(
+            fetch_stage(session), date_stage(), relevance_stage(), classify_stage()
+        )
+
+    await audit_log.close_all()
+    poll_schedule.save_history(history)
+    fetch_rss_articles.write_fetch_counts(fetch_counts)
+    schema.write_articles(fetch_rss_articles.OUTPUT_FILE, fetched)
+    schema.write_articles(filter_articles_by_date.OUTPUT_FILE, recent)
+    schema.write_articles(filter_relevance_gpt.OUTPUT_FILE, relevant)
+    classify_articles_gpt.write_outputs(classified)
+    archive.record(fetched + newsapi, "fetched")
+    archive.record(recent, "recent")
+    archive.record(relevant, "relevant")
+    archive.record(classified, "classified")
+    search_index.update()
+    print(
+        f"\U0001F4E5 {len(fetched)} fetched + {len(newsapi)} NewsAPI → {len(recent)} recent → "
+        f"{len(relevant)} relevant → {len(classified)} classified"
+    )
+
+
+if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
+    asyncio.run(run_stream())
@@ -1,47 +1,68 @@
-import json
-import os
 import math
-from typing import Dict, List
+import os
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Tuple, TypedDict
 import logging
 
 import asyncio
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+import archive
+import audit_log
+import blob_store
+import extractive
+import llm_cache
+import llm_client
+import profiles
+import run_budget
+import schema
+import search_index
+
 logging.basicConfig(level=logging.ERROR)
 
-INPUT_FILE = "data/selected_articles.json"
-OUTPUT_FILE = "data/news_data.json"
+INPUT_FILE = profiles.path("data/selected_articles.json")
+OUTPUT_FILE = profiles.path("data/news_data.json")
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash")
+MODEL_NAME = "gemini-2.5-flash"
+# The model only sees the body's top-ranked sentences up to this length
+PROMPT_BODY_CHARS = int(os.getenv("SUMMARY_BODY_CHARS", "3000"))
+FALLBACK_SUMMARY_CHARS = 200
 
 
 def load_articles() -> List[Dict]:
-    if not os.path.exists(INPUT_FILE):
-        return []
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            raise RuntimeError(f"Invalid JSON in {INPUT_FILE}")
+    return schema.read_articles(INPUT_FILE)
 
 
 semaphore = asyncio.Semaphore(3)
 
 
+class SummaryResult(TypedDict):
+    summary: str
+
+
 def _parse_summary(text: str) -> str:
-    raw_text = text
-    try:
-        for line in raw_text.splitlines():
-            if line.startswith("Summary:"):
-                return line.replace("Summary:", "").strip()
-        return raw_text.strip()
-    except Exception as exc:
-        logging.error("Failed to parse model response: %s", exc)
-        logging.debug("Raw text: %r", raw_text)
-        return ""
+    """Fallback for replies that ignore the JSON format."""
+    for line in text.splitlines():
+        if line.startswith("Summary:"):
+            return line.replace("Summary:", "").strip()
+    return text.strip()
+
+
+class Summary(NamedTuple):
+    text: str
+    # Local extractive fallback: sentences in the article's own language,
+    # so it goes into the digest's ``excerpt``, never ``summary_zh``
+    extractive: bool = False
+
+
+def fallback_summary(title: str, body: str) -> Summary:
+    """Extractive summary, used when no model summary can be had.
+
+    It is in the article's own language, but keeps the slot filled.
+    """
+    print(f"✂️ Extractive summary for: {title}")
+    return Summary(extractive.summarize(body, FALLBACK_SUMMARY_CHARS), extractive=True)
 
 
 def load_prompt(path: str) -> str:
@@ -49,92 +70,129 @@ def load_prompt(path: str) -> str:
         return f.read()
 
 
-VERSION = "v2"
+VERSION = profiles.setting("summarize_prompt", "v2")
 PROMPT_PATH = f"prompts/summarize_article_{VERSION}.txt"
-PROMPT_TEMPLATE = load_prompt(PROMPT_PATH)
 
 
-async def gemma_summarize(title: str, body: str) -> str:
+@lru_cache(maxsize=None)
+def prompt_template() -> str:
+    return load_prompt(PROMPT_PATH)
+
+
+@lru_cache(maxsize=None)
+def prompt_parts() -> Tuple[str, str]:
+    # Everything before the {title} line is static and sent once as a cached prefix
+    return llm_client.split_template(prompt_template())
+
+
+@lru_cache(maxsize=None)
+def get_model() -> llm_client.PrefixModel:
+    return llm_client.prefix_model(MODEL_NAME, prompt_parts()[0], "summarize", VERSION)
+
+
+async def gemma_summarize(title: str, body: str) -> Summary:
     """Return a Traditional Chinese summary of the article using Gemini."""
-    prompt = PROMPT_TEMPLATE.format(title=title, body=body)
+    prefix, suffix_template = prompt_parts()
+    suffix = suffix_template.format(
+        title=title, body=extractive.compress(body, PROMPT_BODY_CHARS)
+    )
+    cache_key = llm_cache.make_key("summarize", MODEL_NAME, prefix + suffix)
+    cached = llm_cache.get(cache_key)
+    if cached:
+        return Summary(cached)
+    if not run_budget.model_summaries_allowed():
+        run_budget.degrade("cached_summaries", "summarize", "cached or extractive summaries")
+        return fallback_summary(title, body)
 
     async with semaphore:
         try:
-            resp = await model.generate_content_async(prompt)
+            config = llm_client.json_config(SummaryResult)
+            resp = await get_model().generate(suffix, generation_config=config)
             text = resp.text
             print("📩 Model raw response:", text)
-            summary = _parse_summary(text)
-
-            # ✅ Log prompt, response, summary
-            log_entry = {
-                "title": title,
-                "version": VERSION,
-                "prompt": prompt,
-                "response": text,
-                "summary": summary,
-            }
-            os.makedirs("logs", exist_ok=True)
-            log_path = f"logs/summarize_log_{VERSION}.jsonl"
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-
-            return summary
-
+            parsed, repaired = llm_client.parse(text, SummaryResult)
+            if parsed is not None:
+                summary = parsed["summary"]
+            else:
+                # A plain-text summary is still usable, so no re-ask here
+                summary = _parse_summary(text)
+                repaired = True
+            outcome = "repaired" if repaired else "clean"
+            llm_client.record("summarize", VERSION, outcome if summary else "failed")
+            if summary:
+                llm_cache.put(cache_key, "summarize", summary)
+
+            # ✅ Log response and summary; the template is stored once by hash
+            audit_log.get_log("summarize", VERSION, prompt_template()).log(
+                {"title": title, "response": text, "summary": summary}
+            )
+
+            return Summary(summary) if summary else fallback_summary(title, body)
+
+        except run_budget.BudgetExhausted:
+            return fallback_summary(title, body)
         except Exception as exc:
             logging.error("Gemini API call failed: %s", exc)
-            return ""
-
+            return fallback_summary(title, body)
+
+
+
+def digest_item(art: Dict, body: str, summary: Summary) -> Dict:
+    """Return the digest entry for a summarized article."""
+    src = art.get('source')
+    if isinstance(src, dict):
+        src = src.get('name')
+    word_count = len(body.split())
+    read_time_min = max(1, math.ceil(word_count / 200))
+    item = {
+        'region': art.get('region') or "Global",
+        'category': art.get('category'),
+        'title': art['title'],
+        'summary_zh': "" if summary.extractive else summary.text,
+        'source': src or 'Unknown Source',
+        'read_time': f"{read_time_min} min read",
+        'url': art.get('url'),
+        'published_at': art.get('publishedAt') or art.get('published_at'),
+        'tags': []
+    }
+    if summary.extractive:
+        item['excerpt'] = summary.text
+    return item
 
 
 async def main_async() -> None:
     articles = load_articles()
     summarized = []
 
-    valid_articles = [a for a in articles if a.get('title') and a.get('content')]
+    # Bodies are loaded from the blob store only for the selected articles
+    bodies = [blob_store.article_text(a) for a in articles]
+    valid = [(a, body) for a, body in zip(articles, bodies) if a.get('title') and body]
 
-    tasks = [gemma_summarize(a['title'], a['content']) for a in valid_articles]
+    tasks = [gemma_summarize(a['title'], body) for a, body in valid]
     summaries = await asyncio.gather(*tasks)
 
-    for art, summary_zh in zip(valid_articles, summaries):
-        if not summary_zh:
+    for (art, body), summary in zip(valid, summaries):
+        if not summary.text:
             continue
 
-        region = art.get('region') or "Global"
-        category = art.get('category') 
-
         print("✅ Title:", art['title'])
-        print("📝 Category:", category)
-        print("🈶 Summary:", summary_zh)
+        print("📝 Category:", art.get('category'))
+        print("✂️ Excerpt:" if summary.extractive else "🈶 Summary:", summary.text)
         print("-----")
 
-        src = art.get('source')
-        if isinstance(src, dict):
-            src = src.get('name')
-        source_name = src or 'Unknown Source'
-
-        published = art.get('publishedAt') or art.get('published_at')
+        summarized.append(digest_item(art, body, summary))
 
-        word_count = len(art['content'].split())
-        read_time_min = max(1, math.ceil(word_count / 200))
-
-        summarized.append({
-            'region': region,
-            'category': category,
-                'title': art['title'],
-                'summary_zh': summary_zh,
-                'source': source_name,
-                'read_time': f"{read_time_min} min read",
-                'url': art.get('url'),
-                'published_at': published,
-                'tags': []
-            })
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(summarized, f, ensure_ascii=False, indent=2)
+    await audit_log.close_all()
+    schema.write_digest_items(OUTPUT_FILE, summarized)
+    archive.record(summarized, "summarized")
+    search_index.update()
 
     print(f"✅ Wrote summaries to {OUTPUT_FILE}")
     print(f"📝 成功摘要的文章總數: {len(summarized)}")
 
 
 if __name__ == '__main__':
+    import profiler
+
+    profiler.enable_from_args()
     asyncio.run(main_async())
@@ -0,0 +1,52 @@
+from contextlib import closing
+from datetime import date
+
+import archive
+
+
+def _article(**fields):
+    article = {
+        "title": "Chip maker raises funds",
+        "url": "https://example.com/a",
+        "source": "Feed",
+        "publishedAt": "2026-10-18T08:00:00Z",
+        "content_ref": "ref-a",
+    }
+    article.update(fields)
+    return article
+
+
+def _row(path):
+    with closing(archive.connect(path)) as conn:
+        return dict(conn.execute("SELECT * FROM articles").fetchone())
+
+
+def test_record_is_queryable_by_publish_date(tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    archive.record([_article()], "fetched", path=path)
+    assert archive.urls_published_on([date(2026, 10, 18)], path=path) == {"https://example.com/a"}
+    assert archive.urls_published_on([date(2026, 10, 19)], path=path) == set()
+
+
+def test_unchanged_rows_are_not_rewritten(tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    assert archive.record([_article()], "fetched", path=path) == 1
+    updated_at = _row(path)["updated_at"]
+
+    # A carried-forward article seen again changes nothing
+    assert archive.record([_article()], "fetched", path=path) == 0
+    assert _row(path)["updated_at"] == updated_at
+
+
+def test_later_stages_and_new_values_are_written(tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    archive.record([_article(score=7, category="Research")], "classified", path=path)
+
+    # Moving backwards or omitting known fields keeps the stored values
+    assert archive.record([_article()], "fetched", path=path) == 0
+    row = _row(path)
+    assert archive.STAGES[row["stage"]] == "classified"
+    assert (row["score"], row["category"]) == (7, "Research")
+
+    assert archive.record([_article(score=9)], "classified", path=path) == 1
+    assert _row(path)["score"] == 9
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+import blob_store
+
+
+@pytest.fixture(autouse=True)
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_DIR", str(tmp_path / "blobs"))
+    blob_store._read.cache_clear()
+    yield
+    blob_store._read.cache_clear()
+
+
+def test_put_is_content_addressed():
+    ref = blob_store.put("全文 body")
+    assert blob_store.put("全文 body") == ref
+    assert blob_store.get(ref) == "全文 body"
+    assert blob_store.exists(ref)
+
+
+def test_a_miss_is_not_cached():
+    ref = blob_store.put("body")
+    os.remove(blob_store._path(ref))
+    assert blob_store.get(ref) is None
+
+    # Restored later (e.g. from a run bundle): the next lookup finds it
+    blob_store.put("body")
+    assert blob_store.get(ref) == "body"
+
+
+def test_stash_moves_inline_content_to_the_store():
+    stored = blob_store.stash({"title": "t", "content": "body"})
+    assert "content" not in stored
+    assert blob_store.article_text(stored) == "body"
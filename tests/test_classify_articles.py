@@ -0,0 +1,38 @@
+import asyncio
+
+import classify_articles_gpt
+import llm_cache
+import local_classifier
+
+ARTICLE = {"title": "Acme raises funding", "url": "https://example.com/a", "content": "Acme body"}
+LOCAL = {"category": "Startup", "region": "Taiwan", "keep": True}
+CACHED = {"category": "FinTech", "region": "Global", "keep": True}
+
+
+class Model:
+    prefix = "prompt"
+
+
+def _classify(monkeypatch, cached):
+    local_calls = []
+    monkeypatch.setattr(classify_articles_gpt, "get_model", lambda: Model())
+    monkeypatch.setattr(llm_cache, "get", lambda key: cached)
+
+    def _local(article, body, version):
+        local_calls.append(article["url"])
+        return LOCAL
+
+    monkeypatch.setattr(local_classifier, "classify", _local)
+    return asyncio.run(classify_articles_gpt.classify_article(ARTICLE)), local_calls
+
+
+def test_cached_llm_answer_wins_over_the_local_classifier(monkeypatch):
+    result, local_calls = _classify(monkeypatch, CACHED)
+    assert result == CACHED
+    assert local_calls == []
+
+
+def test_local_classifier_answers_on_a_cache_miss(monkeypatch):
+    result, local_calls = _classify(monkeypatch, None)
+    assert result == LOCAL
+    assert local_calls == [ARTICLE["url"]]
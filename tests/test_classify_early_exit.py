@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import random
+
+import pytest
+
+import classify_articles_gpt
+import select_top_articles as sel
+
+WORDS = "ai model chip bank startup fund taiwan data cloud robot".split()
+
+
+def _candidates(seed, n=60):
+    rng = random.Random(seed)
+    return [
+        {
+            "title": " ".join(rng.sample(WORDS, 4)),
+            "url": f"https://example.com/{seed}/{i}",
+            "source": f"S{rng.randint(0, 3)}",
+            "score": rng.randint(1, 15),
+            "content": "body",
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    async def classify_article(art):
+        calls.append(art["url"])
+        # Let completions interleave in a different order than issued
+        await asyncio.sleep(random.random() / 1000)
+        digest = int(hashlib.md5(art["url"].encode()).hexdigest(), 16)
+        return {
+            "keep": digest % 5 != 0,
+            "region": sel.REGIONS[digest % 2],
+            "category": sel.CATEGORIES[(digest // 2) % 4],
+        }
+
+    monkeypatch.setattr(classify_articles_gpt, "classify_article", classify_article)
+    return calls
+
+
+CONFIGS = [
+    {},
+    {"max_per_source": 2},
+    {"default_k": 2, "max_per_source": 2, "duplicate_threshold": 0.5, "novelty_weight": 0.5},
+]
+
+
+@pytest.mark.parametrize("overrides", CONFIGS)
+@pytest.mark.parametrize("seed", range(5))
+def test_early_exit_selects_the_same_articles(calls, overrides, seed):
+    config = dict(sel.DEFAULT_SELECTION_CONFIG, **overrides)
+    full = asyncio.run(classify_articles_gpt.classify_articles(_candidates(seed)))
+    full_calls = len(calls)
+    calls.clear()
+    early = asyncio.run(
+        classify_articles_gpt.classify_articles_early_exit(_candidates(seed), config)
+    )
+
+    def urls(results):
+        return [a["url"] for a in sel.CandidateIndex(results).select(config)]
+
+    assert urls(early) == urls(full)
+    assert len(set(calls)) <= full_calls
+
+
+def test_early_exit_skips_candidates_that_cannot_win(calls):
+    asyncio.run(
+        classify_articles_gpt.classify_articles_early_exit(
+            _candidates(0, n=200), dict(sel.DEFAULT_SELECTION_CONFIG)
+        )
+    )
+    assert len(calls) < 200
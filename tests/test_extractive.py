@@ -0,0 +1,42 @@
+import extractive
+
+ENGLISH = (
+    "Chip maker Acme raised 200 million dollars to build AI accelerators. "
+    "The funding round was led by a sovereign fund. "
+    "Acme says its accelerators cut the cost of training large AI models. "
+    "The company was founded in 2019 in Hsinchu."
+)
+CHINESE = "台灣新創公司宣布完成新一輪募資。這筆資金將用於擴大研發團隊。公司預計明年推出新產品。"
+
+
+def test_split_sentences_handles_english_and_chinese():
+    assert len(extractive.split_sentences(ENGLISH)) == 4
+    assert extractive.split_sentences(CHINESE) == [
+        "台灣新創公司宣布完成新一輪募資。",
+        "這筆資金將用於擴大研發團隊。",
+        "公司預計明年推出新產品。",
+    ]
+    assert extractive.split_sentences("Version 3.5 is out. Try it.") == [
+        "Version 3.5 is out.",
+        "Try it.",
+    ]
+
+
+def test_summarize_keeps_sentence_order_and_length():
+    summary = extractive.summarize(ENGLISH, max_chars=150, max_sentences=2)
+    assert len(summary) <= 150
+    sentences = extractive.split_sentences(summary)
+    assert len(sentences) <= 2
+    positions = [ENGLISH.index(s) for s in sentences]
+    assert positions == sorted(positions)
+
+
+def test_compress_leaves_short_text_alone():
+    assert extractive.compress(ENGLISH, len(ENGLISH)) == ENGLISH
+
+
+def test_compress_never_exceeds_the_budget():
+    long_sentence = "word " * 200 + "."
+    text = long_sentence + " " + long_sentence.replace("word", "other")
+    assert len(extractive.compress(text, 120)) <= 120
+    assert len(extractive.compress(ENGLISH, 100)) <= 100
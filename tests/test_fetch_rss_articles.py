@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+
+import fetch_rss_articles
+
+NOW = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+
+
+def _article(url, hours_ago):
+    published = (NOW - timedelta(hours=hours_ago)).isoformat().replace("+00:00", "Z")
+    return {"title": url, "url": url, "source": "Feed", "publishedAt": published}
+
+
+def test_only_fresh_articles_are_carried_forward():
+    previous = [_article("old", 60), _article("new", 2)]
+    by_source, by_url = fetch_rss_articles.index_previous_articles(previous, NOW)
+    assert [a["url"] for a in by_source["Feed"]] == ["new"]
+    # Stale articles still lend their stored body to a re-listed entry
+    assert set(by_url) == {"old", "new"}
+
+
+def test_due_source_keeps_its_earlier_articles():
+    carried, _ = fetch_rss_articles.index_previous_articles(
+        [_article("old", 60), _article("earlier", 20), _article("relisted", 5)], NOW
+    )
+    fetched = [_article("relisted", 5), _article("latest", 1)]
+    batch = fetch_rss_articles.with_carried_forward(fetched, carried["Feed"])
+    assert [a["url"] for a in batch] == ["relisted", "latest", "earlier"]
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+import poll_schedule
+
+NOW = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+
+
+def _history(name, hours_ago, undated=0, feed_size=20):
+    history = {}
+    start = NOW - timedelta(days=3)
+    timestamps = [NOW - timedelta(hours=h) for h in hours_ago]
+    poll_schedule.record_poll(history, name, timestamps, start, feed_size, undated)
+    poll_schedule.record_poll(history, name, timestamps, NOW - timedelta(hours=1), feed_size, undated)
+    return history
+
+
+def test_busier_source_is_polled_more_often_with_a_small_window():
+    busy = _history("busy", [h / 2 for h in range(1, 140)])
+    slow = _history("slow", range(1, 70, 10))
+    busy_plan = poll_schedule.plan_source("busy", busy, NOW, 250)
+    slow_plan = poll_schedule.plan_source("slow", slow, NOW, 250)
+    assert busy_plan["interval"] < slow_plan["interval"]
+    # The window covers one poll interval, not the whole recency horizon
+    hours = busy_plan["interval"].total_seconds() / 3600
+    assert busy_plan["rate"] * hours <= busy_plan["window"] <= busy_plan["rate"] * hours * 2
+    assert busy_plan["window"] < busy_plan["rate"] * 48
+    assert slow_plan["window"] <= busy_plan["window"]
+
+
+def test_silent_source_backs_off():
+    history = _history("quiet", [])
+    plan = poll_schedule.plan_source("quiet", history, NOW, 250)
+    assert plan["rate"] == 0
+    assert plan["interval"] == poll_schedule.MAX_POLL_INTERVAL
+
+
+def test_undated_feed_keeps_the_default_schedule():
+    history = _history("undated", [], undated=20)
+    plan = poll_schedule.plan_source("undated", history, NOW, 250)
+    assert plan["rate"] is None
+    assert plan["due"]
+    assert plan["window"] == 250
+
+
+def test_dated_poll_clears_the_undated_mark():
+    history = _history("feed", [], undated=20)
+    poll_schedule.record_poll(history, "feed", [NOW], NOW, 20, 0)
+    assert "undated" not in history["feed"]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import schema
+
+
+def test_dumps_compact_has_no_whitespace_and_round_trips():
+    obj = {"title": "台灣 AI", "tags": ["a", "b"], "score": 3}
+    data = schema.dumps_compact(obj)
+    assert b"\n" not in data and b", " not in data and b": " not in data
+    assert schema.loads(data) == obj
+
+
+def test_parse_article_normalizes_source_and_date():
+    article = schema.parse_article({
+        "title": " Acme ",
+        "url": "https://example.com/a",
+        "source": {"name": "Example News"},
+        "published_at": "2026-10-18",
+    })
+    assert article == {
+        "title": "Acme",
+        "url": "https://example.com/a",
+        "source": "Example News",
+        "publishedAt": "2026-10-18",
+    }
+
+
+def test_parse_article_rejects_missing_url():
+    with pytest.raises(schema.SchemaError):
+        schema.parse_article({"title": "Acme"})
+
+
+def test_write_articles_drops_malformed_records(tmp_path):
+    path = tmp_path / "articles.json"
+    schema.write_articles(str(path), [
+        {"title": "Good", "url": "https://example.com/good"},
+        {"title": "No url"},
+        "not an object",
+        {"title": "Bad score", "url": "https://example.com/bad", "score": "high"},
+    ])
+    written = json.loads(path.read_text(encoding="utf-8"))
+    assert [a["title"] for a in written] == ["Good"]
+    assert schema.read_articles(str(path))[0]["url"] == "https://example.com/good"
+
+
+def test_write_digest_items_keeps_excerpt(tmp_path):
+    path = tmp_path / "news_data.json"
+    schema.write_digest_items(str(path), [
+        {"title": "Acme", "summary_zh": "", "excerpt": "Acme raised money."},
+        {"summary_zh": "沒有標題"},
+    ])
+    items = schema.read_digest_items(str(path))
+    assert len(items) == 1
+    assert items[0]["excerpt"] == "Acme raised money."
+    assert items[0]["url"] == "#"
@@ -0,0 +1,55 @@
+import select_top_articles as sel
+
+
+def _article(url, region, category, score, source="A", title=None):
+    return {
+        "title": title or f"story {url}",
+        "url": url,
+        "source": source,
+        "region": region,
+        "category": category,
+        "score": score,
+    }
+
+
+def _config(**overrides):
+    return dict(sel.DEFAULT_SELECTION_CONFIG, **overrides)
+
+
+def test_defaults_pick_each_slots_best_article():
+    articles = [
+        _article("a", "Global", "Research", 5),
+        _article("b", "Global", "Research", 9),
+        _article("c", "Global", "Research", 9),
+        _article("d", "Taiwan", "FinTech", 3),
+        _article("e", "Global", "FinTech", 7, title="story b"),
+    ]
+    picked = sel.CandidateIndex(articles).select(_config())
+    # Ties go to the earlier article, as max() would pick it
+    assert [a["url"] for a in picked] == ["b", "e", "d"]
+
+
+def test_source_cap_skips_to_the_next_source():
+    articles = [
+        _article("a", "Global", "Research", 9, source="A"),
+        _article("b", "Global", "FinTech", 9, source="A"),
+        _article("c", "Global", "FinTech", 5, source="B"),
+    ]
+    picked = sel.CandidateIndex(articles).select(_config(max_per_source=1))
+    assert [a["url"] for a in picked] == ["a", "c"]
+
+
+def test_duplicate_titles_are_skipped():
+    articles = [
+        _article("a", "Global", "Research", 9, title="chip maker raises funds"),
+        _article("b", "Global", "FinTech", 9, title="chip maker raises funds"),
+        _article("c", "Global", "FinTech", 5, title="bank launches ai assistant"),
+    ]
+    picked = sel.CandidateIndex(articles).select(_config(duplicate_threshold=0.6))
+    assert [a["url"] for a in picked] == ["a", "c"]
+
+
+def test_k_per_slot():
+    articles = [_article(str(i), "Taiwan", "Startup", i) for i in range(5)]
+    picked = sel.CandidateIndex(articles).select(_config(k_per_slot={"Taiwan_Startup": 3}))
+    assert [a["url"] for a in picked] == ["4", "3", "2"]
@@ -0,0 +1,30 @@
+import summarize_articles
+from summarize_articles import Summary
+
+ARTICLE = {
+    "title": "Acme raises funding for AI chips",
+    "url": "https://example.com/acme",
+    "source": {"name": "Example News"},
+    "category": "Funding",
+    "publishedAt": "2026-10-18T08:00:00Z",
+}
+BODY = (
+    "Chip maker Acme raised 200 million dollars to build AI accelerators. "
+    "The funding round was led by a sovereign fund. "
+    "Acme says its accelerators cut the cost of training large AI models."
+)
+
+
+def test_model_summary_goes_into_summary_zh():
+    item = summarize_articles.digest_item(ARTICLE, BODY, Summary("Acme 募得兩億美元。"))
+    assert item["summary_zh"] == "Acme 募得兩億美元。"
+    assert "excerpt" not in item
+    assert item["source"] == "Example News"
+
+
+def test_extractive_fallback_is_kept_out_of_summary_zh():
+    summary = summarize_articles.fallback_summary(ARTICLE["title"], BODY)
+    assert summary.extractive and summary.text
+    item = summarize_articles.digest_item(ARTICLE, BODY, summary)
+    assert item["summary_zh"] == ""
+    assert item["excerpt"] == summary.text
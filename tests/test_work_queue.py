@@ -0,0 +1,124 @@
+import urllib.error
+
+import pytest
+
+import work_queue
+
+RUN = "run-1"
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = work_queue.WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.reset(RUN)
+    return queue
+
+
+def test_lease_hands_out_each_job_once(queue, clock):
+    queue.enqueue(RUN, "classify", [("a", {"n": 1}), ("b", {"n": 2})])
+
+    first = queue.lease("w1", ["classify"], n=1)
+    second = queue.lease("w2", ["classify"], n=5)
+
+    assert [job.key for job in first] == ["a"]
+    assert [job.key for job in second] == ["b"]
+    assert first[0].payload == {"n": 1}
+    assert first[0].attempts == 1
+    assert queue.lease("w3", ["classify"]) == []
+
+
+def test_expired_lease_goes_to_the_next_worker(queue, clock):
+    queue.enqueue(RUN, "classify", [("a", None)])
+    (job,) = queue.lease("w1", lease_seconds=60)
+
+    clock.now += 59
+    assert queue.lease("w2") == []
+
+    clock.now += 2
+    (retry,) = queue.lease("w2", lease_seconds=60)
+    assert retry.id == job.id
+    assert retry.attempts == 2
+
+
+def test_expired_final_attempt_fails(queue, clock):
+    queue.enqueue(RUN, "classify", [("a", None)])
+    for _ in range(work_queue.MAX_ATTEMPTS):
+        (job,) = queue.lease("w1", lease_seconds=60)
+        clock.now += 61
+
+    assert queue.lease("w2") == []
+    assert queue.counts(RUN, "classify") == {"pending": 0, "leased": 0, "done": 0, "failed": 1}
+    assert queue.complete(job.id, "w1", "late") is False
+
+
+def test_only_the_lease_holder_can_complete(queue, clock):
+    queue.enqueue(RUN, "classify", [("a", None)])
+    (job,) = queue.lease("w1", lease_seconds=60)
+    clock.now += 61
+    queue.lease("w2", lease_seconds=60)
+
+    # The first worker's late answer must not overwrite the new attempt
+    assert queue.complete(job.id, "w1", "late") is False
+    assert queue.complete(job.id, "w2", "fresh") is True
+    assert queue.complete(job.id, "w2", "again") is False
+    assert queue.results(RUN, "classify") == {"a": "fresh"}
+
+
+def test_fail_retries_until_max_attempts(queue, clock):
+    queue.enqueue(RUN, "classify", [("a", None)])
+
+    for attempt in range(1, work_queue.MAX_ATTEMPTS + 1):
+        (job,) = queue.lease("w1")
+        assert job.attempts == attempt
+        assert queue.fail(job.id, "w1", "boom") is True
+        expected = "failed" if attempt == work_queue.MAX_ATTEMPTS else "pending"
+        assert queue.counts(RUN, "classify")[expected] == 1
+
+    assert queue.lease("w1") == []
+    assert queue.results(RUN, "classify") == {}
+
+
+def test_fail_by_another_worker_is_ignored(queue, clock):
+    queue.enqueue(RUN, "classify", [("a", None)])
+    (job,) = queue.lease("w1")
+
+    assert queue.fail(job.id, "w2", "not mine") is False
+    assert queue.counts(RUN, "classify")["leased"] == 1
+
+
+def test_serve_requires_the_token(queue):
+    with pytest.raises(ValueError):
+        work_queue.serve(queue, host="0.0.0.0", port=0, token="")
+
+    server = work_queue.serve(queue, port=0, token="secret")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        queue.enqueue(RUN, "classify", [("a", {"n": 1})])
+
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            work_queue.RemoteQueue(url, token="wrong").lease("w1")
+        assert exc.value.code == 403
+
+        remote = work_queue.RemoteQueue(url, token="secret")
+        (job,) = remote.lease("w1")
+        assert job.payload == {"n": 1}
+        assert remote.complete(job.id, "w1", "ok") is True
+        assert queue.results(RUN, "classify") == {"a": "ok"}
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,9 +1,10 @@
-import json
-import os
 from typing import Dict, List, Tuple
 
-INPUT_FILE = "data/news_data.json"
-OUTPUT_FILE = "data/news_data.json"
+import profiles
+import schema
+
+INPUT_FILE = profiles.path("data/news_data.json")
+OUTPUT_FILE = profiles.path("data/news_data.json")
 
 CATEGORY_MAPPING = {
     "Startup": "Startup",
@@ -33,25 +34,24 @@ def normalize_category(cat: str) -> str:
 
 
 def load_articles() -> List[Dict]:
-    if not os.path.exists(INPUT_FILE):
+    try:
+        return schema.read_digest_items(INPUT_FILE)
+    except RuntimeError:
         return []
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
 
 
 def deduplicate(articles: List[Dict]) -> List[Dict]:
-    seen: set[Tuple[str, str]] = set()
+    # A slot may hold several articles (see config/selection.json), so only
+    # the same article appearing twice in one slot is a duplicate.
+    seen: set[Tuple[str, str, str]] = set()
     result = []
     for art in articles:
         region = art.get("region", "Global")
         cat_key = normalize_category(art.get("category", ""))
-        pair = (region, cat_key)
-        if pair in seen:
+        key = (region, cat_key, art.get("url") or art.get("title", ""))
+        if key in seen:
             continue
-        seen.add(pair)
+        seen.add(key)
         art["category"] = cat_key
         result.append(art)
     return result
@@ -80,12 +80,14 @@ def main() -> None:
     articles = load_articles()
     articles = deduplicate(articles)
     articles = ensure_all_categories(articles)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(articles, f, ensure_ascii=False, indent=2)
+    schema.write_digest_items(OUTPUT_FILE, articles)
     print(f"Validated {len(articles)} articles and wrote to {OUTPUT_FILE}")
     validated = articles
     print(f"\u2705 \u9a57\u8b49\u5f8c\u4fdd\u7559\u7684\u6709\u6548\u65b0\u805e\u6578\u91CF: {len(validated)}")
 
 
 if __name__ == "__main__":
+    import profiler
+
+    profiler.enable_from_args()
     main()
@@ -1,9 +1,16 @@
-from flask import Flask, request, abort
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
-from linebot.models import MessageEvent, TextMessage, TextSendMessage
+from flask import Flask, request, abort, jsonify
 from dotenv import load_dotenv
+from collections import OrderedDict
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import queue
+import threading
+import requests
+
+import search_index
+from send_to_line import bubble_dict
 
 load_dotenv()
 
@@ -15,32 +22,177 @@ channel_secret = os.getenv("LINE_CHANNEL_SECRET")
 if not channel_token or not channel_secret:
     raise RuntimeError("❌ 未正確讀取 .env 中的 LINE_CHANNEL_ACCESS_TOKEN 或 LINE_CHANNEL_SECRET")
 
-line_bot_api = LineBotApi(channel_token)
-handler = WebhookHandler(channel_secret)
+LINE_API_BASE = os.getenv("LINE_API_BASE", "https://api.line.me")
+# 處理事件的背景執行緒數量，也是 HTTP 連線池的大小
+WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+# 佇列滿了就回 503，讓 LINE 重送，而不是默默丟掉事件
+QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+# 記住最近處理過的 webhookEventId，用來過濾 LINE 的重送
+SEEN_EVENTS = 10000
+REPLY_TIMEOUT_SECONDS = 10
+
+events: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+
+_seen: "OrderedDict[str, None]" = OrderedDict()
+_lock = threading.Lock()
+_workers_started = False
+metrics = {"received": 0, "processed": 0, "duplicates": 0, "rejected": 0, "failed": 0}
+
+
+@lru_cache(maxsize=None)
+def get_parser():
+    # linebot 只在第一次收到事件時才匯入，讓冷啟動不必等 SDK 載入
+    from linebot import WebhookParser
+
+    return WebhookParser(channel_secret)
+
+
+def _count(name: str) -> None:
+    with _lock:
+        metrics[name] += 1
+
+
+def _first_delivery(event) -> bool:
+    """Return False if this event id was already accepted."""
+    event_id = getattr(event, "webhook_event_id", None)
+    if not event_id:
+        return True
+    with _lock:
+        if event_id in _seen:
+            return False
+        _seen[event_id] = None
+        if len(_seen) > SEEN_EVENTS:
+            _seen.popitem(last=False)
+    return True
+
+
+def _forget(event) -> None:
+    """Let a redelivery of ``event`` through again."""
+    with _lock:
+        _seen.pop(getattr(event, "webhook_event_id", None), None)
+
+
+def _session() -> requests.Session:
+    """One keep-alive connection pool shared by every worker."""
+    session = requests.Session()
+    # reply token 只能用一次，所以只在請求確定沒被處理時重試：
+    # 連線失敗（請求還沒送出）以及 429（LINE 直接拒絕）。讀取逾時或 5xx
+    # 時訊息可能已經送達，重送會失敗或重複回覆，因此不重試。
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=0,
+        backoff_factor=0.5,
+        status_forcelist=(429,),
+        allowed_methods=frozenset({"POST"}),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WORKERS, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Authorization"] = f"Bearer {channel_token}"
+    return session
+
+
+http = _session()
+
+
+def reply_message(reply_token: str, message) -> None:
+    resp = http.post(
+        f"{LINE_API_BASE}/v2/bot/message/reply",
+        json={"replyToken": reply_token, "messages": [message.as_json_dict()]},
+        timeout=REPLY_TIMEOUT_SECONDS,
+    )
+    resp.raise_for_status()
+
+
+def handle_message(event):
+    from linebot.models import FlexSendMessage, TextSendMessage
+
+    text = event.message.text
+    print("👤 來自使用者：", event.source.user_id)
+    print("💬 訊息內容：", text)
+
+    # 只查本地索引，不呼叫 LLM 或外部網路，回覆速度取決於 SQLite 查詢
+    articles = search_index.search(text, limit=5)
+    if not articles:
+        reply = TextSendMessage(text="🔍 找不到與「" + text + "」相關的新聞，換個關鍵字試試看？")
+    else:
+        reply = FlexSendMessage(
+            alt_text=f"🔍 {text}",
+            contents={
+                "type": "carousel",
+                "contents": [bubble_dict(a) for a in articles],
+            },
+        )
+    reply_message(event.reply_token, reply)
+
+
+def worker() -> None:
+    from linebot.models import MessageEvent, TextMessage
+
+    while True:
+        event = events.get()
+        try:
+            if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+                handle_message(event)
+            _count("processed")
+        except Exception as exc:
+            _count("failed")
+            print(f"❌ 處理事件失敗：{exc}")
+        finally:
+            events.task_done()
+
+
+def _start_workers() -> None:
+    """第一次收到請求時才啟動背景執行緒，匯入模組時不產生任何執行緒。"""
+    global _workers_started
+    with _lock:
+        if _workers_started:
+            return
+        for _ in range(WORKERS):
+            threading.Thread(target=worker, daemon=True).start()
+        _workers_started = True
+
 
 @app.route("/callback", methods=['POST'])
 def callback():
+    from linebot.exceptions import InvalidSignatureError
+
     signature = request.headers.get('X-Line-Signature')
     body = request.get_data(as_text=True)
-    print("✅ 收到事件：\n", body)
 
     try:
-        handler.handle(body, signature)
+        parsed = get_parser().parse(body, signature)
     except InvalidSignatureError:
         abort(400)
 
+    _start_workers()
+    # 只驗證簽章並排入佇列，回覆交給背景執行緒，避免慢的上游卡住請求
+    for event in parsed:
+        _count("received")
+        if not _first_delivery(event):
+            _count("duplicates")
+            continue
+        try:
+            events.put_nowait(event)
+        except queue.Full:
+            _count("rejected")
+            _forget(event)
+            abort(503)
+
     return 'OK'
 
-@handler.add(MessageEvent, message=TextMessage)
-def handle_message(event):
-    text = event.message.text
-    print("👤 來自使用者：", event.source.user_id)
-    print("💬 訊息內容：", text)
 
-    line_bot_api.reply_message(
-        event.reply_token,
-        TextSendMessage(text="✅ 收到你說的：「" + text + "」")
-    )
+@app.route("/metrics", methods=['GET'])
+def show_metrics():
+    with _lock:
+        snapshot = dict(metrics)
+    snapshot["queue_depth"] = events.qsize()
+    snapshot["queue_size"] = QUEUE_SIZE
+    snapshot["workers"] = WORKERS
+    return jsonify(snapshot)
+
 
 if __name__ == "__main__":
-    app.run(port=8000)
+    app.run(port=8000, threaded=True)
@@ -0,0 +1,263 @@
+"""SQLite-backed work queue with leases and retries.
+
+The distributed mode (``distributed.py``) puts fetch shards and LLM work
+items here, and any number of worker processes pull them:
+
+* ``lease`` hands a worker up to ``n`` pending jobs for ``lease_seconds``;
+  a job whose lease ran out (its worker crashed or hung) becomes
+  available to the next ``lease`` call, or fails if that was its last
+  attempt,
+* ``complete`` stores the result, but only for the worker holding the
+  lease, so a late duplicate cannot overwrite a newer attempt,
+* ``fail`` puts the job back until it has been tried ``MAX_ATTEMPTS``
+  times, then marks it failed.
+
+Workers on the same machine open the SQLite file directly (WAL mode, one
+short ``BEGIN IMMEDIATE`` transaction per lease). Workers on other
+machines talk to the coordinator's ``serve`` endpoint through
+``RemoteQueue``, which has the same worker-side methods. ``serve`` listens
+on loopback unless given another host, and then only answers requests
+carrying the shared ``WORK_QUEUE_TOKEN`` in ``TOKEN_HEADER``.
+"""
+
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+QUEUE_FILE = "data/work_queue.sqlite"
+DEFAULT_HOST = "127.0.0.1"
+TOKEN_HEADER = "X-Work-Queue-Token"
+TOKEN = os.getenv("WORK_QUEUE_TOKEN", "")
+LEASE_SECONDS = 180
+MAX_ATTEMPTS = 3
+
+
+class Job(NamedTuple):
+    id: int
+    run: str
+    kind: str
+    key: str
+    payload: Any
+    attempts: int
+
+
+class WorkQueue:
+    def __init__(self, path: str = QUEUE_FILE) -> None:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # Autocommit; transactions are opened explicitly where needed
+        self.conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY, run TEXT NOT NULL, kind TEXT NOT NULL,"
+            " key TEXT NOT NULL, payload TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0,"
+            " lease_until REAL, worker TEXT, result TEXT, error TEXT,"
+            " UNIQUE (run, kind, key))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, kind)")
+        self._lock = threading.Lock()
+
+    # -- coordinator side ---------------------------------------------------
+
+    def reset(self, keep_run: str) -> None:
+        """Drop the jobs of every other run."""
+        with self._lock:
+            self.conn.execute("DELETE FROM jobs WHERE run != ?", (keep_run,))
+
+    def enqueue(self, run: str, kind: str, items: Iterable[Tuple[str, Any]]) -> int:
+        rows = [(run, kind, key, json.dumps(payload, ensure_ascii=False)) for key, payload in items]
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (run, kind, key, payload) VALUES (?, ?, ?, ?)", rows
+            )
+            added = self.conn.total_changes - before
+            self.conn.execute("COMMIT")
+        return added
+
+    def counts(self, run: str, kind: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE run = ? AND kind = ? GROUP BY state",
+                (run, kind),
+            ).fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def results(self, run: str, kind: str) -> Dict[str, Any]:
+        """Return ``key -> result`` for the finished jobs of ``kind``."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, result FROM jobs WHERE run = ? AND kind = ? AND state = 'done'",
+                (run, kind),
+            ).fetchall()
+        return {key: json.loads(result) for key, result in rows}
+
+    def abandon(self, run: str, kind: str) -> int:
+        """Mark every unfinished job of ``kind`` as failed (used on timeout)."""
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET state = 'failed', error = 'abandoned'"
+                " WHERE run = ? AND kind = ? AND state IN ('pending', 'leased')",
+                (run, kind),
+            )
+        return cur.rowcount
+
+    # -- worker side --------------------------------------------------------
+
+    def lease(
+        self,
+        worker: str,
+        kinds: Optional[List[str]] = None,
+        n: int = 1,
+        lease_seconds: float = LEASE_SECONDS,
+    ) -> List[Job]:
+        now = time.time()
+        kind_filter = ""
+        params: List[Any] = [now, MAX_ATTEMPTS]
+        if kinds:
+            kind_filter = f" AND kind IN ({','.join('?' * len(kinds))})"
+            params += kinds
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A final attempt whose lease ran out will not be handed out
+                # again, so it fails here instead of staying leased forever
+                self.conn.execute(
+                    "UPDATE jobs SET state = 'failed', error = 'lease expired', lease_until = NULL"
+                    " WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                    (now, MAX_ATTEMPTS),
+                )
+                rows = self.conn.execute(
+                    "SELECT id, run, kind, key, payload, attempts FROM jobs"
+                    " WHERE (state = 'pending' OR (state = 'leased' AND lease_until < ?))"
+                    f" AND attempts < ?{kind_filter} ORDER BY id LIMIT ?",
+                    (*params, n),
+                ).fetchall()
+                self.conn.executemany(
+                    "UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?,"
+                    " attempts = attempts + 1 WHERE id = ?",
+                    [(worker, now + lease_seconds, row[0]) for row in rows],
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return [
+            Job(job_id, run, kind, key, json.loads(payload), attempts + 1)
+            for job_id, run, kind, key, payload, attempts in rows
+        ]
+
+    def complete(self, job_id: int, worker: str, result: Any) -> bool:
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET state = 'done', result = ?, lease_until = NULL"
+                " WHERE id = ? AND worker = ? AND state = 'leased'",
+                (json.dumps(result, ensure_ascii=False), job_id, worker),
+            )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " error = ?, lease_until = NULL WHERE id = ? AND worker = ? AND state = 'leased'",
+                (MAX_ATTEMPTS, error[:500], job_id, worker),
+            )
+        return cur.rowcount == 1
+
+
+# ---------------------------------------------------------------------------
+# HTTP stand-in for a broker, so workers on other machines can pull jobs
+
+_WORKER_METHODS = ("lease", "complete", "fail")
+
+
+def serve(
+    queue: WorkQueue, host: str = DEFAULT_HOST, port: int = 8765, token: str = TOKEN
+) -> ThreadingHTTPServer:
+    """Expose the worker-side methods of ``queue`` over HTTP in a background thread.
+
+    Anything but a loopback ``host`` needs a ``token``, which every request
+    must then send in ``TOKEN_HEADER``.
+    """
+    if not token and host not in ("127.0.0.1", "localhost", "::1"):
+        raise ValueError(f"Serving the work queue on {host} needs WORK_QUEUE_TOKEN")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            if token and not hmac.compare_digest(
+                self.headers.get(TOKEN_HEADER, "").encode("utf-8"), token.encode("utf-8")
+            ):
+                self.send_error(403)
+                return
+            method = self.path.strip("/")
+            if method not in _WORKER_METHODS:
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            kwargs = json.loads(self.rfile.read(length) or b"{}")
+            result = getattr(queue, method)(**kwargs)
+            if method == "lease":
+                result = [job._asdict() for job in result]
+            body = json.dumps(result, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class RemoteQueue:
+    """Worker-side client for a queue exposed with ``serve``."""
+
+    def __init__(self, url: str, token: str = TOKEN) -> None:
+        self.url = url.rstrip("/")
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers[TOKEN_HEADER] = token
+
+    def _call(self, method: str, **kwargs: Any) -> Any:
+        request = urllib.request.Request(
+            f"{self.url}/{method}",
+            data=json.dumps(kwargs, ensure_ascii=False).encode("utf-8"),
+            headers=self.headers,
+        )
+        with urllib.request.urlopen(request, timeout=30) as resp:
+            return json.loads(resp.read())
+
+    def lease(
+        self,
+        worker: str,
+        kinds: Optional[List[str]] = None,
+        n: int = 1,
+        lease_seconds: float = LEASE_SECONDS,
+    ) -> List[Job]:
+        rows = self._call("lease", worker=worker, kinds=kinds, n=n, lease_seconds=lease_seconds)
+        return [Job(**row) for row in rows]
+
+    def complete(self, job_id: int, worker: str, result: Any) -> bool:
+        return self._call("complete", job_id=job_id, worker=worker, result=result)
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        return self._call("fail", job_id=job_id, worker=worker, error=error)